@@ -0,0 +1,148 @@
+"""
+Diario de lote para reanudar ejecuciones interrumpidas.
+Cada imagen terminada con transacciones se añade como una línea JSON (ruta,
+hash y transacciones extraídas) en cuanto acaba su extracción. Con --resume, las
+imágenes que ya están en el diario con el mismo contenido no se vuelven a
+procesar: sus transacciones se leen del diario.
+"""
+
+import json
+import os
+import time
+from pathlib import Path
+from typing import List, Dict, Iterable, Iterator, Tuple
+
+from extraction_cache import hash_image
+from records import ImageResult, Transaction
+
+
+# Diario del último lote ejecutado
+JOURNAL_FILE = ".cache/lote.jsonl"
+
+
+class BatchJournal:
+    """Diario append-only en JSON Lines, una línea por imagen terminada."""
+    
+    def __init__(self, journal_path: str = JOURNAL_FILE):
+        """
+        Inicializa el diario (el archivo se abre con start o resume).
+        
+        Args:
+            journal_path: Ruta del archivo del diario
+        """
+        self.journal_path = Path(journal_path)
+        self.file = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+    
+    def close(self):
+        """Cierra el archivo del diario."""
+        if self.file:
+            self.file.close()
+            self.file = None
+    
+    def _open(self, mode: str):
+        self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+        self.file = open(self.journal_path, mode, encoding='utf-8')
+    
+    def start(self):
+        """Empieza un lote nuevo descartando el diario anterior."""
+        self._open('w')
+    
+    def load(self) -> Dict[str, dict]:
+        """
+        Lee las entradas del diario.
+        
+        Una línea incompleta al final (el proceso se cortó mientras escribía)
+        se ignora: esa imagen simplemente se vuelve a procesar.
+        
+        Returns:
+            Diccionario ruta absoluta -> entrada (la última si se repite)
+        """
+        entries = {}
+        try:
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    entries[entry['path']] = entry
+        except FileNotFoundError:
+            pass
+        return entries
+    
+    def resume(self, image_paths: List[str]) -> Tuple[List[ImageResult], List[str]]:
+        """
+        Continúa el lote anterior separando las imágenes ya terminadas.
+        
+        Una imagen cuenta como terminada si su ruta está en el diario y su
+        contenido no cambió desde entonces.
+        
+        Args:
+            image_paths: Rutas de imágenes del lote
+        
+        Returns:
+            Tupla (resultados leídos del diario, rutas que faltan procesar)
+        """
+        entries = self.load()
+        done = []
+        remaining = []
+        
+        for index, image_path in enumerate(image_paths):
+            entry = entries.get(os.path.abspath(image_path))
+            if entry and entry['hash'] == hash_image(image_path):
+                transactions = [Transaction.from_dict(t) for t in entry['transactions']]
+                done.append(ImageResult(index, image_path, transactions))
+            else:
+                remaining.append(image_path)
+        
+        self._open('a')
+        return done, remaining
+    
+    def record(self, image_path: str, transactions: List[Transaction]):
+        """
+        Añade una imagen terminada al diario y lo fuerza a disco.
+        
+        Los resultados vacíos no se anotan: el procesador devuelve una lista
+        vacía también cuando falla (error de la API, excepción del OCR, worker
+        caído), y con --resume esa imagen debe volver a procesarse.
+        
+        Args:
+            image_path: Ruta de la imagen
+            transactions: Transacciones extraídas de la imagen
+        """
+        if not transactions:
+            return
+        
+        entry = {
+            'path': os.path.abspath(image_path),
+            'hash': hash_image(image_path),
+            'time': time.time(),
+            'transactions': [transaction.to_dict() for transaction in transactions]
+        }
+        self.file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+    
+    def track(self, results: Iterable[ImageResult]) -> Iterator[ImageResult]:
+        """
+        Registra cada resultado en el diario antes de pasarlo al consumidor.
+        
+        Los resultados incompletos (respuesta cortada o error a mitad) no se
+        registran: con --resume esas imágenes se vuelven a procesar.
+        
+        Args:
+            results: Resultados por imagen (p. ej. de iter_extract)
+        
+        Yields:
+            Los mismos resultados (los completos, ya registrados)
+        """
+        for result in results:
+            if result.complete:
+                self.record(result.path, result.transactions)
+            yield result
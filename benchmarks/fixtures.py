@@ -0,0 +1,256 @@
+"""
+Datos sintéticos para los benchmarks.
+Generan detecciones con el formato de EasyOCR (para medir agrupación y
+parseo sin cargar el modelo) e históricos de transacciones de cualquier
+tamaño (para medir deduplicación, almacén y exportación a Excel).
+Todos los generadores son deterministas a partir de una semilla.
+"""
+
+import json
+import random
+import uuid
+from pathlib import Path
+from typing import List, Dict, Any, Tuple
+
+from records import Transaction
+
+
+# Detecciones de OCR reales guardadas con run_benchmarks.py --record-ocr
+OCR_FIXTURES_DIR = Path(__file__).parent / "fixtures" / "ocr"
+
+MONTHS = ['Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio', 'Julio',
+          'Agosto', 'Septiembre', 'Octubre', 'Noviembre', 'Diciembre']
+
+NAME_PREFIXES = ['PLIN-', 'YAPE-', 'TRANSF. ', 'COMPRA ', 'PAGO ', 'DEPOSITO ']
+NAME_WORDS = ['JUAN PEREZ', 'MARIA LOPEZ', 'TAMBO', 'WONG', 'PLAZA VEA', 'RAPPI',
+              'NETFLIX', 'SEDAPAL', 'LUZ DEL SUR', 'CARLOS RUIZ', 'ANA TORRES', 'EFECTIVO']
+
+# Geometría de una captura de pantalla típica (1080 px de ancho)
+SCREEN_WIDTH = 1080
+SCREEN_TOP = 150
+SCREEN_ROW = 170
+TEXT_HEIGHT = 30
+
+# Separación entre transacciones de offset_amount_screen
+OFFSET_AMOUNT_ROW = 158
+
+
+def _box(x1: int, y1: int, x2: int, y2: int) -> List[List[int]]:
+    return [[x1, y1], [x2, y1], [x2, y2], [x1, y2]]
+
+
+def _name(rng: random.Random) -> str:
+    return f"{rng.choice(NAME_PREFIXES)}{rng.choice(NAME_WORDS)} {rng.randint(1, 999)}"
+
+
+def synthetic_screen(rng: random.Random, n_transactions: int = 8) -> Tuple[List, int, int]:
+    """
+    Genera las detecciones de OCR de una captura de movimientos.
+    
+    Cada transacción ocupa dos líneas: la descripción y, debajo, el día a la
+    izquierda y el monto a la derecha, como en las capturas de la app.
+    
+    Args:
+        rng: Generador aleatorio
+        n_transactions: Transacciones en la captura
+    
+    Returns:
+        Tupla (detecciones, alto, ancho) con detecciones [bbox, texto, confianza]
+    """
+    month = rng.choice(MONTHS)
+    detections = [[_box(40, 40, 400, 40 + TEXT_HEIGHT), f"{month} 2025", 0.99]]
+    
+    y = SCREEN_TOP
+    for _ in range(n_transactions):
+        amount = f"S/ {rng.choice(['-', ''])}{rng.randint(1, 2500)}.{rng.randint(0, 99):02d}"
+        detections.append([_box(40, y, 600, y + TEXT_HEIGHT), _name(rng), round(rng.uniform(0.6, 1.0), 3)])
+        detections.append([_box(40, y + 60, 100, y + 60 + TEXT_HEIGHT), str(rng.randint(1, 28)), 0.95])
+        detections.append([_box(800, y + 60, 1040, y + 60 + TEXT_HEIGHT), amount, 0.9])
+        y += SCREEN_ROW
+    
+    return detections, y + 100, SCREEN_WIDTH
+
+
+def offset_amount_screen() -> Tuple[List, int, int, List[Tuple[str, str]]]:
+    """
+    Captura de regresión para la distancia entre líneas de group_lines.
+    
+    Cada transacción tiene la descripción arriba y, debajo, el monto a la
+    derecha y el día a la izquierda 17 px más abajo (el monto va centrado
+    entre las dos líneas). Con texto de 30 px, la segunda línea está a
+    73.5 px de la descripción medida desde su centro, pero a 82 px medida
+    desde el día, su elemento de más a la izquierda; y la descripción
+    siguiente está a 84.5 px del centro, pero a 76 px del día. Con el límite
+    de 80 px, medir desde el elemento de más a la izquierda separa cada monto
+    de su descripción y lo une a la transacción siguiente.
+    
+    Returns:
+        Tupla (detecciones, alto, ancho, esperadas) con las transacciones
+        esperadas como (nombre, monto)
+    """
+    expected = [('YAPE-MARIA LOPEZ', 'S/ -25.50'), ('PLIN-JUAN PEREZ', 'S/ 120.00'), ('COMPRA TAMBO', 'S/ -8.90')]
+    detections = []
+    
+    y = SCREEN_TOP
+    for day, (name, amount) in enumerate(expected, start=10):
+        detections.append([_box(200, y, 600, y + TEXT_HEIGHT), name, 0.95])
+        detections.append([_box(800, y + 65, 1040, y + 65 + TEXT_HEIGHT), amount, 0.95])
+        detections.append([_box(200, y + 82, 260, y + 82 + TEXT_HEIGHT), str(day), 0.95])
+        y += OFFSET_AMOUNT_ROW
+    
+    return detections, y + 100, SCREEN_WIDTH, expected
+
+
+def synthetic_screens(count: int, n_transactions: int = 8, seed: int = 0) -> List[Tuple[List, int, int]]:
+    """
+    Genera las detecciones de varias capturas.
+    
+    Args:
+        count: Número de capturas
+        n_transactions: Transacciones por captura
+        seed: Semilla del generador
+    
+    Returns:
+        Lista de tuplas (detecciones, alto, ancho)
+    """
+    rng = random.Random(seed)
+    return [synthetic_screen(rng, n_transactions) for _ in range(count)]
+
+
+def synthetic_images(directory: str, count: int, seed: int = 0) -> List[str]:
+    """
+    Dibuja capturas sintéticas en PNG (para los benchmarks de la API).
+    
+    Args:
+        directory: Carpeta donde se guardan
+        count: Número de capturas
+        seed: Semilla del generador
+    
+    Returns:
+        Rutas de las imágenes
+    """
+    from PIL import Image, ImageDraw
+    
+    paths = []
+    for index, (detections, height, width) in enumerate(synthetic_screens(count, seed=seed)):
+        image = Image.new('RGB', (width, height), 'white')
+        draw = ImageDraw.Draw(image)
+        for bbox, text, _ in detections:
+            draw.text(tuple(bbox[0]), text, fill='black')
+        path = str(Path(directory) / f"screen_{index:04d}.png")
+        image.save(path)
+        paths.append(path)
+    return paths
+
+
+def synthetic_history(size: int, duplicate_ratio: float = 0.05, seed: int = 0) -> List[Transaction]:
+    """
+    Genera un histórico de transacciones con el formato de transactions.db.
+    
+    Una fracción de las filas repite (fecha, nombre, monto, moneda) de otra
+    fila con un ID distinto, como cuando se procesa dos veces la misma captura.
+    
+    Args:
+        size: Número total de transacciones
+        duplicate_ratio: Fracción de filas duplicadas
+        seed: Semilla del generador
+    
+    Returns:
+        Lista de transacciones
+    """
+    rng = random.Random(seed)
+    transactions = []
+    
+    for _ in range(size):
+        if transactions and rng.random() < duplicate_ratio:
+            transaction = rng.choice(transactions)._replace(id=str(uuid.UUID(int=rng.getrandbits(128))))
+            transactions.append(transaction)
+            continue
+        
+        year = rng.randint(2020, 2026)
+        month = rng.randint(1, 12)
+        amount = round(rng.uniform(1, 2500), 2)
+        tipo = rng.choice(['cargo', 'abono'])
+        transactions.append(Transaction(
+            id=str(uuid.UUID(int=rng.getrandbits(128))),
+            date=f"{rng.randint(1, 28):02d}/{month:02d}/{year}",
+            name=_name(rng),
+            amount=-amount if tipo == 'cargo' else amount,
+            type=tipo,
+            currency=rng.choice(['S/', 'S/', 'S/', '$']),
+            month=f"{MONTHS[month - 1]} {year}"
+        ))
+    
+    return transactions
+
+
+# Confusiones típicas del OCR en las descripciones
+OCR_CONFUSIONS = {'O': '0', 'Z': '2', 'S': '5', 'I': '1', 'B': '8', '-': ' ', ' ': '  '}
+
+
+def ocr_variants(transactions: List[Transaction], ratio: float = 0.5, seed: int = 0) -> List[Transaction]:
+    """
+    Copia las transacciones con ruido de OCR en la descripción de una
+    fracción de ellas (un carácter confundido), como al leer dos veces el
+    mismo movimiento desde capturas distintas.
+    
+    Args:
+        transactions: Transacciones de origen
+        ratio: Fracción de descripciones alteradas
+        seed: Semilla del generador
+    
+    Returns:
+        Lista de transacciones con IDs nuevos
+    """
+    rng = random.Random(seed)
+    variants = []
+    
+    for transaction in transactions:
+        name = transaction.name
+        if rng.random() < ratio:
+            positions = [i for i, char in enumerate(name) if char in OCR_CONFUSIONS]
+            if positions:
+                i = rng.choice(positions)
+                name = name[:i] + OCR_CONFUSIONS[name[i]] + name[i + 1:]
+        variants.append(transaction._replace(id=str(uuid.UUID(int=rng.getrandbits(128))), name=name))
+    
+    return variants
+
+
+def load_ocr_fixtures() -> List[Dict[str, Any]]:
+    """
+    Carga las detecciones de OCR reales guardadas con --record-ocr.
+    
+    Returns:
+        Lista de diccionarios con image, height, width y detections
+    """
+    fixtures = []
+    for path in sorted(OCR_FIXTURES_DIR.glob('*.json')):
+        with open(path, 'r', encoding='utf-8') as f:
+            fixtures.append(json.load(f))
+    return fixtures
+
+
+def save_ocr_fixture(image_path: str, detections: List, height: int, width: int) -> Path:
+    """
+    Guarda las detecciones de OCR de una imagen real.
+    
+    Args:
+        image_path: Ruta de la imagen original
+        detections: Resultado de readtext convertido a tipos nativos
+        height: Alto de la imagen
+        width: Ancho de la imagen
+    
+    Returns:
+        Ruta del archivo guardado
+    """
+    OCR_FIXTURES_DIR.mkdir(parents=True, exist_ok=True)
+    path = OCR_FIXTURES_DIR / f"{Path(image_path).stem}.json"
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'image': Path(image_path).name,
+            'height': height,
+            'width': width,
+            'detections': detections
+        }, f, ensure_ascii=False)
+    return path
@@ -0,0 +1,71 @@
+"""
+Implementaciones anteriores de partes del pipeline, conservadas como
+referencia para medir cuánto mejora la versión actual y comprobar que
+produce los mismos resultados.
+"""
+
+import re
+from typing import Any, Callable, List
+
+
+def legacy_classify(text: str) -> str:
+    """
+    Clasificación por texto tal como la hacía group_transaction_elements
+    antes de token_classifier: patrones en línea evaluados en cada llamada.
+    
+    Args:
+        text: Texto del OCR
+    
+    Returns:
+        "amount", "date", "description" o "noise"
+    """
+    text = text.strip()
+    
+    is_amount = (('S/' in text or 's/' in text or 'Sl' in text or 'sl' in text or 'SI' in text or '$' in text) and re.search(r'\d', text))
+    is_amount = is_amount or re.match(r'^-?\s*\d+[.,]\d+$', text)
+    
+    if is_amount:
+        return "amount"
+    elif re.match(r'^\d{1,2}(\s+(Enero|Febrero|Marzo|Abril|Mayo|Junio|Julio|Agosto|Septiembre|Octubre|Noviembre|Diciembre))?$', text, re.IGNORECASE):
+        return "date"
+    elif re.match(r'^\d{1,2}\s+\w+;\s*\d', text, re.IGNORECASE):
+        return "date"
+    elif len(text) > 2 and not text.isdigit() and 'S/' not in text and 's/' not in text and 'Sl' not in text and '$' not in text:
+        if text.lower() not in ['movimientos', 'fecha', 'monto', 'in', 'co', 'im', 'de', 'tr', '#', 'pm', 'p.m.', 'a.m.', 'pm.', 'a.m', 'ma', 'po', 'en', 'eb', 'ley', 'ex']:
+            return "description"
+    return "noise"
+
+
+def legacy_line_hints(text: str) -> tuple:
+    """Pistas de línea (monto, descripción) como se calculaban antes de token_classifier."""
+    has_amount = bool('S/' in text or 's/' in text or re.search(r'-?\s*\d+[.,]\d+', text))
+    has_description = len(text) > 3 and not text.isdigit() and 'S/' not in text
+    return has_amount, has_description
+
+
+def legacy_group_lines(layout: Any, starts_group: Callable[[Any], bool], max_lines: int = 5) -> List[List[Any]]:
+    """
+    line_layout.group_lines con la distancia entre líneas medida como antes:
+    desde el elemento de más a la izquierda de cada línea, no desde su centro.
+    """
+    lines = layout.lines
+    groups = []
+    i = 0
+    
+    while i < len(lines):
+        if not starts_group(lines[i]):
+            i += 1
+            continue
+        
+        group = [lines[i]]
+        j = i + 1
+        while j < len(lines) and j < i + max_lines:
+            if lines[j].items[0].y_center - group[-1].items[0].y_center > layout.group_gap:
+                break
+            group.append(lines[j])
+            j += 1
+        
+        groups.append(group)
+        i = j
+    
+    return groups
@@ -0,0 +1,503 @@
+#!/usr/bin/env python3
+"""
+Benchmarks del pipeline extracción → deduplicación → exportación.
+Mide tiempo y memoria máxima (tracemalloc) de cada etapa sin necesidad de
+cargar EasyOCR y guarda líneas base para detectar regresiones:
+
+    python benchmarks/run_benchmarks.py                           # tamaños 1k, 10k, 100k
+    python benchmarks/run_benchmarks.py --sizes 1000000 --stages dedup store export-streaming
+    python benchmarks/run_benchmarks.py --save-baseline main      # benchmarks/baselines/main.json
+    python benchmarks/run_benchmarks.py --compare main            # falla si algo empeora >20%
+    python benchmarks/run_benchmarks.py --record-ocr images/*     # guarda OCR real para ocr-cached
+
+Etapas:
+    ocr-group         group_transaction_elements sobre capturas sintéticas (antes comprueba la
+                      agrupación de offset_amount_screen y falla si no es la esperada)
+    ocr-group-tall    group_transaction_elements sobre una captura larga unida (8 × capturas transacciones)
+    ocr-parse         build_transactions sobre los grupos anteriores
+    ocr-cached        mes + agrupación + parseo sobre OCR real grabado (fixtures/ocr)
+    classify          token_classifier.classify_token sobre todos los textos de las capturas
+    classify-legacy   la clasificación anterior con patrones en línea (benchmarks/reference.py)
+    records           filas del histórico como Transaction (records.py)
+    records-dict      las mismas filas como diccionarios (formato anterior)
+    dedup             deduplicate_transactions sobre un histórico sintético
+    fuzzy-dedup       FuzzyDeduplicator: variantes de OCR del histórico contra el histórico guardado
+    store             TransactionStore.add_transactions en una base nueva
+    export-standard   ExcelExporter.create_excel (workbook en memoria)
+    export-streaming  ExcelExporter.create_excel con el motor write_only
+
+Etapas con EasyOCR real (no se incluyen por defecto, cargan el modelo):
+    ocr-readtext        readtext imagen por imagen sobre images/
+    ocr-readtext-batch  readtext_batch con todas las imágenes de images/ en un lote
+
+Etapas de la API contra mock_openai_server.py (no se incluyen por defecto):
+    api-single          ImageProcessor con una imagen por solicitud
+    api-packed          ImageProcessor con --api-pack imágenes por solicitud
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Any, Optional
+from unittest import mock
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fixtures import (synthetic_screens, synthetic_history, synthetic_images, offset_amount_screen,
+                      ocr_variants, load_ocr_fixtures, save_ocr_fixture)
+
+
+BASELINES_DIR = Path(__file__).parent / "baselines"
+
+EXTRACTION_STAGES = ['ocr-group', 'ocr-group-tall', 'ocr-parse', 'ocr-cached', 'classify', 'classify-legacy']
+HISTORY_STAGES = ['records', 'records-dict', 'dedup', 'fuzzy-dedup', 'store', 'export-standard', 'export-streaming']
+MODEL_STAGES = ['ocr-readtext', 'ocr-readtext-batch']
+API_STAGES = ['api-single', 'api-packed']
+ALL_STAGES = EXTRACTION_STAGES + HISTORY_STAGES
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+
+# Empeoramiento relativo a partir del cual --compare marca una regresión
+DEFAULT_TOLERANCE = 0.2
+
+# Latencia del servidor simulado: fija por solicitud y adicional por imagen
+MOCK_LATENCY = 0.5
+MOCK_IMAGE_LATENCY = 0.1
+
+# Diferencias de tiempo menores no cuentan como regresión (ruido de medición)
+MIN_TIME_DELTA = 0.01
+
+
+def measure(fn: Callable[[], Any], repeat: int = 3, memory: bool = True) -> Dict[str, float]:
+    """
+    Mide una etapa: mejor tiempo de `repeat` ejecuciones y memoria máxima.
+    
+    La memoria se mide en una ejecución aparte porque tracemalloc ralentiza
+    el código medido y falsearía los tiempos.
+    
+    Args:
+        fn: Función sin argumentos que ejecuta la etapa
+        repeat: Número de ejecuciones cronometradas
+        memory: Si es True, mide también la memoria máxima
+    
+    Returns:
+        Diccionario con seconds y peak_mb
+    """
+    times = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+        
+        peak_mb = None
+        if memory:
+            tracemalloc.start()
+            try:
+                fn()
+                peak_mb = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+            finally:
+                tracemalloc.stop()
+    
+    return {'seconds': min(times), 'peak_mb': peak_mb}
+
+
+def check_line_grouping() -> bool:
+    """
+    Agrupa offset_amount_screen con la distancia entre líneas actual (desde el
+    centro de cada línea) y con la anterior (desde su elemento de más a la
+    izquierda, reference.legacy_group_lines) y muestra cuál acierta.
+    
+    Returns:
+        True si la agrupación actual da las transacciones esperadas
+    """
+    import image_processor_local
+    from reference import legacy_group_lines
+    
+    processor = image_processor_local.LocalImageProcessor(ocr_server_url="")
+    detections, height, width, expected = offset_amount_screen()
+    
+    def extract() -> List[tuple]:
+        groups = processor.group_transaction_elements(detections, height, width)
+        return [(group['name'], group['amount_text']) for group in groups]
+    
+    current = extract()
+    with mock.patch.object(image_processor_local, 'group_lines', legacy_group_lines):
+        legacy = extract()
+    
+    print(f"🧪 offset_amount_screen: centro de línea {'✅' if current == expected else '❌'}, "
+          f"elemento de más a la izquierda {'✅' if legacy == expected else '❌'}")
+    if current != expected:
+        print(f"   Esperadas: {expected}\n   Obtenidas: {current}")
+    return current == expected
+
+
+def extraction_benchmarks(stages: List[str], screens: int, repeat: int, memory: bool) -> Dict[str, Dict[str, float]]:
+    """Benchmarks de agrupación y parseo sobre detecciones de OCR (sin EasyOCR)."""
+    from image_processor_local import LocalImageProcessor
+    
+    processor = LocalImageProcessor(ocr_server_url="")
+    results = {}
+    
+    fixtures = synthetic_screens(screens)
+    groups = [processor.group_transaction_elements(d, h, w) for d, h, w in fixtures]
+    
+    if 'ocr-group' in stages:
+        def run_group():
+            for detections, height, width in fixtures:
+                processor.group_transaction_elements(detections, height, width)
+        results[f'ocr-group[{screens}]'] = measure(run_group, repeat, memory)
+    
+    if 'ocr-group-tall' in stages:
+        (detections, height, width), = synthetic_screens(1, n_transactions=screens * 8)
+        results[f'ocr-group-tall[{screens * 8}]'] = measure(
+            lambda: processor.group_transaction_elements(detections, height, width), repeat, memory
+        )
+    
+    if 'ocr-parse' in stages:
+        def run_parse():
+            for screen_groups in groups:
+                processor.build_transactions(screen_groups, [False] * len(screen_groups), "Agosto 2025")
+        results[f'ocr-parse[{screens}]'] = measure(run_parse, repeat, memory)
+    
+    texts = [detection[1] for detections, _, _ in fixtures for detection in detections]
+    if 'classify' in stages:
+        from token_classifier import classify_token
+        results[f'classify[{len(texts)}]'] = measure(lambda: [classify_token(text) for text in texts], repeat, memory)
+    
+    if 'classify-legacy' in stages:
+        from reference import legacy_classify, legacy_line_hints
+        results[f'classify-legacy[{len(texts)}]'] = measure(
+            lambda: [(legacy_classify(text), legacy_line_hints(text)) for text in texts], repeat, memory
+        )
+    
+    if 'ocr-cached' in stages:
+        recorded = load_ocr_fixtures()
+        if not recorded:
+            print("⚠️  ocr-cached: no hay OCR grabado (usa --record-ocr)")
+        else:
+            def run_cached():
+                for fixture in recorded:
+                    detections = fixture['detections']
+                    month_year = processor.extract_month_year(fixture['image'], detections)
+                    screen_groups = processor.group_transaction_elements(detections, fixture['height'], fixture['width'])
+                    processor.build_transactions(screen_groups, [False] * len(screen_groups), month_year)
+            results[f'ocr-cached[{len(recorded)}]'] = measure(run_cached, repeat, memory)
+    
+    return results
+
+
+def history_benchmarks(stages: List[str], sizes: List[int], repeat: int, memory: bool) -> Dict[str, Dict[str, float]]:
+    """Benchmarks de deduplicación, almacén y exportación sobre históricos sintéticos."""
+    from main import deduplicate_transactions
+    from fuzzy_dedup import FuzzyDeduplicator
+    from transaction_store import TransactionStore
+    from excel_exporter import ExcelExporter, ENGINE_STANDARD, ENGINE_STREAMING
+    from records import Transaction
+    
+    results = {}
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in sizes:
+            history = synthetic_history(size)
+            
+            # Filas tal como salen de SQLite: la memoria medida es la de los contenedores
+            rows = [tuple(transaction) for transaction in history]
+            if 'records' in stages:
+                results[f'records[{size}]'] = measure(lambda: list(map(Transaction._make, rows)), repeat, memory)
+            
+            if 'records-dict' in stages:
+                fields = Transaction._fields
+                results[f'records-dict[{size}]'] = measure(
+                    lambda: [dict(zip(fields, row)) for row in rows], repeat, memory
+                )
+            
+            if 'dedup' in stages:
+                results[f'dedup[{size}]'] = measure(lambda: deduplicate_transactions(history), repeat, memory)
+            
+            if 'fuzzy-dedup' in stages:
+                fuzzy_db = os.path.join(tmp_dir, f'fuzzy-{size}.db')
+                with TransactionStore(fuzzy_db) as store:
+                    store.add_transactions(history)
+                    variants = ocr_variants(history)
+                    results[f'fuzzy-dedup[{size}]'] = measure(
+                        lambda: FuzzyDeduplicator(store).filter(variants), repeat, memory
+                    )
+            
+            if 'store' in stages:
+                db_path = os.path.join(tmp_dir, 'bench.db')
+                
+                def run_store():
+                    if os.path.exists(db_path):
+                        os.remove(db_path)
+                    with TransactionStore(db_path) as store:
+                        store.add_transactions(history)
+                results[f'store[{size}]'] = measure(run_store, repeat, memory)
+            
+            for engine in (ENGINE_STANDARD, ENGINE_STREAMING):
+                stage = f'export-{engine}'
+                if stage in stages:
+                    exporter = ExcelExporter(engine=engine)
+                    output_path = os.path.join(tmp_dir, f'{engine}.xlsx')
+                    results[f'{stage}[{size}]'] = measure(
+                        lambda: exporter.create_excel(history, output_path), repeat, memory
+                    )
+    
+    return results
+
+
+def model_benchmarks(stages: List[str], image_paths: List[str], repeat: int, memory: bool,
+                     gpu: bool) -> Dict[str, Dict[str, float]]:
+    """Benchmarks de EasyOCR real: imagen por imagen frente a un solo lote."""
+    import cv2
+    from image_processor_local import LocalImageProcessor
+    
+    processor = LocalImageProcessor(ocr_server_url="", gpu=gpu)
+    processor.reader  # La carga del modelo no forma parte de la medición
+    images = [image for image in (cv2.imread(path) for path in image_paths) if image is not None]
+    results = {}
+    
+    if 'ocr-readtext' in stages:
+        results[f'ocr-readtext[{len(images)}]'] = measure(
+            lambda: [processor.readtext(image) for image in images], repeat, memory
+        )
+    if 'ocr-readtext-batch' in stages:
+        results[f'ocr-readtext-batch[{len(images)}]'] = measure(
+            lambda: processor.readtext_batch(images), repeat, memory
+        )
+    
+    return results
+
+
+def api_benchmarks(stages: List[str], count: int, pack: int, workers: int, repeat: int,
+                   memory: bool) -> Dict[str, Dict[str, float]]:
+    """Benchmarks de la API contra el servidor simulado: solicitudes sueltas frente a paquetes."""
+    import threading
+    from image_processor import ImageProcessor
+    from mock_openai_server import create_server
+    
+    server = create_server(port=0, latency=MOCK_LATENCY, image_latency=MOCK_IMAGE_LATENCY)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}/v1"
+    results = {}
+    
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            image_paths = synthetic_images(tmp_dir, count)
+            
+            for stage, pack_images in (('api-single', 1), ('api-packed', pack)):
+                if stage not in stages:
+                    continue
+                processor = ImageProcessor("mock", base_url=base_url, pack_images=pack_images)
+                usage = {}
+                
+                def run_api():
+                    state = server.state
+                    requests, tokens = state.requests, state.tokens
+                    processor.extract_per_image(image_paths, workers)
+                    usage.update(requests=state.requests - requests, tokens=state.tokens - tokens)
+                
+                key = f'{stage}[{count}]' if pack_images == 1 else f'{stage}[{count}/{processor.pack_limit()}]'
+                results[key] = {**measure(run_api, repeat, memory), **usage}
+    finally:
+        server.shutdown()
+    
+    return results
+
+
+def record_ocr(image_paths: List[str]):
+    """
+    Ejecuta el OCR real sobre las imágenes y guarda las detecciones en
+    benchmarks/fixtures/ocr para la etapa ocr-cached.
+    
+    Args:
+        image_paths: Imágenes a procesar
+    """
+    import cv2
+    from image_processor_local import LocalImageProcessor
+    from ocr_server import to_builtin
+    
+    processor = LocalImageProcessor()
+    for image_path in image_paths:
+        image = cv2.imread(image_path)
+        if image is None:
+            print(f"❌ No se pudo leer la imagen: {image_path}")
+            continue
+        height, width = image.shape[:2]
+        detections = to_builtin(processor.readtext(image))
+        path = save_ocr_fixture(image_path, detections, height, width)
+        print(f"💾 {len(detections)} detecciones guardadas en {path}")
+
+
+def baseline_path(name: str) -> Path:
+    """Ruta de una línea base: nombre corto en benchmarks/baselines o ruta a un .json."""
+    if name.endswith('.json') or os.sep in name:
+        return Path(name)
+    return BASELINES_DIR / f"{name}.json"
+
+
+def save_baseline(name: str, results: Dict[str, Dict[str, float]]) -> Path:
+    """
+    Guarda los resultados como línea base junto con datos del entorno.
+    
+    Args:
+        name: Nombre o ruta de la línea base
+        results: Resultados por etapa
+    
+    Returns:
+        Ruta del archivo guardado
+    """
+    path = baseline_path(name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'results': results
+        }, f, indent=2, ensure_ascii=False)
+    return path
+
+
+def compare_with_baseline(name: str, results: Dict[str, Dict[str, float]], tolerance: float) -> int:
+    """
+    Compara los resultados con una línea base guardada.
+    
+    Args:
+        name: Nombre o ruta de la línea base
+        results: Resultados actuales por etapa
+        tolerance: Empeoramiento relativo permitido (0.2 = 20%)
+    
+    Returns:
+        Número de etapas con regresión
+    """
+    with open(baseline_path(name), 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    
+    print(f"\n📏 Comparación con '{name}' ({baseline['created']}, Python {baseline['python']})")
+    print(f"{'Etapa':<28} {'Tiempo':>10} {'Base':>10} {'Δ':>8} {'Memoria':>10} {'Base':>10} {'Δ':>8}")
+    
+    regressions = 0
+    for key, current in results.items():
+        previous = baseline['results'].get(key)
+        if not previous:
+            continue
+        
+        time_ratio = current['seconds'] / previous['seconds'] if previous['seconds'] else 1.0
+        memory_ratio = None
+        if current['peak_mb'] is not None and previous.get('peak_mb'):
+            memory_ratio = current['peak_mb'] / previous['peak_mb']
+        
+        slower = time_ratio > 1 + tolerance and current['seconds'] - previous['seconds'] > MIN_TIME_DELTA
+        worse = slower or (memory_ratio or 0) > 1 + tolerance
+        regressions += worse
+        
+        memory_cols = f"{'-':>10} {'-':>10} {'':>8}"
+        if memory_ratio is not None:
+            memory_cols = f"{current['peak_mb']:>8.2f}MB {previous['peak_mb']:>8.2f}MB {memory_ratio - 1:>+8.0%}"
+        print(f"{key:<28} {current['seconds']:>9.3f}s {previous['seconds']:>9.3f}s {time_ratio - 1:>+8.0%} "
+              f"{memory_cols}{'  ❌' if worse else ''}")
+    
+    if regressions:
+        print(f"\n❌ {regressions} etapas empeoraron más de un {tolerance:.0%}")
+    else:
+        print(f"\n✅ Sin regresiones (tolerancia {tolerance:.0%})")
+    return regressions
+
+
+def print_results(results: Dict[str, Dict[str, float]]):
+    """Muestra la tabla de resultados."""
+    print(f"\n{'='*52}")
+    print(f"{'Etapa':<28} {'Tiempo':>10} {'Memoria máx.':>12}")
+    print(f"{'='*52}")
+    for key, result in results.items():
+        memory = f"{result['peak_mb']:>10.2f}MB" if result['peak_mb'] is not None else f"{'-':>12}"
+        usage = f"  ({result['requests']} solicitudes, {result['tokens']} tokens)" if 'tokens' in result else ""
+        print(f"{key:<28} {result['seconds']:>9.3f}s {memory}{usage}")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmarks del pipeline de movimientos bancarios")
+    parser.add_argument('--stages', nargs='+', choices=ALL_STAGES + MODEL_STAGES + API_STAGES, default=ALL_STAGES,
+                        help="Etapas a medir (por defecto todas)")
+    parser.add_argument('--sizes', nargs='+', type=int, default=DEFAULT_SIZES,
+                        help="Tamaños de histórico para dedup, store y export")
+    parser.add_argument('--screens', type=int, default=500,
+                        help="Capturas sintéticas para ocr-group y ocr-parse")
+    parser.add_argument('--images', nargs='+', help="Imágenes para las etapas con EasyOCR (por defecto images/*)")
+    parser.add_argument('--gpu', action='store_true', help="Etapas con EasyOCR: usar la GPU")
+    parser.add_argument('--api-images', type=int, default=24, help="Etapas de la API: capturas sintéticas")
+    parser.add_argument('--api-pack', type=int, default=4, help="api-packed: imágenes por solicitud")
+    parser.add_argument('--api-workers', type=int, default=1, help="Etapas de la API: solicitudes simultáneas")
+    parser.add_argument('--repeat', type=int, default=3, help="Ejecuciones cronometradas por etapa")
+    parser.add_argument('--no-memory', action='store_true', help="No medir memoria (más rápido)")
+    parser.add_argument('--save-baseline', metavar='NOMBRE', help="Guardar los resultados como línea base")
+    parser.add_argument('--compare', metavar='NOMBRE', help="Comparar con una línea base guardada")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="Empeoramiento relativo permitido en --compare (0.2 = 20%%)")
+    parser.add_argument('--record-ocr', nargs='*', metavar='IMAGEN',
+                        help="Grabar OCR real de las imágenes (por defecto images/*) y salir")
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    
+    if args.record_ocr is not None:
+        image_paths = args.record_ocr or sorted(str(p) for p in (ROOT / 'images').glob('*'))
+        record_ocr(image_paths)
+        return 0
+    
+    memory = not args.no_memory
+    results = {}
+    grouping_ok = True
+    
+    stages = [stage for stage in args.stages if stage in EXTRACTION_STAGES]
+    if stages:
+        print(f"⏱️  Extracción: {args.screens} capturas sintéticas")
+        if 'ocr-group' in stages:
+            grouping_ok = check_line_grouping()
+        results.update(extraction_benchmarks(stages, args.screens, args.repeat, memory))
+    
+    stages = [stage for stage in args.stages if stage in HISTORY_STAGES]
+    if stages:
+        print(f"⏱️  Histórico: {', '.join(str(size) for size in args.sizes)} transacciones")
+        results.update(history_benchmarks(stages, args.sizes, args.repeat, memory))
+    
+    stages = [stage for stage in args.stages if stage in MODEL_STAGES]
+    if stages:
+        image_paths = args.images or sorted(str(p) for p in (ROOT / 'images').glob('*'))
+        print(f"⏱️  EasyOCR: {len(image_paths)} imágenes")
+        results.update(model_benchmarks(stages, image_paths, args.repeat, memory, args.gpu))
+    
+    stages = [stage for stage in args.stages if stage in API_STAGES]
+    if stages:
+        print(f"⏱️  API simulada: {args.api_images} capturas, {args.api_workers} solicitudes simultáneas")
+        results.update(api_benchmarks(stages, args.api_images, args.api_pack, args.api_workers,
+                                      args.repeat, memory))
+    
+    print_results(results)
+    
+    if args.save_baseline:
+        path = save_baseline(args.save_baseline, results)
+        print(f"\n💾 Línea base guardada: {path}")
+    
+    if args.compare and compare_with_baseline(args.compare, results, args.tolerance):
+        return 1
+    
+    return 0 if grouping_ok else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
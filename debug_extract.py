@@ -16,4 +16,4 @@ print(f"RESUMEN FINAL:")
 print(f"{'='*70}")
 print(f"Total extraído: {len(transactions)}")
 for i, t in enumerate(transactions, 1):
-    print(f"{i}. {t['date']} - {t['name'][:50]} - S/ {t['amount']} ({t['type']})")
+    print(f"{i}. {t.date} - {t.name[:50]} - S/ {t.amount} ({t.type})")
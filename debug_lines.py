@@ -5,6 +5,8 @@ Script de debug para ver cómo se agrupan las líneas horizontales
 
 import sys
 from image_processor_local import LocalImageProcessor
+from line_layout import build_layout
+from records import Detection
 
 def main():
     if len(sys.argv) < 2:
@@ -25,7 +27,7 @@ def main():
     
     # Hacer OCR
     print(f"🔍 Procesando: {image_path}")
-    ocr_results = processor.reader.readtext(image)
+    ocr_results = processor.readtext(image)
     
     # Filtrar por región
     header_threshold = height * 0.05
@@ -33,60 +35,29 @@ def main():
     
     relevant_detections = []
     for detection in ocr_results:
-        bbox = detection[0]
-        y_center = (bbox[0][1] + bbox[2][1]) / 2
-        x_center = (bbox[0][0] + bbox[2][0]) / 2
-        
-        if header_threshold < y_center < footer_threshold:
-            relevant_detections.append({
-                'bbox': bbox,
-                'text': detection[1],
-                'confidence': detection[2],
-                'y_center': y_center,
-                'x_center': x_center,
-                'x_left': bbox[0][0],
-                'x_right': bbox[2][0],
-                'y_top': bbox[0][1],
-                'y_bottom': bbox[2][1],
-                'width': bbox[2][0] - bbox[0][0],
-                'height': bbox[2][1] - bbox[0][1]
-            })
-    
-    # Ordenar por posición vertical
-    relevant_detections.sort(key=lambda x: x['y_center'])
+        item = Detection.from_ocr(detection)
+        if header_threshold < item.y_center < footer_threshold:
+            relevant_detections.append(item)
     
     print(f"\n📊 Total elementos relevantes: {len(relevant_detections)}")
     
     # Identificar líneas horizontales
-    lines = []
-    current_line = []
-    last_y = None
-    y_tolerance = 18
-    
-    print(f"\n🔍 Agrupando en líneas horizontales (tolerancia Y: {y_tolerance}px):\n")
+    layout = build_layout(relevant_detections)
     
-    for i, item in enumerate(relevant_detections):
-        y = item['y_center']
-        
-        if last_y is None or abs(y - last_y) <= y_tolerance:
-            current_line.append(item)
-            last_y = y if last_y is None else (last_y + y) / 2
-            print(f"  [{i+1}] Y={y:.1f} (diff={(y - (last_y if last_y else y)):.1f}) -> MISMA LÍNEA: {item['text']}")
-        else:
-            if current_line:
-                lines.append(sorted(current_line, key=lambda x: x['x_left']))
-                print(f"  ⬇️ NUEVA LÍNEA (distancia: {y - last_y:.1f}px)")
-            current_line = [item]
-            last_y = y
-            print(f"  [{i+1}] Y={y:.1f} -> NUEVA LÍNEA: {item['text']}")
+    print(f"\n🔍 Agrupando en líneas horizontales (altura de texto: {layout.text_height:.1f}px, "
+          f"tolerancia Y: {layout.line_tolerance:.1f}px, separación de transacción: {layout.group_gap:.1f}px):\n")
     
-    if current_line:
-        lines.append(sorted(current_line, key=lambda x: x['x_left']))
-    
-    print(f"\n📋 Total de líneas detectadas: {len(lines)}")
-    for i, line in enumerate(lines):
-        texts = ' | '.join([item['text'] for item in line])
-        print(f"  Línea {i+1}: {texts}")
+    last_y = None
+    for i, line in enumerate(layout.lines):
+        if last_y is not None:
+            print(f"  ⬇️ NUEVA LÍNEA (distancia: {line.y_center - last_y:.1f}px)")
+        for item in line.items:
+            print(f"  [{i+1}] Y={item.y_center:.1f} (diff={item.y_center - line.y_center:.1f}): {item.text}")
+        last_y = line.y_center
+    
+    print(f"\n📋 Total de líneas detectadas: {len(layout.lines)}")
+    for i, line in enumerate(layout.lines):
+        print(f"  Línea {i+1}: {line.text}")
 
 if __name__ == "__main__":
     main()
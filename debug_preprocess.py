@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Compara el OCR local con y sin preprocesamiento (reducción, grises, contraste):
+tiempo por imagen y coincidencia de las transacciones extraídas.
+
+    python debug_preprocess.py                  # usa las imágenes de images/
+    python debug_preprocess.py img1.jpg img2.jpg
+    python debug_preprocess.py --text-height 20 --contrast images/*.jpeg
+"""
+
+import argparse
+import glob
+import time
+
+from image_processor_local import LocalImageProcessor, PREPROCESS_TEXT_HEIGHT
+
+
+def transaction_keys(transactions):
+    """Claves comparables (fecha, nombre, monto) de una lista de transacciones."""
+    return {(t.date, t.name, t.amount) for t in transactions}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara el OCR local con y sin preprocesamiento")
+    parser.add_argument('images', nargs='*', help="Imágenes a comparar (por defecto: images/*)")
+    parser.add_argument('--text-height', type=int, default=PREPROCESS_TEXT_HEIGHT,
+                        help="Altura de texto objetivo en píxeles")
+    parser.add_argument('--contrast', action='store_true', help="Aplicar normalización de contraste")
+    parser.add_argument('--color', action='store_true', help="No convertir a escala de grises")
+    args = parser.parse_args()
+    
+    image_paths = args.images or sorted(glob.glob('images/*'))
+    if not image_paths:
+        print("❌ No se encontraron imágenes")
+        return 1
+    
+    # Mismo Reader para ambos procesadores: solo cambia el preprocesamiento
+    baseline = LocalImageProcessor(ocr_server_url="")
+    preprocessed = LocalImageProcessor(
+        ocr_server_url="",
+        preprocess=True,
+        target_text_height=args.text_height,
+        grayscale=not args.color,
+        normalize_contrast=args.contrast
+    )
+    preprocessed._reader = baseline.reader
+    
+    rows = []
+    for image_path in image_paths:
+        start = time.perf_counter()
+        original = baseline.extract_transactions(image_path)
+        original_time = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        reduced = preprocessed.extract_transactions(image_path)
+        reduced_time = time.perf_counter() - start
+        
+        expected = transaction_keys(original)
+        found = transaction_keys(reduced)
+        matched = len(expected & found)
+        rows.append((image_path, original_time, reduced_time, len(expected), len(found), matched))
+    
+    print(f"\n{'='*90}")
+    print(f"{'Imagen':<40} {'Original':>9} {'Preproc.':>9} {'Veloc.':>7} {'Trans.':>7} {'Coinc.':>7}")
+    print(f"{'='*90}")
+    for image_path, original_time, reduced_time, expected, found, matched in rows:
+        name = image_path[-40:]
+        speedup = original_time / reduced_time if reduced_time else 0
+        accuracy = matched / expected if expected else 1.0
+        print(f"{name:<40} {original_time:>8.2f}s {reduced_time:>8.2f}s {speedup:>6.2f}x "
+              f"{found:>3}/{expected:<3} {accuracy:>6.0%}")
+    
+    total_original = sum(row[1] for row in rows)
+    total_reduced = sum(row[2] for row in rows)
+    total_expected = sum(row[3] for row in rows)
+    total_matched = sum(row[5] for row in rows)
+    print(f"{'-'*90}")
+    print(f"{'TOTAL':<40} {total_original:>8.2f}s {total_reduced:>8.2f}s "
+          f"{total_original / total_reduced if total_reduced else 0:>6.2f}x "
+          f"{'':>7} {total_matched / total_expected if total_expected else 1.0:>6.0%}")
+    
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
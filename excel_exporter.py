@@ -3,18 +3,31 @@ Módulo para exportar transacciones bancarias a Excel.
 Organiza por meses y formatea con información de cuenta.
 """
 
-from typing import List, Dict, Any
+from typing import List, Dict
 from datetime import datetime
+from io import BytesIO
 from pathlib import Path
 import openpyxl
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, Alignment, PatternFill, Border, Side, NamedStyle
+from openpyxl.styles.borders import DEFAULT_BORDER
+from openpyxl.styles.fonts import DEFAULT_FONT
 from openpyxl.utils import get_column_letter
 
+from records import Transaction
+from xlsx_patch import read_sheet_names, replace_sheets
+
+
+# Motores de escritura disponibles
+ENGINE_STANDARD = "standard"    # Workbook completo en memoria (permite actualización incremental)
+ENGINE_STREAMING = "streaming"  # openpyxl write_only: memoria constante con historiales grandes
+
 
 class ExcelExporter:
     """Exportador de transacciones a Excel."""
     
-    def __init__(self, account_type: str = "Cuenta", account_number: str = "", bank_name: str = "Banco"):
+    def __init__(self, account_type: str = "Cuenta", account_number: str = "", bank_name: str = "Banco",
+                 engine: str = ENGINE_STANDARD):
         """
         Inicializa el exportador.
         
@@ -22,12 +35,17 @@ class ExcelExporter:
             account_type: Tipo de cuenta (ej: "Cuenta Corriente")
             account_number: Número de cuenta
             bank_name: Nombre del banco
+            engine: Motor de escritura para create_excel ("standard" o "streaming")
         """
+        if engine not in (ENGINE_STANDARD, ENGINE_STREAMING):
+            raise ValueError(f"Motor de Excel desconocido: {engine}")
+        
         self.account_type = account_type
         self.account_number = account_number
         self.bank_name = bank_name
+        self.engine = engine
     
-    def sort_transactions(self, transactions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def sort_transactions(self, transactions: List[Transaction]) -> List[Transaction]:
         """
         Ordena transacciones por fecha descendente (más reciente primero).
         
@@ -39,14 +57,13 @@ class ExcelExporter:
         """
         def parse_date(transaction):
             try:
-                date_str = transaction.get('date', '01/01/2000')
-                return datetime.strptime(date_str, '%d/%m/%Y')
+                return datetime.strptime(transaction.date, '%d/%m/%Y')
             except:
                 return datetime.min
         
         return sorted(transactions, key=parse_date, reverse=True)
     
-    def group_by_month(self, transactions: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    def group_by_month(self, transactions: List[Transaction]) -> Dict[str, List[Transaction]]:
         """
         Agrupa transacciones por mes.
         
@@ -59,7 +76,7 @@ class ExcelExporter:
         grouped = {}
         
         for transaction in transactions:
-            month = transaction.get('month', 'Sin mes')
+            month = transaction.month
             if month not in grouped:
                 grouped[month] = []
             grouped[month].append(transaction)
@@ -70,7 +87,7 @@ class ExcelExporter:
         
         return grouped
     
-    def create_excel(self, transactions: List[Dict[str, Any]], output_path: str = "output/movimientos_bancarios.xlsx"):
+    def create_excel(self, transactions: List[Transaction], output_path: str = "output/movimientos_bancarios.xlsx"):
         """
         Crea archivo Excel con las transacciones.
         
@@ -91,144 +108,365 @@ class ExcelExporter:
             print("⚠️  No hay transacciones para exportar")
             return
         
+        if self.engine == ENGINE_STREAMING:
+            self.create_excel_streaming(grouped, output_path)
+            print(f"\n✅ Excel generado: {output_path}")
+            print(f"📑 Hojas creadas: {len(grouped)}")
+            print(f"📊 Total transacciones: {len(transactions)}")
+            return
+        
         # Crear workbook
         wb = openpyxl.Workbook()
         wb.remove(wb.active)  # Remover hoja por defecto
         
-        # Estilos
-        header_font = Font(bold=True, size=11, color="FFFFFF")
-        header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-        title_font = Font(bold=True, size=14, color="1F4E78")
+        # Crear una hoja por mes
+        for month, month_transactions in grouped.items():
+            ws = wb.create_sheet(title=self.sheet_name(month))
+            self.write_month_sheet(ws, month, month_transactions)
+        
+        # Guardar archivo
+        wb.save(output_path)
+        print(f"\n✅ Excel generado: {output_path}")
+        print(f"📑 Hojas creadas: {len(grouped)}")
+        print(f"📊 Total transacciones: {len(transactions)}")
+    
+    def create_named_styles(self) -> List[NamedStyle]:
+        """
+        Crea los estilos con nombre que comparten todas las celdas del modo streaming.
+        Las celdas sin fuente o borde propio usan los valores por defecto del
+        workbook, igual que en el motor estándar.
+        
+        Returns:
+            Lista de estilos para registrar en el workbook
+        """
         border = Border(
             left=Side(style='thin'),
             right=Side(style='thin'),
             top=Side(style='thin'),
             bottom=Side(style='thin')
         )
+        center = Alignment(horizontal='center')
+        
+        return [
+            NamedStyle(name='mov_title', font=Font(bold=True, size=14, color="1F4E78"),
+                       alignment=Alignment(horizontal='center', vertical='center'), border=DEFAULT_BORDER),
+            NamedStyle(name='mov_header', font=Font(bold=True, size=11, color="FFFFFF"),
+                       fill=PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid"),
+                       alignment=Alignment(horizontal='center', vertical='center'), border=border),
+            NamedStyle(name='mov_center', font=DEFAULT_FONT, alignment=center, border=border),
+            NamedStyle(name='mov_left', font=DEFAULT_FONT, alignment=Alignment(horizontal='left'), border=border),
+            NamedStyle(name='mov_type_cargo', font=Font(color="C00000"), alignment=center, border=border),
+            NamedStyle(name='mov_type_abono', font=Font(color="00B050"), alignment=center, border=border),
+            NamedStyle(name='mov_amount_cargo', font=Font(color="C00000"), number_format='#,##0.00',
+                       alignment=Alignment(horizontal='right'), border=border),
+            NamedStyle(name='mov_amount_abono', font=Font(color="00B050"), number_format='#,##0.00',
+                       alignment=Alignment(horizontal='right'), border=border),
+            NamedStyle(name='mov_total_label', font=Font(bold=True), border=DEFAULT_BORDER),
+            NamedStyle(name='mov_total_cargo', font=Font(bold=True, color="C00000"),
+                       number_format='#,##0.00', border=DEFAULT_BORDER),
+            NamedStyle(name='mov_total_abono', font=Font(bold=True, color="00B050"),
+                       number_format='#,##0.00', border=DEFAULT_BORDER),
+            NamedStyle(name='mov_balance', font=Font(bold=True, color="1F4E78"),
+                       number_format='#,##0.00', border=DEFAULT_BORDER),
+        ]
+    
+    def create_excel_streaming(self, grouped: Dict[str, List[Transaction]], output_path: str):
+        """
+        Escribe el Excel fila a fila con openpyxl en modo write_only.
+        
+        El resultado es visualmente igual al del motor estándar, pero las filas
+        se vuelcan al disco a medida que se escriben y todas las celdas
+        reutilizan un pequeño conjunto de estilos con nombre.
+        
+        Args:
+            grouped: Transacciones agrupadas por mes, ya ordenadas
+            output_path: Ruta del archivo de salida
+        """
+        wb = openpyxl.Workbook(write_only=True)
+        for style in self.create_named_styles():
+            wb.add_named_style(style)
         
-        # Crear una hoja por mes
         for month, month_transactions in grouped.items():
-            # Nombre seguro para la hoja (máximo 31 caracteres)
-            sheet_name = month[:31] if len(month) <= 31 else month[:28] + "..."
-            ws = wb.create_sheet(title=sheet_name)
+            ws = wb.create_sheet(title=self.sheet_name(month))
+            
+            # En write_only, anchos, altos y celdas combinadas se definen antes de escribir filas
+            ws.column_dimensions['A'].width = 12
+            ws.column_dimensions['B'].width = 35
+            ws.column_dimensions['C'].width = 10
+            ws.column_dimensions['D'].width = 15
+            ws.column_dimensions['E'].width = 8
+            ws.row_dimensions[1].height = 25
+            ws.merged_cells.add('A1:E1')
+            
+            def styled(value, style):
+                cell = WriteOnlyCell(ws, value=value)
+                cell.style = style
+                return cell
             
             # Título con información de cuenta
             title = f"{month} - {self.account_type}"
             if self.account_number:
                 title += f" N° {self.account_number}"
             title += f" - {self.bank_name}"
-            
-            ws.merge_cells('A1:E1')
-            title_cell = ws['A1']
-            title_cell.value = title
-            title_cell.font = title_font
-            title_cell.alignment = Alignment(horizontal='center', vertical='center')
-            ws.row_dimensions[1].height = 25
+            ws.append([styled(title, 'mov_title')])
+            ws.append([])
             
             # Encabezados de columna
             headers = ['Fecha', 'Descripción', 'Tipo', 'Monto', 'Moneda']
-            for col_num, header in enumerate(headers, 1):
-                cell = ws.cell(row=3, column=col_num)
-                cell.value = header
-                cell.font = header_font
-                cell.fill = header_fill
-                cell.alignment = Alignment(horizontal='center', vertical='center')
-                cell.border = border
+            ws.append([styled(header, 'mov_header') for header in headers])
             
             # Datos de transacciones
-            row_num = 4
+            total_cargos = 0
+            total_abonos = 0
             for transaction in month_transactions:
-                # Fecha
-                cell = ws.cell(row=row_num, column=1)
-                cell.value = transaction.get('date', '')
-                cell.alignment = Alignment(horizontal='center')
-                cell.border = border
-                
-                # Descripción
-                cell = ws.cell(row=row_num, column=2)
-                cell.value = transaction.get('name', '')
-                cell.alignment = Alignment(horizontal='left')
-                cell.border = border
-                
-                # Tipo
-                cell = ws.cell(row=row_num, column=3)
-                cell.value = transaction.get('type', '').capitalize()
-                cell.alignment = Alignment(horizontal='center')
-                cell.border = border
-                
-                # Color basado en tipo
-                if transaction.get('type') == 'cargo':
-                    cell.font = Font(color="C00000")  # Rojo para cargos
-                else:
-                    cell.font = Font(color="00B050")  # Verde para abonos
-                
-                # Monto
-                cell = ws.cell(row=row_num, column=4)
-                amount = transaction.get('amount', 0)
-                # Si es cargo, mantener el signo negativo; si es abono, valor positivo
-                if transaction.get('type') == 'cargo':
-                    cell.value = -abs(amount)  # Negativo para cargos
-                else:
-                    cell.value = abs(amount)  # Positivo para abonos
-                cell.number_format = '#,##0.00'
-                cell.alignment = Alignment(horizontal='right')
-                cell.border = border
-                
-                # Aplicar color al monto también
-                if transaction.get('type') == 'cargo':
-                    cell.font = Font(color="C00000")
+                tipo = transaction.type
+                amount = transaction.amount
+                if tipo == 'cargo':
+                    total_cargos += abs(amount)
+                    amount_value = -abs(amount)
+                    suffix = 'cargo'
                 else:
-                    cell.font = Font(color="00B050")
-                
-                # Moneda
-                cell = ws.cell(row=row_num, column=5)
-                cell.value = transaction.get('currency', 'S/')  # Usar moneda de la transacción
-                cell.alignment = Alignment(horizontal='center')
-                cell.border = border
+                    if tipo == 'abono':
+                        total_abonos += abs(amount)
+                    amount_value = abs(amount)
+                    suffix = 'abono'
                 
-                row_num += 1
+                ws.append([
+                    styled(transaction.date, 'mov_center'),
+                    styled(transaction.name, 'mov_left'),
+                    styled(tipo.capitalize(), f'mov_type_{suffix}'),
+                    styled(amount_value, f'mov_amount_{suffix}'),
+                    styled(transaction.currency, 'mov_center')
+                ])
             
             # Totales
-            row_num += 1
-            total_cargos = sum(abs(t['amount']) for t in month_transactions if t.get('type') == 'cargo')
-            total_abonos = sum(abs(t['amount']) for t in month_transactions if t.get('type') == 'abono')
-            balance = total_abonos - total_cargos
-            
-            # Total Cargos
-            ws.cell(row=row_num, column=2).value = "Total Cargos:"
-            ws.cell(row=row_num, column=2).font = Font(bold=True)
-            ws.cell(row=row_num, column=4).value = total_cargos
-            ws.cell(row=row_num, column=4).number_format = '#,##0.00'
-            ws.cell(row=row_num, column=4).font = Font(bold=True, color="C00000")
-            ws.cell(row=row_num, column=5).value = 'S/'
-            
-            # Total Abonos
-            row_num += 1
-            ws.cell(row=row_num, column=2).value = "Total Abonos:"
-            ws.cell(row=row_num, column=2).font = Font(bold=True)
-            ws.cell(row=row_num, column=4).value = total_abonos
-            ws.cell(row=row_num, column=4).number_format = '#,##0.00'
-            ws.cell(row=row_num, column=4).font = Font(bold=True, color="00B050")
-            ws.cell(row=row_num, column=5).value = 'S/'
-            
-            # Balance
-            row_num += 1
-            ws.cell(row=row_num, column=2).value = "Balance:"
-            ws.cell(row=row_num, column=2).font = Font(bold=True)
-            ws.cell(row=row_num, column=4).value = balance
-            ws.cell(row=row_num, column=4).number_format = '#,##0.00'
-            ws.cell(row=row_num, column=4).font = Font(bold=True, color="1F4E78")
-            ws.cell(row=row_num, column=5).value = 'S/'
-            
-            # Ajustar anchos de columna
-            ws.column_dimensions['A'].width = 12
-            ws.column_dimensions['B'].width = 35
-            ws.column_dimensions['C'].width = 10
-            ws.column_dimensions['D'].width = 15
-            ws.column_dimensions['E'].width = 8
+            ws.append([])
+            ws.append([None, styled("Total Cargos:", 'mov_total_label'), None,
+                       styled(total_cargos, 'mov_total_cargo'), 'S/'])
+            ws.append([None, styled("Total Abonos:", 'mov_total_label'), None,
+                       styled(total_abonos, 'mov_total_abono'), 'S/'])
+            ws.append([None, styled("Balance:", 'mov_total_label'), None,
+                       styled(total_abonos - total_cargos, 'mov_balance'), 'S/'])
         
-        # Guardar archivo
         wb.save(output_path)
-        print(f"\n✅ Excel generado: {output_path}")
-        print(f"📑 Hojas creadas: {len(grouped)}")
-        print(f"📊 Total transacciones: {len(transactions)}")
+    
+    def update_excel(self, month_transactions: Dict[str, List[Transaction]],
+                     output_path: str = "output/movimientos_bancarios.xlsx"):
+        """
+        Actualiza un Excel existente reescribiendo solo las hojas de los meses indicados.
+        
+        Las hojas de los meses indicados se generan en un libro aparte y se
+        copian al archivo a nivel de zip (ver xlsx_patch): las demás hojas no
+        se cargan ni se vuelven a serializar y conservan su contenido exacto.
+        Si el archivo no existe, se crea completo.
+        
+        Args:
+            month_transactions: Todas las transacciones de cada mes modificado
+            output_path: Ruta del archivo Excel
+        """
+        if not Path(output_path).exists():
+            transactions = [t for month in month_transactions.values() for t in month]
+            self.create_excel(transactions, output_path)
+            return
+        
+        sheetnames = read_sheet_names(output_path)
+        order = list(sheetnames)
+        
+        wb = openpyxl.Workbook()
+        wb.remove(wb.active)
+        
+        for month, transactions in month_transactions.items():
+            sheet_name = self.sheet_name(month)
+            if sheet_name not in order:
+                order.insert(self.sheet_position(order, month), sheet_name)
+            ws = wb.create_sheet(title=sheet_name)
+            self.write_month_sheet(ws, month, self.sort_transactions(transactions))
+        
+        patch = BytesIO()
+        wb.save(patch)
+        replace_sheets(output_path, patch, order)
+        print(f"\n✅ Excel actualizado: {output_path}")
+        print(f"📑 Hojas reescritas: {len(month_transactions)} de {len(order)}")
+    
+    def month_sort_key(self, month: str) -> tuple:
+        """
+        Clave de orden cronológico de un mes (ej: "Agosto 2025" -> (2025, 8)).
+        
+        Args:
+            month: Mes en formato "Mes Año"
+            
+        Returns:
+            Tupla (año, mes), o (0, 0) si no se reconoce
+        """
+        meses = ['enero', 'febrero', 'marzo', 'abril', 'mayo', 'junio', 'julio',
+                 'agosto', 'septiembre', 'octubre', 'noviembre', 'diciembre']
+        parts = month.lower().split()
+        if len(parts) == 2 and parts[0] in meses and parts[1].isdigit():
+            return int(parts[1]), meses.index(parts[0]) + 1
+        return 0, 0
+    
+    def sheet_position(self, sheetnames: List[str], month: str) -> int:
+        """
+        Posición para la hoja de un mes nuevo, manteniendo el orden de más
+        reciente a más antiguo.
+        
+        Args:
+            sheetnames: Nombres de las hojas existentes
+            month: Mes de la nueva hoja
+            
+        Returns:
+            Índice donde insertar la hoja
+        """
+        key = self.month_sort_key(month)
+        for index, name in enumerate(sheetnames):
+            if self.month_sort_key(name) < key:
+                return index
+        return len(sheetnames)
+    
+    def sheet_name(self, month: str) -> str:
+        """
+        Nombre seguro para la hoja de un mes (máximo 31 caracteres).
+        
+        Args:
+            month: Mes (ej: "Agosto 2025")
+            
+        Returns:
+            Nombre de la hoja
+        """
+        return month[:31] if len(month) <= 31 else month[:28] + "..."
+    
+    def write_month_sheet(self, ws, month: str, month_transactions: List[Transaction]):
+        """
+        Escribe en una hoja vacía el título, las transacciones y los totales de un mes.
+        
+        Args:
+            ws: Hoja de openpyxl recién creada
+            month: Mes de la hoja (ej: "Agosto 2025")
+            month_transactions: Transacciones del mes, ya ordenadas
+        """
+        # Estilos
+        header_font = Font(bold=True, size=11, color="FFFFFF")
+        header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
+        title_font = Font(bold=True, size=14, color="1F4E78")
+        border = Border(
+            left=Side(style='thin'),
+            right=Side(style='thin'),
+            top=Side(style='thin'),
+            bottom=Side(style='thin')
+        )
+        
+        
+        # Título con información de cuenta
+        title = f"{month} - {self.account_type}"
+        if self.account_number:
+            title += f" N° {self.account_number}"
+        title += f" - {self.bank_name}"
+        
+        ws.merge_cells('A1:E1')
+        title_cell = ws['A1']
+        title_cell.value = title
+        title_cell.font = title_font
+        title_cell.alignment = Alignment(horizontal='center', vertical='center')
+        ws.row_dimensions[1].height = 25
+        
+        # Encabezados de columna
+        headers = ['Fecha', 'Descripción', 'Tipo', 'Monto', 'Moneda']
+        for col_num, header in enumerate(headers, 1):
+            cell = ws.cell(row=3, column=col_num)
+            cell.value = header
+            cell.font = header_font
+            cell.fill = header_fill
+            cell.alignment = Alignment(horizontal='center', vertical='center')
+            cell.border = border
+        
+        # Datos de transacciones
+        row_num = 4
+        for transaction in month_transactions:
+            # Fecha
+            cell = ws.cell(row=row_num, column=1)
+            cell.value = transaction.date
+            cell.alignment = Alignment(horizontal='center')
+            cell.border = border
+            
+            # Descripción
+            cell = ws.cell(row=row_num, column=2)
+            cell.value = transaction.name
+            cell.alignment = Alignment(horizontal='left')
+            cell.border = border
+            
+            # Tipo
+            cell = ws.cell(row=row_num, column=3)
+            cell.value = transaction.type.capitalize()
+            cell.alignment = Alignment(horizontal='center')
+            cell.border = border
+            
+            # Color basado en tipo
+            if transaction.type == 'cargo':
+                cell.font = Font(color="C00000")  # Rojo para cargos
+            else:
+                cell.font = Font(color="00B050")  # Verde para abonos
+            
+            # Monto
+            cell = ws.cell(row=row_num, column=4)
+            amount = transaction.amount
+            # Si es cargo, mantener el signo negativo; si es abono, valor positivo
+            if transaction.type == 'cargo':
+                cell.value = -abs(amount)  # Negativo para cargos
+            else:
+                cell.value = abs(amount)  # Positivo para abonos
+            cell.number_format = '#,##0.00'
+            cell.alignment = Alignment(horizontal='right')
+            cell.border = border
+            
+            # Aplicar color al monto también
+            if transaction.type == 'cargo':
+                cell.font = Font(color="C00000")
+            else:
+                cell.font = Font(color="00B050")
+            
+            # Moneda
+            cell = ws.cell(row=row_num, column=5)
+            cell.value = transaction.currency  # Usar moneda de la transacción
+            cell.alignment = Alignment(horizontal='center')
+            cell.border = border
+            
+            row_num += 1
+        
+        # Totales
+        row_num += 1
+        total_cargos = sum(abs(t.amount) for t in month_transactions if t.type == 'cargo')
+        total_abonos = sum(abs(t.amount) for t in month_transactions if t.type == 'abono')
+        balance = total_abonos - total_cargos
+        
+        # Total Cargos
+        ws.cell(row=row_num, column=2).value = "Total Cargos:"
+        ws.cell(row=row_num, column=2).font = Font(bold=True)
+        ws.cell(row=row_num, column=4).value = total_cargos
+        ws.cell(row=row_num, column=4).number_format = '#,##0.00'
+        ws.cell(row=row_num, column=4).font = Font(bold=True, color="C00000")
+        ws.cell(row=row_num, column=5).value = 'S/'
+        
+        # Total Abonos
+        row_num += 1
+        ws.cell(row=row_num, column=2).value = "Total Abonos:"
+        ws.cell(row=row_num, column=2).font = Font(bold=True)
+        ws.cell(row=row_num, column=4).value = total_abonos
+        ws.cell(row=row_num, column=4).number_format = '#,##0.00'
+        ws.cell(row=row_num, column=4).font = Font(bold=True, color="00B050")
+        ws.cell(row=row_num, column=5).value = 'S/'
+        
+        # Balance
+        row_num += 1
+        ws.cell(row=row_num, column=2).value = "Balance:"
+        ws.cell(row=row_num, column=2).font = Font(bold=True)
+        ws.cell(row=row_num, column=4).value = balance
+        ws.cell(row=row_num, column=4).number_format = '#,##0.00'
+        ws.cell(row=row_num, column=4).font = Font(bold=True, color="1F4E78")
+        ws.cell(row=row_num, column=5).value = 'S/'
+        
+        # Ajustar anchos de columna
+        ws.column_dimensions['A'].width = 12
+        ws.column_dimensions['B'].width = 35
+        ws.column_dimensions['C'].width = 10
+        ws.column_dimensions['D'].width = 15
+        ws.column_dimensions['E'].width = 8
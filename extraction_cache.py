@@ -0,0 +1,170 @@
+"""
+Caché persistente de resultados de extracción.
+Cada entrada se identifica por el SHA-256 de los bytes de la imagen más el tipo
+y la versión del procesador, así que una imagen ya procesada no vuelve a pasar
+por OCR ni por la API aunque cambie de nombre o de carpeta.
+"""
+
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import List, Optional
+
+from records import Transaction
+
+
+# Directorio de la caché
+CACHE_DIR = ".cache/extracciones"
+
+# Límites por defecto para la limpieza de entradas
+CACHE_MAX_ENTRIES = 5000
+CACHE_MAX_AGE_DAYS = 90
+
+
+def hash_image(image_path: str) -> str:
+    """
+    Calcula el SHA-256 del contenido de una imagen.
+    
+    Args:
+        image_path: Ruta a la imagen
+    
+    Returns:
+        Hash hexadecimal de los bytes del archivo
+    """
+    digest = hashlib.sha256()
+    with open(image_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ExtractionCache:
+    """Caché en disco de transacciones extraídas, una entrada JSON por imagen."""
+    
+    def __init__(self, cache_dir: str = CACHE_DIR, max_entries: int = CACHE_MAX_ENTRIES,
+                 max_age_days: float = CACHE_MAX_AGE_DAYS):
+        """
+        Inicializa la caché.
+        
+        Args:
+            cache_dir: Directorio donde se guardan las entradas
+            max_entries: Número máximo de entradas (se eliminan las menos usadas)
+            max_age_days: Antigüedad máxima de una entrada en días
+        """
+        self.cache_dir = Path(cache_dir)
+        self.max_entries = max_entries
+        self.max_age = max_age_days * 24 * 3600
+        self.hits = 0
+        self.misses = 0
+    
+    def make_key(self, image_path: str, processor_kind: str, processor_version: str) -> str:
+        """
+        Construye la clave de una imagen para un procesador concreto.
+        
+        Args:
+            image_path: Ruta a la imagen
+            processor_kind: Tipo de procesador (ej: "local-easyocr", "api-gpt-4o")
+            processor_version: Versión del algoritmo del procesador
+        
+        Returns:
+            Clave hexadecimal
+        """
+        image_hash = hash_image(image_path)
+        return hashlib.sha256(f"{image_hash}:{processor_kind}:{processor_version}".encode('utf-8')).hexdigest()
+    
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+    
+    def get(self, key: str) -> Optional[List[Transaction]]:
+        """
+        Busca las transacciones guardadas para una clave.
+        
+        Args:
+            key: Clave generada con make_key
+        
+        Returns:
+            Lista de transacciones o None si no hay entrada válida
+        """
+        path = self._entry_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        
+        if time.time() - entry.get('created', 0) > self.max_age:
+            path.unlink(missing_ok=True)
+            self.misses += 1
+            return None
+        
+        # Actualizar la fecha de acceso para la limpieza por uso (LRU)
+        os.utime(path)
+        self.hits += 1
+        return [Transaction.from_dict(transaction) for transaction in entry.get('transactions', [])]
+    
+    def put(self, key: str, transactions: List[Transaction], image_path: str = ""):
+        """
+        Guarda las transacciones extraídas de una imagen.
+        
+        Los resultados vacíos no se guardan: el procesador devuelve una lista
+        vacía también cuando falla, y ese caso debe reintentarse.
+        
+        Args:
+            key: Clave generada con make_key
+            transactions: Transacciones extraídas
+            image_path: Ruta original de la imagen (solo informativa)
+        """
+        if not transactions:
+            return
+        
+        path = self._entry_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        entry = {
+            'created': time.time(),
+            'image': Path(image_path).name,
+            'transactions': [transaction.to_dict() for transaction in transactions]
+        }
+        
+        # Escritura atómica para no dejar entradas corruptas si se interrumpe
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    
+    def evict(self) -> int:
+        """
+        Elimina entradas caducadas y, si se supera el máximo, las menos usadas.
+        
+        Returns:
+            Número de entradas eliminadas
+        """
+        if not self.cache_dir.exists():
+            return 0
+        
+        now = time.time()
+        entries = []
+        removed = 0
+        
+        for path in self.cache_dir.glob('*/*.json'):
+            try:
+                mtime = path.stat().st_mtime
+            except OSError:
+                continue
+            # La fecha de modificación se actualiza en cada acceso, así que una
+            # entrada sin uso durante max_age también se considera caducada
+            if now - mtime > self.max_age:
+                path.unlink(missing_ok=True)
+                removed += 1
+            else:
+                entries.append((mtime, path))
+        
+        if len(entries) > self.max_entries:
+            entries.sort()
+            for _, path in entries[:len(entries) - self.max_entries]:
+                path.unlink(missing_ok=True)
+                removed += 1
+        
+        return removed
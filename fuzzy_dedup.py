@@ -0,0 +1,146 @@
+"""
+Deduplicación aproximada de transacciones con ruido de OCR.
+Dos capturas del mismo movimiento pueden leer la descripción de forma
+distinta ("PLIN-JUAN PEREZ" y "PLIN JUAN PERE2"), y la clave exacta de
+deduplicación las trata como movimientos diferentes. Aquí las candidatas se
+agrupan en bloques por (fecha, moneda, monto en céntimos) y solo se comparan
+las descripciones dentro de cada bloque, así que el coste crece de forma casi
+lineal con el número de transacciones en lugar de cuadrática.
+"""
+
+import re
+from difflib import SequenceMatcher
+from typing import List, Dict, NamedTuple, Optional, Tuple
+
+from records import Transaction, normalize_amount, normalize_currency, normalize_name
+from transaction_store import TransactionStore
+
+
+# Similitud mínima (0-1) entre descripciones para considerarlas el mismo movimiento.
+# main.py no la aplica por defecto (--fuzzy-threshold): dos pagos reales del
+# mismo día y monto a beneficiarios de nombre parecido también la superan.
+DEFAULT_THRESHOLD = 0.85
+
+SEPARATOR_PATTERN = re.compile(r'[\W_]+')
+
+
+class BlockEntry(NamedTuple):
+    """Descripción de una transacción ya vista, en sus dos normalizaciones."""
+    exact: str      # La de la clave exacta (records.normalize_name)
+    fuzzy: str      # Además sin signos de puntuación (fuzzy_name)
+
+
+def fuzzy_name(name: str) -> str:
+    """
+    Normaliza una descripción para la comparación aproximada: además de
+    minúsculas y espacios, cualquier separador (guiones, puntos, barras)
+    cuenta como un espacio.
+    
+    Args:
+        name: Descripción del movimiento
+    
+    Returns:
+        Descripción normalizada
+    """
+    return SEPARATOR_PATTERN.sub(' ', normalize_name(name)).strip()
+
+
+def block_key(transaction: Transaction) -> Tuple[str, str, Optional[float]]:
+    """
+    Bloque de candidatas: (fecha, moneda, monto redondeado a céntimos),
+    normalizados como en records.dedup_key.
+    """
+    return ((transaction.date or '').strip(), normalize_currency(transaction.currency),
+            normalize_amount(transaction.amount))
+
+
+def block_entry(name: str) -> BlockEntry:
+    """Normaliza una descripción para guardarla en un bloque."""
+    return BlockEntry(normalize_name(name), fuzzy_name(name))
+
+
+class FuzzyDeduplicator:
+    """
+    Filtra transacciones casi idénticas a otras ya vistas en el lote o
+    guardadas en el almacén.
+    
+    Las que coinciden con la clave exacta de deduplicación no se tocan: esas
+    las descartan deduplicate_transactions y el índice único del almacén.
+    """
+    
+    def __init__(self, store: Optional[TransactionStore] = None, threshold: float = DEFAULT_THRESHOLD):
+        """
+        Inicializa el deduplicador.
+        
+        Args:
+            store: Almacén con el histórico (opcional); cada transacción se
+                compara con las guardadas de su mismo bloque
+            threshold: Similitud mínima (0-1) para considerar duplicadas dos descripciones
+        """
+        self.store = store
+        self.threshold = threshold
+        # Descripciones vistas por bloque: las del almacén se leen una sola vez por bloque
+        self.blocks: Dict[Tuple[str, str, Optional[float]], List[BlockEntry]] = {}
+        self.removed = 0
+    
+    def _matches(self, entry: BlockEntry, candidates: List[BlockEntry]) -> bool:
+        for candidate in candidates:
+            if candidate.exact == entry.exact:
+                continue
+            matcher = SequenceMatcher(None, entry.fuzzy, candidate.fuzzy, autojunk=False)
+            # real_quick_ratio y quick_ratio son cotas superiores baratas de ratio
+            if (matcher.real_quick_ratio() >= self.threshold
+                    and matcher.quick_ratio() >= self.threshold
+                    and matcher.ratio() >= self.threshold):
+                return True
+        return False
+    
+    def is_duplicate(self, transaction: Transaction) -> bool:
+        """
+        Indica si la transacción es una variante de OCR de otra ya vista.
+        
+        Args:
+            transaction: Transacción a comprobar
+        
+        Returns:
+            True si su bloque contiene una descripción distinta pero similar
+        """
+        return self._is_duplicate(block_key(transaction), block_entry(transaction.name))
+    
+    def _block(self, key: Tuple[str, str, Optional[float]]) -> List[BlockEntry]:
+        # Descripciones del bloque, empezando por las guardadas en el almacén
+        if key not in self.blocks:
+            stored = []
+            if self.store is not None and key[2] is not None:
+                stored = self.store.names_in_block(*key)
+            self.blocks[key] = [block_entry(name) for name in stored]
+        return self.blocks[key]
+    
+    def _is_duplicate(self, key: Tuple[str, str, Optional[float]], entry: BlockEntry) -> bool:
+        return self._matches(entry, self._block(key))
+    
+    def filter(self, transactions: List[Transaction]) -> List[Transaction]:
+        """
+        Elimina las variantes de OCR de transacciones ya vistas.
+        
+        Las transacciones que se conservan se añaden a los bloques, así que
+        se puede llamar imagen por imagen a lo largo de un lote.
+        
+        Args:
+            transactions: Transacciones (ya deduplicadas por clave exacta)
+        
+        Returns:
+            Transacciones que no son variantes de otras
+        """
+        unique = []
+        
+        for transaction in transactions:
+            key = block_key(transaction)
+            entry = block_entry(transaction.name)
+            if self._is_duplicate(key, entry):
+                self.removed += 1
+                continue
+            self._block(key).append(entry)
+            unique.append(transaction)
+        
+        return unique
@@ -3,183 +3,1102 @@ Módulo para procesar imágenes de movimientos bancarios usando GPT-4o Vision AP
 Extrae transacciones y omite las que tienen overlay rojizo.
 """
 
+import asyncio
 import base64
 import os
-from typing import List, Dict, Any
+import queue
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from itertools import groupby, islice
+from operator import itemgetter
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Optional, Tuple
 from pathlib import Path
-import json
 
-from openai import OpenAI
+import openai
+from openai import OpenAI, AsyncOpenAI
 from PIL import Image
 import io
 
+from instrumentation import NULL_PROFILER
+from json_stream import TransactionStream
+from records import ImageResult, Transaction
+from tiling import Tile, TileCollector, blank_rows_pil, plan_tiles, tile_label
+
+
+EXTRACTION_PROMPT = """Analiza esta captura de pantalla de una aplicación bancaria móvil en español.
+
+INSTRUCCIONES IMPORTANTES:
+1. **OMITE/IGNORA** cualquier transacción que tenga un overlay, tinte o color rojizo sobre ella. Estas transacciones están marcadas para ser excluidas.
+2. Solo extrae las transacciones que NO tienen marcas rojas.
+3. Para cada transacción válida, extrae:
+   - date: Fecha en formato DD/MM/YYYY (si solo aparece el día, usa el mes y año del encabezado)
+   - name: Descripción o nombre del movimiento (texto completo)
+   - amount: Monto numérico (negativo para cargos con "S/ -", positivo para abonos)
+   - type: "cargo" si es negativo, "abono" si es positivo
+   - month: El mes y año visible en la imagen (ej: "Agosto 2025", "Enero 2026")
+
+FORMATO DE RESPUESTA:
+Devuelve SOLO un objeto JSON válido con esta estructura:
+{
+  "transactions": [
+    {
+      "date": "31/08/2025",
+      "name": "INTERESES DEUDORES",
+      "amount": -0.02,
+      "type": "cargo",
+      "month": "Agosto 2025"
+    }
+  ]
+}
+
+Si la imagen no contiene transacciones válidas (todas tienen overlay rojo), devuelve:
+{
+  "transactions": []
+}
+
+NO incluyas explicaciones, solo el JSON."""
+
+TILE_PROMPT = """
+
+NOTA: esta imagen es la franja {index} de {count} de una captura larga, recortada horizontalmente.
+- Extrae solo las transacciones que se vean completas; ignora las filas cortadas en el borde superior o inferior.
+- Si en la franja no se ve el encabezado del mes, deja "month" vacío ("")."""
+
+PACK_PROMPT = """Esta solicitud incluye {count} capturas, cada una precedida de su número ("Imagen 1", "Imagen 2", ...). Analiza cada captura por separado con las instrucciones de abajo; no mezcles transacciones de capturas distintas.
+
+FORMATO DE RESPUESTA PARA VARIAS CAPTURAS:
+En lugar de un solo objeto, devuelve SOLO un objeto JSON con una clave por captura (su número) cuyo valor es el objeto de esa captura:
+{{
+  "1": {{"transactions": [...]}},
+  "2": {{"transactions": []}}
+}}
+Incluye todas las claves, de "1" a "{count}".
+
+"""
+
+# Esquema de la respuesta de una imagen (structured outputs, modo estricto)
+TRANSACTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "date": {"type": "string"},
+        "name": {"type": "string"},
+        "amount": {"type": "number"},
+        "type": {"type": "string", "enum": ["cargo", "abono"]},
+        "month": {"type": "string"}
+    },
+    "required": ["date", "name", "amount", "type", "month"],
+    "additionalProperties": False
+}
+TRANSACTIONS_SCHEMA = {
+    "type": "object",
+    "properties": {"transactions": {"type": "array", "items": TRANSACTION_SCHEMA}},
+    "required": ["transactions"],
+    "additionalProperties": False
+}
+
+# Tokens que consume una imagen en modo "high" (estimación para el límite de TPM)
+IMAGE_TOKENS_ESTIMATE = 1105
+
+MAX_RESPONSE_TOKENS = 2000
+
+# Empaquetado de varias imágenes por solicitud (--api-pack): el prompt se
+# envía una vez por paquete. Cada imagen reserva IMAGE_TOKENS_ESTIMATE de
+# entrada y MAX_RESPONSE_TOKENS de respuesta dentro de PACK_TOKEN_BUDGET, y la
+# respuesta total no puede superar el máximo del modelo
+PACK_TOKEN_BUDGET = 32000
+MAX_PACK_RESPONSE_TOKENS = 16000
+
+# Dimensión máxima de la imagen enviada y calidad JPEG al recodificarla
+MAX_IMAGE_SIZE = 2000
+JPEG_QUALITY = 85
+
+# Las capturas más altas que MAX_IMAGE_SIZE y al menos TILE_MIN_ASPECT veces
+# más altas que anchas se envían en franjas (ver tiling.py): reducidas enteras,
+# el texto quedaría ilegible
+TILE_MIN_ASPECT = 3.0
+
+# Franjas de una misma captura que se envían a la vez sin --workers
+TILE_WORKERS = 4
+
+# Imágenes que se codifican por adelantado mientras hay solicitudes en curso
+# (acota también cuántas imágenes codificadas hay en memoria a la vez)
+ENCODE_PREFETCH = 4
+ENCODE_WORKERS = min(4, os.cpu_count() or 1)
+
+# Incrementar al cambiar el prompt, el parseo o la imagen enviada (invalida la caché de resultados)
+PROCESSOR_VERSION = "4"
+
+
+class TokenBucket:
+    """
+    Token bucket asíncrono para límites por minuto (solicitudes o tokens).
+    
+    El bucket se rellena de forma continua a razón de `capacity` por minuto.
+    """
+    
+    def __init__(self, capacity: int):
+        """
+        Inicializa el bucket lleno.
+        
+        Args:
+            capacity: Unidades disponibles por minuto
+        """
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.rate = self.capacity / 60.0
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+    
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    async def acquire(self, amount: float = 1):
+        """
+        Espera hasta que haya `amount` unidades disponibles y las consume.
+        
+        Args:
+            amount: Unidades a consumir (se limita a la capacidad del bucket)
+        """
+        amount = min(float(amount), self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+    
+    def release(self, amount: float):
+        """
+        Devuelve unidades sobreestimadas al bucket.
+        
+        Args:
+            amount: Unidades a devolver
+        """
+        if amount > 0:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+def chunked(items: Iterable, size: int) -> Iterator[List]:
+    """
+    Agrupa los elementos en listas consecutivas de como mucho `size`.
+    
+    Args:
+        items: Elementos (se consumen de forma perezosa)
+        size: Tamaño máximo de cada grupo
+        
+    Yields:
+        Listas de elementos, en orden
+    """
+    iterator = iter(items)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def response_format(count: Optional[int] = None) -> Dict[str, Any]:
+    """
+    response_format de structured outputs: la API solo puede devolver JSON
+    que cumpla el esquema.
+    
+    Args:
+        count: Imágenes del paquete (None para una sola imagen)
+        
+    Returns:
+        Diccionario para el argumento response_format
+    """
+    schema = TRANSACTIONS_SCHEMA
+    if count is not None:
+        keys = [str(number) for number in range(1, count + 1)]
+        schema = {
+            "type": "object",
+            "properties": {key: TRANSACTIONS_SCHEMA for key in keys},
+            "required": keys,
+            "additionalProperties": False
+        }
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": "movimientos", "strict": True, "schema": schema}
+    }
+
+
+def pack_position(key: str, count: int) -> Optional[int]:
+    """Posición en el paquete de una clave de la respuesta ("1".."count"), o None."""
+    if key.isdigit() and 1 <= int(key) <= count:
+        return int(key) - 1
+    return None
+
+
+class StreamedReply:
+    """
+    Respuesta de chat.completions en streaming. Cada transacción se parsea en
+    cuanto se cierra su objeto JSON (ver json_stream.py); las de un paquete se
+    agrupan por la clave de su imagen ('' con una sola imagen).
+    """
+    
+    def __init__(self):
+        self.parser = TransactionStream()
+        self.transactions: Dict[str, List[Transaction]] = defaultdict(list)
+        self.finished = set()       # Imágenes cuya lista de transacciones ya se cerró
+        self.finish_reason: Optional[str] = None
+        self.usage = None
+    
+    def feed(self, chunk) -> List[str]:
+        """
+        Procesa un fragmento del stream.
+        
+        Args:
+            chunk: ChatCompletionChunk recibido
+            
+        Returns:
+            Claves de las imágenes cuya lista de transacciones se cerró en este fragmento
+        """
+        if getattr(chunk, 'usage', None):
+            self.usage = chunk.usage
+        
+        completed = []
+        for choice in chunk.choices[:1]:
+            self.finish_reason = choice.finish_reason or self.finish_reason
+            for event in self.parser.feed(choice.delta.content or ''):
+                key = event.path[0] if event.path else ''
+                if event.transaction is None:
+                    self.finished.add(key)
+                    completed.append(key)
+                else:
+                    self.transactions[key].append(Transaction.from_dict(event.transaction))
+        return completed
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """
+    Indica si un error de la API merece reintento (429, 5xx o fallo de red).
+    
+    Args:
+        error: Excepción lanzada por el cliente de OpenAI
+        
+    Returns:
+        True si la solicitud puede reintentarse
+    """
+    if isinstance(error, (openai.APIConnectionError, openai.RateLimitError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code >= 500
+    return False
+
+
+def backoff_delay(attempt: int, error: Exception = None, base: float = 1.0, cap: float = 60.0) -> float:
+    """
+    Calcula la espera antes de un reintento (backoff exponencial con jitter).
+    
+    Si la respuesta 429 incluye la cabecera Retry-After, se respeta como mínimo.
+    
+    Args:
+        attempt: Número de intento fallido (0 para el primero)
+        error: Error que provocó el reintento
+        base: Espera base en segundos
+        cap: Espera máxima en segundos
+        
+    Returns:
+        Segundos a esperar
+    """
+    delay = min(cap, base * (2 ** attempt))
+    delay = random.uniform(delay / 2, delay)
+    
+    response = getattr(error, 'response', None)
+    if response is not None:
+        try:
+            delay = max(delay, float(response.headers.get('retry-after', 0)))
+        except (TypeError, ValueError):
+            pass
+    
+    return delay
+
 
 class ImageProcessor:
     """Procesador de imágenes bancarias con GPT-4o Vision."""
     
-    def __init__(self, api_key: str):
+    version = PROCESSOR_VERSION
+    
+    def __init__(self, api_key: str, base_url: Optional[str] = None,
+                 requests_per_minute: Optional[int] = None,
+                 tokens_per_minute: Optional[int] = None,
+                 max_retries: int = 5, pack_images: int = 1,
+                 pack_tokens: int = PACK_TOKEN_BUDGET):
         """
         Inicializa el procesador de imágenes.
         
         Args:
             api_key: OpenAI API key
+            base_url: URL base alternativa de la API (p. ej. un servidor local de pruebas)
+            requests_per_minute: Límite de solicitudes por minuto en modo concurrente
+            tokens_per_minute: Límite de tokens por minuto en modo concurrente
+            max_retries: Reintentos ante errores 429/5xx en modo concurrente
+            pack_images: Imágenes por solicitud (1 = una solicitud por imagen)
+            pack_tokens: Presupuesto de tokens estimados por solicitud empaquetada
         """
-        self.client = OpenAI(api_key=api_key)
+        self.api_key = api_key
+        self.base_url = base_url
+        self.client = OpenAI(api_key=api_key, base_url=base_url)
         self.model = "gpt-4o"
+        self.kind = f"api-{self.model}"
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_retries = max_retries
+        self.pack_images = pack_images
+        self.pack_tokens = pack_tokens
+        
+        # Tiempos por etapa y contadores (ver instrumentation.py)
+        self.profiler = NULL_PROFILER
+    
+    def pack_limit(self) -> int:
+        """
+        Imágenes por solicitud que permiten pack_images y el presupuesto de
+        tokens (1 = sin empaquetar).
+        """
+        per_image = IMAGE_TOKENS_ESTIMATE + MAX_RESPONSE_TOKENS
+        by_tokens = (self.pack_tokens - (len(PACK_PROMPT) + len(EXTRACTION_PROMPT)) // 4) // per_image
+        by_response = MAX_PACK_RESPONSE_TOKENS // MAX_RESPONSE_TOKENS
+        return max(1, min(self.pack_images, by_tokens, by_response))
+    
+    def plan_image_tiles(self, image_path: str) -> List[Optional[Tile]]:
+        """
+        Decide si una captura larga se envía en franjas.
+        
+        Args:
+            image_path: Ruta a la imagen
+            
+        Returns:
+            Franjas de la imagen, o [None] si se envía entera
+        """
+        try:
+            with Image.open(image_path) as img:
+                width, height = img.size
+                if height <= MAX_IMAGE_SIZE or height < TILE_MIN_ASPECT * width:
+                    return [None]
+                # Franjas de como mucho el doble de altas que anchas: la API las
+                # reduce sin perder legibilidad
+                return plan_tiles(blank_rows_pil(img), min(MAX_IMAGE_SIZE, 2 * width))
+        except OSError:
+            # La imagen ilegible se reporta al codificarla
+            return [None]
     
-    def encode_image(self, image_path: str) -> str:
+    def encode_image(self, image_path: str, tile: Optional[Tile] = None) -> str:
         """
-        Codifica una imagen a base64.
+        Codifica una imagen (o una de sus franjas) a base64.
+        
+        Un JPEG en RGB o escala de grises que no supera MAX_IMAGE_SIZE se envía
+        tal cual, sin decodificarlo ni recomprimirlo.
         
         Args:
             image_path: Ruta a la imagen
+            tile: Franja a recortar (None para la imagen completa)
             
         Returns:
             String base64 de la imagen
         """
         # Abrir y optimizar imagen si es muy grande
         with Image.open(image_path) as img:
+            if (tile is None and img.format == 'JPEG' and img.mode in ('RGB', 'L')
+                    and max(img.size) <= MAX_IMAGE_SIZE):
+                with open(image_path, 'rb') as f:
+                    return base64.b64encode(f.read()).decode('utf-8')
+            
+            if tile is not None:
+                img = img.crop((0, tile.top, img.width, tile.bottom))
+            
             # Convertir a RGB si es necesario
-            if img.mode in ('RGBA', 'LA', 'P'):
+            if img.mode not in ('RGB', 'L'):
                 img = img.convert('RGB')
             
-            # Redimensionar si es muy grande (máximo 2000px en cualquier dimensión)
-            max_size = 2000
-            if max(img.size) > max_size:
-                ratio = max_size / max(img.size)
+            # Redimensionar si es muy grande (máximo MAX_IMAGE_SIZE px en cualquier dimensión)
+            if max(img.size) > MAX_IMAGE_SIZE:
+                ratio = MAX_IMAGE_SIZE / max(img.size)
                 new_size = tuple(int(dim * ratio) for dim in img.size)
                 img = img.resize(new_size, Image.Resampling.LANCZOS)
             
             # Guardar en buffer
             buffer = io.BytesIO()
-            img.save(buffer, format='JPEG', quality=85)
+            img.save(buffer, format='JPEG', quality=JPEG_QUALITY)
             buffer.seek(0)
             
             # Codificar a base64
             return base64.b64encode(buffer.read()).decode('utf-8')
     
-    def extract_transactions(self, image_path: str) -> List[Dict[str, Any]]:
+    def iter_encoded(self, image_paths: List[str],
+                     prefetch: int = ENCODE_PREFETCH) -> Iterator[Tuple[int, str, Optional[Tile], Future]]:
+        """
+        Codifica las imágenes (o sus franjas) en un pool de hilos, hasta
+        `prefetch` por delante de la que se está enviando.
+        
+        Args:
+            image_paths: Rutas de las imágenes, en orden
+            prefetch: Imágenes o franjas a codificar por adelantado
+            
+        Yields:
+            Tuplas (índice, ruta, franja, future con el base64), en el orden
+            de image_paths y, dentro de cada imagen, de arriba a abajo
+        """
+        executor = ThreadPoolExecutor(max_workers=ENCODE_WORKERS, thread_name_prefix="encode")
+        pending = deque()
+        finished = False
+        
+        try:
+            for index, image_path in enumerate(image_paths):
+                for tile in self.plan_image_tiles(image_path):
+                    future = executor.submit(self.encode_image, image_path, tile)
+                    pending.append((index, image_path, tile, future))
+                    if len(pending) > prefetch:
+                        yield pending.popleft()
+            while pending:
+                yield pending.popleft()
+            finished = True
+        finally:
+            # Si el consumidor se detiene antes, lo pendiente ya no hace falta;
+            # si no, las últimas imágenes entregadas pueden estar codificándose
+            executor.shutdown(wait=False, cancel_futures=not finished)
+    
+    def build_messages(self, base64_image: str, tile: Optional[Tile] = None) -> List[Dict[str, Any]]:
+        """
+        Construye los mensajes de la solicitud para una imagen.
+        
+        Args:
+            base64_image: Imagen codificada en base64
+            tile: Franja enviada (añade al prompt las instrucciones de franjas)
+            
+        Returns:
+            Lista de mensajes para chat.completions
+        """
+        prompt = EXTRACTION_PROMPT
+        if tile is not None and tile.count > 1:
+            prompt += TILE_PROMPT.format(index=tile.index + 1, count=tile.count)
+        
+        return [
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "text",
+                        "text": prompt
+                    },
+                    {
+                        "type": "image_url",
+                        "image_url": {
+                            "url": f"data:image/jpeg;base64,{base64_image}",
+                            "detail": "high"
+                        }
+                    }
+                ]
+            }
+        ]
+    
+    def build_pack_messages(self, images: List[Tuple[str, Optional[Tile]]]) -> List[Dict[str, Any]]:
+        """
+        Construye los mensajes de una solicitud con varias imágenes.
+        
+        Args:
+            images: Tuplas (imagen en base64, franja o None), en orden
+            
+        Returns:
+            Lista de mensajes para chat.completions
+        """
+        content = [
+            {
+                "type": "text",
+                "text": PACK_PROMPT.format(count=len(images)) + EXTRACTION_PROMPT
+            }
+        ]
+        for number, (base64_image, tile) in enumerate(images, 1):
+            label = f"Imagen {number}"
+            if tile is not None and tile.count > 1:
+                label += TILE_PROMPT.format(index=tile.index + 1, count=tile.count)
+            content.append({"type": "text", "text": label})
+            content.append({
+                "type": "image_url",
+                "image_url": {
+                    "url": f"data:image/jpeg;base64,{base64_image}",
+                    "detail": "high"
+                }
+            })
+        
+        return [{"role": "user", "content": content}]
+    
+    def pack_request_tokens(self, count: int) -> Tuple[int, int]:
+        """
+        Tokens de una solicitud empaquetada.
+        
+        Args:
+            count: Imágenes del paquete
+            
+        Returns:
+            Tupla (máximo de tokens de respuesta, tokens estimados en total)
+        """
+        max_tokens = min(count * MAX_RESPONSE_TOKENS, MAX_PACK_RESPONSE_TOKENS)
+        prompt_tokens = (len(PACK_PROMPT) + len(EXTRACTION_PROMPT)) // 4
+        return max_tokens, prompt_tokens + count * IMAGE_TOKENS_ESTIMATE + max_tokens
+    
+    def request_args(self, messages: List[Dict[str, Any]], max_tokens: int,
+                     count: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Argumentos de chat.completions.create: respuesta en streaming con el
+        esquema de una imagen o de un paquete de `count` imágenes.
+        
+        Args:
+            messages: Mensajes de la solicitud
+            max_tokens: Máximo de tokens de respuesta
+            count: Imágenes del paquete (None para una sola imagen)
+            
+        Returns:
+            Diccionario de argumentos
+        """
+        return {
+            "model": self.model,
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "temperature": 0.1,  # Baja temperatura para respuestas más consistentes
+            "response_format": response_format(count),
+            "stream": True,
+            "stream_options": {"include_usage": True}
+        }
+    
+    def count_reply(self, reply: StreamedReply, label: str):
+        """Anota los tokens y las transacciones mal formadas de una respuesta."""
+        if reply.usage and reply.usage.total_tokens:
+            self.profiler.count('tokens', reply.usage.total_tokens, label)
+        if reply.parser.invalid:
+            self.profiler.count('invalid_transactions', reply.parser.invalid, label)
+    
+    def finish_reply(self, reply: StreamedReply, key: str, name: str,
+                     label: str) -> Tuple[List[Transaction], bool]:
+        """
+        Transacciones de una imagen de la respuesta, avisando si llegó cortada.
+        
+        Args:
+            reply: Respuesta recibida
+            key: Clave de la imagen en la respuesta ('' con una sola imagen)
+            name: Nombre de la imagen para los contadores
+            label: Nombre de la imagen (o franja) para los mensajes
+            
+        Returns:
+            Tupla (transacciones recibidas completas, si la lista de la imagen
+            llegó entera)
+        """
+        transactions = reply.transactions.get(key, [])
+        self.profiler.count('transactions', len(transactions), name)
+        
+        if key in reply.finished:
+            print(f"✅ {label}: extraídas {len(transactions)} transacciones")
+            return transactions, True
+        
+        print(f"⚠️  {label}: respuesta incompleta ({reply.finish_reason or 'cortada'}), "
+              f"se conservan {len(transactions)} transacciones")
+        self.profiler.count('partial_replies', 1, name)
+        return transactions, False
+    
+    def extract_transactions(self, image_path: str, encoded: Optional[Future] = None,
+                             tile: Optional[Tile] = None) -> List[Transaction]:
         """
         Extrae transacciones de una imagen usando GPT-4o Vision.
         
         Args:
             image_path: Ruta a la imagen de movimientos bancarios
+            encoded: Future con la imagen ya codificada (ver iter_encoded); si
+                no se indica, la imagen se codifica aquí
+            tile: Franja de la imagen a procesar (None para la imagen completa)
             
         Returns:
             Lista de transacciones extraídas
         """
-        print(f"📸 Procesando imagen: {Path(image_path).name}")
+        return self.extract_image(image_path, encoded, tile)[0]
+    
+    def extract_image(self, image_path: str, encoded: Optional[Future] = None,
+                      tile: Optional[Tile] = None) -> Tuple[List[Transaction], bool]:
+        """
+        Extrae transacciones de una imagen indicando si la respuesta llegó entera.
         
-        # Codificar imagen
-        base64_image = self.encode_image(image_path)
+        La respuesta llega en streaming y cada transacción se parsea en cuanto
+        se completa: si se corta o falla a mitad, se conservan las recibidas,
+        pero el resultado cuenta como incompleto (no se guarda en la caché ni
+        en el diario, así que la imagen se reintenta en la próxima ejecución).
+        
+        Args:
+            image_path: Ruta a la imagen de movimientos bancarios
+            encoded: Future con la imagen ya codificada (ver iter_encoded); si
+                no se indica, la imagen se codifica aquí
+            tile: Franja de la imagen a procesar (None para la imagen completa)
+            
+        Returns:
+            Tupla (transacciones extraídas, si la respuesta llegó completa)
+        """
+        name = Path(image_path).name
+        label = tile_label(name, tile)
+        profiler = self.profiler
+        print(f"📸 Procesando imagen: {label}")
+        
+        with profiler.profile_image(image_path):
+            reply = StreamedReply()
+            
+            try:
+                # Codificar imagen (con prefetch, solo se espera a que termine)
+                with profiler.stage('encode', name):
+                    base64_image = encoded.result() if encoded else self.encode_image(image_path, tile)
+                
+                # Llamar a GPT-4o Vision
+                messages = self.build_messages(base64_image, tile)
+                with profiler.stage('api_request', name):
+                    stream = self.client.chat.completions.create(**self.request_args(messages, MAX_RESPONSE_TOKENS))
+                with profiler.stage('stream', name), stream:
+                    for chunk in stream:
+                        reply.feed(chunk)
+                
+                self.count_reply(reply, name)
+                return self.finish_reply(reply, '', name, label)
+                
+            except Exception as e:
+                print(f"❌ Error al procesar imagen: {e}")
+                transactions = reply.transactions.get('', [])
+                if transactions:
+                    print(f"  ⚠️  Se conservan {len(transactions)} transacciones recibidas antes del error")
+                return transactions, False
+    
+    def iter_extract_pack(self, image_paths: List[str], tiles: List[Optional[Tile]],
+                          encoded: List[Future]) -> Iterator[Tuple[int, List[Transaction], bool]]:
+        """
+        Extrae las transacciones de varias imágenes con una sola solicitud.
+        
+        Cada imagen se entrega en cuanto se cierra su lista de transacciones en
+        la respuesta, sin esperar al resto del paquete. Las imágenes que no
+        llegan completas (respuesta cortada, o la API rechaza el paquete) se
+        procesan después una a una con extract_image. Tras un error de red,
+        429 o 5xx no se repiten imagen por imagen y cuentan como incompletas.
+        
+        Args:
+            image_paths: Rutas de las imágenes del paquete
+            tiles: Franja de cada imagen (None para la imagen completa)
+            encoded: Future con cada imagen ya codificada (ver iter_encoded)
+            
+        Yields:
+            Tuplas (posición en el paquete, transacciones, si llegaron completas),
+            en orden de llegada
+        """
+        names = [tile_label(Path(image_path).name, tile) for image_path, tile in zip(image_paths, tiles)]
+        label = f"{names[0]} (+{len(names) - 1})"
+        profiler = self.profiler
+        print(f"📦 Procesando {len(names)} imágenes en una solicitud: {', '.join(names)}")
+        
+        reply = StreamedReply()
+        done = set()
+        fallback = True
         
-        # Crear prompt estructurado
-        prompt = """Analiza esta captura de pantalla de una aplicación bancaria móvil en español.
-
-INSTRUCCIONES IMPORTANTES:
-1. **OMITE/IGNORA** cualquier transacción que tenga un overlay, tinte o color rojizo sobre ella. Estas transacciones están marcadas para ser excluidas.
-2. Solo extrae las transacciones que NO tienen marcas rojas.
-3. Para cada transacción válida, extrae:
-   - date: Fecha en formato DD/MM/YYYY (si solo aparece el día, usa el mes y año del encabezado)
-   - name: Descripción o nombre del movimiento (texto completo)
-   - amount: Monto numérico (negativo para cargos con "S/ -", positivo para abonos)
-   - type: "cargo" si es negativo, "abono" si es positivo
-   - month: El mes y año visible en la imagen (ej: "Agosto 2025", "Enero 2026")
-
-FORMATO DE RESPUESTA:
-Devuelve SOLO un objeto JSON válido con esta estructura:
-{
-  "transactions": [
-    {
-      "date": "31/08/2025",
-      "name": "INTERESES DEUDORES",
-      "amount": -0.02,
-      "type": "cargo",
-      "month": "Agosto 2025"
-    }
-  ]
-}
-
-Si la imagen no contiene transacciones válidas (todas tienen overlay rojo), devuelve:
-{
-  "transactions": []
-}
-
-NO incluyas explicaciones, solo el JSON."""
-
         try:
-            # Llamar a GPT-4o Vision
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": prompt
-                            },
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/jpeg;base64,{base64_image}",
-                                    "detail": "high"
-                                }
-                            }
-                        ]
-                    }
-                ],
-                max_tokens=2000,
-                temperature=0.1  # Baja temperatura para respuestas más consistentes
-            )
+            with profiler.stage('encode', label):
+                images = [future.result() for future in encoded]
             
-            # Extraer respuesta
-            content = response.choices[0].message.content.strip()
+            max_tokens, _ = self.pack_request_tokens(len(images))
+            messages = self.build_pack_messages(list(zip(images, tiles)))
+            with profiler.stage('api_request', label):
+                stream = self.client.chat.completions.create(**self.request_args(messages, max_tokens, len(images)))
+            with profiler.stage('stream', label), stream:
+                for chunk in stream:
+                    for key in reply.feed(chunk):
+                        position = pack_position(key, len(images))
+                        if position is not None and position not in done:
+                            done.add(position)
+                            yield (position, *self.finish_reply(reply, key, Path(image_paths[position]).name,
+                                                                names[position]))
             
-            # Limpiar markdown code blocks si existen
-            if content.startswith("```json"):
-                content = content[7:]
-            if content.startswith("```"):
-                content = content[3:]
-            if content.endswith("```"):
-                content = content[:-3]
-            content = content.strip()
+            self.count_reply(reply, label)
+            if len(done) < len(images):
+                print(f"⚠️  {label}: respuesta incompleta ({reply.finish_reason or 'cortada'})")
+        except Exception as e:
+            if is_retryable_error(e):
+                print(f"❌ Error al procesar el paquete: {e}")
+                fallback = False
+            else:
+                print(f"⚠️  Paquete no válido ({e})")
+        
+        missing = [position for position in range(len(image_paths)) if position not in done]
+        if missing and fallback:
+            print(f"  ↪️  {len(missing)} imágenes se procesan una a una")
+            profiler.count('pack_fallbacks', 1)
+        for position in missing:
+            if fallback:
+                yield (position, *self.extract_image(image_paths[position], encoded[position], tiles[position]))
+            else:
+                yield position, [], False
+    
+    async def request_async(self, client: AsyncOpenAI, messages: List[Dict[str, Any]], label: str,
+                            max_tokens: int, estimated_tokens: int, semaphore: asyncio.Semaphore,
+                            reply: StreamedReply, request_bucket: Optional[TokenBucket] = None,
+                            token_bucket: Optional[TokenBucket] = None, count: Optional[int] = None,
+                            on_complete: Optional[Callable[[str], None]] = None):
+        """
+        Envía una solicitud en streaming respetando los límites de
+        concurrencia, RPM y TPM y reintentando errores 429/5xx.
+        
+        Solo se reintenta el envío: un error a mitad de la respuesta se
+        propaga y `reply` conserva lo recibido hasta entonces.
+        
+        Args:
+            client: Cliente asíncrono de OpenAI
+            messages: Mensajes de la solicitud
+            label: Imagen (o paquete) para los mensajes y el perfilado
+            max_tokens: Máximo de tokens de respuesta
+            estimated_tokens: Tokens que se reservan en token_bucket
+            semaphore: Semáforo que limita las solicitudes simultáneas
+            reply: Respuesta donde se acumulan los fragmentos
+            request_bucket: Bucket de solicitudes por minuto (opcional)
+            token_bucket: Bucket de tokens por minuto (opcional)
+            count: Imágenes del paquete (None para una sola imagen)
+            on_complete: Función que recibe la clave de cada imagen en cuanto
+                se cierra su lista de transacciones
+        """
+        profiler = self.profiler
+        
+        for attempt in range(self.max_retries + 1):
+            async with semaphore:
+                with profiler.stage('rate_limit_wait', label):
+                    if request_bucket:
+                        await request_bucket.acquire(1)
+                    if token_bucket:
+                        await token_bucket.acquire(estimated_tokens)
+                
+                try:
+                    with profiler.stage('api_request', label):
+                        stream = await client.chat.completions.create(
+                            **self.request_args(messages, max_tokens, count)
+                        )
+                except Exception as e:
+                    if attempt < self.max_retries and is_retryable_error(e):
+                        error = e
+                    else:
+                        raise
+                else:
+                    with profiler.stage('stream', label):
+                        async with stream:
+                            async for chunk in stream:
+                                for key in reply.feed(chunk):
+                                    if on_complete:
+                                        on_complete(key)
+                    
+                    # Devolver al bucket los tokens sobreestimados
+                    self.count_reply(reply, label)
+                    if token_bucket and reply.usage and reply.usage.total_tokens:
+                        token_bucket.release(estimated_tokens - reply.usage.total_tokens)
+                    return
             
-            # Parsear JSON
-            result = json.loads(content)
-            transactions = result.get("transactions", [])
+            # Esperar fuera del semáforo para no bloquear otras solicitudes
+            delay = backoff_delay(attempt, error)
+            print(f"  ⏳ {label}: {error.__class__.__name__}, reintento {attempt + 1} en {delay:.1f}s")
+            profiler.count('retries', 1, label)
+            with profiler.stage('backoff', label):
+                await asyncio.sleep(delay)
+    
+    async def extract_transactions_async(self, client: AsyncOpenAI, image_path: str,
+                                         semaphore: asyncio.Semaphore,
+                                         request_bucket: Optional[TokenBucket] = None,
+                                         token_bucket: Optional[TokenBucket] = None,
+                                         encode_executor: Optional[Executor] = None,
+                                         tile: Optional[Tile] = None,
+                                         encoded: Optional[str] = None) -> Tuple[List[Transaction], bool]:
+        """
+        Extrae transacciones de una imagen de forma asíncrona, respetando los
+        límites de concurrencia, RPM y TPM y reintentando errores 429/5xx.
+        
+        Args:
+            client: Cliente asíncrono de OpenAI
+            image_path: Ruta a la imagen de movimientos bancarios
+            semaphore: Semáforo que limita las solicitudes simultáneas
+            request_bucket: Bucket de solicitudes por minuto (opcional)
+            token_bucket: Bucket de tokens por minuto (opcional)
+            encode_executor: Pool donde codificar la imagen (por defecto, el del bucle)
+            tile: Franja de la imagen a procesar (None para la imagen completa)
+            encoded: Imagen ya codificada en base64 (si no se indica, se codifica aquí)
             
-            print(f"✅ Extraídas {len(transactions)} transacciones")
+        Returns:
+            Tupla (transacciones extraídas, si la respuesta llegó completa); si
+            se corta, las transacciones recibidas hasta entonces
+        """
+        name = Path(image_path).name
+        label = tile_label(name, tile)
+        profiler = self.profiler
+        reply = StreamedReply()
+        
+        try:
+            loop = asyncio.get_running_loop()
+            with profiler.stage('encode', name):
+                base64_image = encoded or await loop.run_in_executor(
+                    encode_executor, self.encode_image, image_path, tile
+                )
+            estimated_tokens = len(EXTRACTION_PROMPT) // 4 + IMAGE_TOKENS_ESTIMATE + MAX_RESPONSE_TOKENS
+            await self.request_async(
+                client, self.build_messages(base64_image, tile), name, MAX_RESPONSE_TOKENS,
+                estimated_tokens, semaphore, reply, request_bucket, token_bucket
+            )
+            return self.finish_reply(reply, '', name, label)
             
-            return transactions
+        except Exception as e:
+            print(f"❌ {label}: error al procesar imagen: {e}")
+            transactions = reply.transactions.get('', [])
+            if transactions:
+                print(f"  ⚠️  {label}: se conservan {len(transactions)} transacciones recibidas antes del error")
+            return transactions, False
+    
+    async def extract_pack_async(self, client: AsyncOpenAI, image_paths: List[str],
+                                 tiles: List[Optional[Tile]], semaphore: asyncio.Semaphore,
+                                 on_image: Callable[[int, List[Transaction], bool], None],
+                                 request_bucket: Optional[TokenBucket] = None,
+                                 token_bucket: Optional[TokenBucket] = None,
+                                 encode_executor: Optional[Executor] = None):
+        """
+        Versión asíncrona de iter_extract_pack: una solicitud para varias
+        imágenes y, para las que no llegan completas, una por imagen en paralelo.
+        
+        Args:
+            client: Cliente asíncrono de OpenAI
+            image_paths: Rutas de las imágenes del paquete
+            tiles: Franja de cada imagen (None para la imagen completa)
+            semaphore: Semáforo que limita las solicitudes simultáneas
+            on_image: Función que recibe (posición en el paquete, transacciones,
+                si llegaron completas) de cada imagen en cuanto termina
+            request_bucket: Bucket de solicitudes por minuto (opcional)
+            token_bucket: Bucket de tokens por minuto (opcional)
+            encode_executor: Pool donde codificar las imágenes (por defecto, el del bucle)
+        """
+        names = [tile_label(Path(image_path).name, tile) for image_path, tile in zip(image_paths, tiles)]
+        label = f"{names[0]} (+{len(names) - 1})"
+        profiler = self.profiler
+        images = [None] * len(image_paths)
+        reply = StreamedReply()
+        done = set()
+        fallback = True
+        
+        def complete(key: str):
+            position = pack_position(key, len(image_paths))
+            if position is not None and position not in done:
+                done.add(position)
+                on_image(position, *self.finish_reply(reply, key, Path(image_paths[position]).name,
+                                                      names[position]))
+        
+        try:
+            loop = asyncio.get_running_loop()
+            with profiler.stage('encode', label):
+                images = await asyncio.gather(*(
+                    loop.run_in_executor(encode_executor, self.encode_image, image_path, tile)
+                    for image_path, tile in zip(image_paths, tiles)
+                ))
             
-        except json.JSONDecodeError as e:
-            print(f"❌ Error al parsear JSON: {e}")
-            print(f"Respuesta recibida: {content[:200]}...")
-            return []
+            max_tokens, estimated_tokens = self.pack_request_tokens(len(images))
+            await self.request_async(
+                client, self.build_pack_messages(list(zip(images, tiles))), label, max_tokens,
+                estimated_tokens, semaphore, reply, request_bucket, token_bucket, len(images), complete
+            )
+            if len(done) < len(images):
+                print(f"⚠️  {label}: respuesta incompleta ({reply.finish_reason or 'cortada'})")
         except Exception as e:
-            print(f"❌ Error al procesar imagen: {e}")
-            return []
+            if is_retryable_error(e):
+                print(f"❌ {label}: error al procesar el paquete: {e}")
+                fallback = False
+            else:
+                print(f"⚠️  {label}: paquete no válido ({e})")
+        
+        missing = [position for position in range(len(image_paths)) if position not in done]
+        if missing and fallback:
+            print(f"  ↪️  {label}: {len(missing)} imágenes se procesan una a una")
+            profiler.count('pack_fallbacks', 1)
+        
+        async def extract_single(position: int):
+            transactions, complete = [], False
+            if fallback:
+                transactions, complete = await self.extract_transactions_async(
+                    client, image_paths[position], semaphore, request_bucket, token_bucket,
+                    encode_executor, tiles[position], images[position]
+                )
+            on_image(position, transactions, complete)
+        
+        await asyncio.gather(*(extract_single(position) for position in missing))
+    
+    async def process_multiple_images_async(self, image_paths: List[str], max_concurrency: int = 4,
+                                            on_result: Optional[Callable[[ImageResult], None]] = None) -> List[List[Transaction]]:
+        """
+        Procesa imágenes concurrentemente con AsyncOpenAI.
+        
+        Las franjas de las capturas largas se envían en paralelo y, con
+        pack_images > 1, las imágenes consecutivas se agrupan en paquetes.
+        
+        Args:
+            image_paths: Lista de rutas a imágenes existentes
+            max_concurrency: Máximo de solicitudes simultáneas
+            on_result: Función que recibe cada ImageResult en cuanto termina su imagen
+            
+        Returns:
+            Lista de transacciones por imagen, en el mismo orden que image_paths
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        pack_size = self.pack_limit()
+        # Cada solicitud (imagen, franja o paquete) ocupa un hueco desde que se
+        # codifica hasta que termina: como mucho ENCODE_PREFETCH imágenes
+        # codificadas esperan turno
+        encode_slots = asyncio.Semaphore(max_concurrency + max(1, ENCODE_PREFETCH // pack_size))
+        request_bucket = TokenBucket(self.requests_per_minute) if self.requests_per_minute else None
+        token_bucket = TokenBucket(self.tokens_per_minute) if self.tokens_per_minute else None
+        
+        # Los reintentos los gestiona el planificador (con backoff y límites compartidos)
+        with ThreadPoolExecutor(max_workers=ENCODE_WORKERS, thread_name_prefix="encode") as executor:
+            async with AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0) as client:
+                loop = asyncio.get_running_loop()
+                tiles = await asyncio.gather(*(
+                    loop.run_in_executor(executor, self.plan_image_tiles, image_path)
+                    for image_path in image_paths
+                ))
+                
+                collector = TileCollector()
+                results: List[List[Transaction]] = [[] for _ in image_paths]
+                units = [(index, image_path, tile) for index, image_path in enumerate(image_paths)
+                         for tile in tiles[index]]
+                
+                def finish(unit: Tuple[int, str, Optional[Tile]], transactions: List[Transaction],
+                           complete: bool):
+                    index, image_path, tile = unit
+                    merged = collector.add(index, tile, transactions, complete)
+                    if merged is not None:
+                        results[index] = merged[0]
+                        if on_result:
+                            on_result(ImageResult(index, image_path, *merged))
+                
+                async def extract(pack: List[Tuple[int, str, Optional[Tile]]]):
+                    paths = [image_path for _, image_path, _ in pack]
+                    pack_tiles = [tile for _, _, tile in pack]
+                    async with encode_slots:
+                        if len(pack) == 1:
+                            finish(pack[0], *await self.extract_transactions_async(
+                                client, paths[0], semaphore, request_bucket, token_bucket, executor, pack_tiles[0]
+                            ))
+                        else:
+                            await self.extract_pack_async(
+                                client, paths, pack_tiles, semaphore,
+                                lambda position, transactions, complete: finish(pack[position], transactions, complete),
+                                request_bucket, token_bucket, executor
+                            )
+                
+                await asyncio.gather(*(extract(pack) for pack in chunked(units, pack_size)))
+                return results
     
-    def process_multiple_images(self, image_paths: List[str]) -> List[Dict[str, Any]]:
+    def process_multiple_images(self, image_paths: List[str], workers: int = 1) -> List[Transaction]:
         """
         Procesa múltiples imágenes y combina las transacciones.
         
+        main.py usa iter_extract para guardar cada imagen en cuanto termina;
+        este método reúne todo en memoria y queda para scripts y pruebas.
+        
         Args:
             image_paths: Lista de rutas a imágenes
+            workers: Solicitudes simultáneas a la API (1 = secuencial)
             
         Returns:
-            Lista combinada de todas las transacciones
+            Lista combinada de todas las transacciones, en el orden de las imágenes
         """
-        all_transactions = []
-        
+        valid_paths = []
         for image_path in image_paths:
             if not os.path.exists(image_path):
                 print(f"⚠️  Imagen no encontrada: {image_path}")
                 continue
-            
-            transactions = self.extract_transactions(image_path)
-            all_transactions.extend(transactions)
+            valid_paths.append(image_path)
+        
+        results = self.extract_per_image(valid_paths, workers)
+        all_transactions = [t for transactions in results for t in transactions]
         
         print(f"\n📊 Total de transacciones extraídas: {len(all_transactions)}")
         return all_transactions
+    
+    def extract_per_image(self, image_paths: List[str], workers: int = 1) -> List[List[Transaction]]:
+        """
+        Extrae las transacciones de cada imagen por separado.
+        
+        Args:
+            image_paths: Lista de rutas a imágenes existentes
+            workers: Solicitudes simultáneas a la API (1 = secuencial)
+            
+        Returns:
+            Lista de transacciones por imagen, en el mismo orden que image_paths
+        """
+        results: List[List[Transaction]] = [[] for _ in image_paths]
+        for result in self.iter_extract(image_paths, workers):
+            results[result.index] = result.transactions
+        return results
+    
+    def iter_extract(self, image_paths: List[str], workers: int = 1) -> Iterator[ImageResult]:
+        """
+        Extrae las transacciones imagen por imagen y las devuelve en cuanto
+        termina cada una (con workers > 1, en orden de finalización).
+        
+        Las solicitudes concurrentes corren en un hilo con su propio bucle de
+        asyncio; este generador recoge los resultados de una cola. Con
+        pack_images > 1, cada solicitud lleva varias imágenes (ver extract_pack);
+        si no, las franjas de una captura larga se envían a la vez aunque
+        workers sea 1 (hasta TILE_WORKERS).
+        
+        Args:
+            image_paths: Lista de rutas a imágenes existentes
+            workers: Solicitudes simultáneas a la API (1 = secuencial)
+            
+        Yields:
+            ImageResult con el índice de la imagen en image_paths
+        """
+        if workers <= 1:
+            # El siguiente paquete (o imagen) se codifica mientras el actual
+            # espera a la API
+            pack_size = self.pack_limit()
+            units = self.iter_encoded(image_paths, max(ENCODE_PREFETCH, pack_size))
+            if pack_size == 1:
+                # Sin paquetes, las franjas de cada captura larga van juntas
+                packs = (list(group) for _, group in groupby(units, key=itemgetter(0)))
+            else:
+                packs = chunked(units, pack_size)
+            collector = TileCollector()
+            with ThreadPoolExecutor(max_workers=TILE_WORKERS, thread_name_prefix="tiles") as tile_pool:
+                for pack in packs:
+                    if len(pack) == 1:
+                        _, image_path, tile, encoded = pack[0]
+                        pack_results = [(0, *self.extract_image(image_path, encoded, tile))]
+                    elif pack_size == 1:
+                        # Una solicitud por franja, todas a la vez
+                        pack_results = [(position, *result) for position, result in enumerate(tile_pool.map(
+                            lambda unit: self.extract_image(unit[1], unit[3], unit[2]), pack
+                        ))]
+                    else:
+                        _, paths, pack_tiles, encoded = zip(*pack)
+                        # Cada imagen del paquete se entrega en cuanto llega su parte de la respuesta
+                        pack_results = self.iter_extract_pack(list(paths), list(pack_tiles), list(encoded))
+                    
+                    for position, transactions, complete in pack_results:
+                        index, image_path, tile, _ = pack[position]
+                        merged = collector.add(index, tile, transactions, complete)
+                        if merged is not None:
+                            yield ImageResult(index, image_path, *merged)
+            return
+        
+        print(f"⚡ Enviando hasta {workers} solicitudes simultáneas\n")
+        results: queue.Queue = queue.Queue()
+        errors = []
+
+        def run():
+            try:
+                asyncio.run(self.process_multiple_images_async(image_paths, workers, on_result=results.put))
+            except BaseException as e:
+                errors.append(e)
+            finally:
+                results.put(None)
+        
+        # Hilo daemon: si el programa se interrumpe, no espera a las solicitudes en curso
+        thread = threading.Thread(target=run, name="api-requests", daemon=True)
+        thread.start()
+        while (result := results.get()) is not None:
+            yield result
+        thread.join()
+        if errors:
+            raise errors[0]
@@ -7,27 +7,578 @@ SIN COSTOS DE API - 100% Local y Gratuito
 
 import cv2
 import numpy as np
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Iterator, Tuple, Optional
 from pathlib import Path
-import re
+import bisect
+import json
+import os
+import urllib.error
+import urllib.request
 from datetime import datetime
-import easyocr
 import uuid
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from instrumentation import NULL_PROFILER, Profiler
+from line_layout import build_layout, group_lines
+from records import Detection, ImageResult, Transaction
+from tiling import Tile, blank_rows, merge_tile_detections, plan_tiles
+from token_classifier import (
+    AMOUNT, DATE, DESCRIPTION, MONTHS, MONTH_NAMES, MONTH_LAST_DAY, INVALID_NAMES,
+    MONTH_PATTERN, MONTH_YEAR_PATTERN, DAY_MONTH_PATTERN, YEAR_PATTERN, ANY_YEAR_PATTERN,
+    OCR_DAY_FIX_PATTERN, DAY_PATTERN, AMOUNT_IN_TEXT_PATTERN, AMOUNT_IN_NAME_PATTERN,
+    AMOUNT_NUMBER_PATTERN, classify_token, find_month
+)
+
+
+# Incrementar al cambiar el algoritmo de extracción (invalida la caché de resultados)
+PROCESSOR_VERSION = "4"
+
+# Rangos de rojo en HSV (el rojo está en dos rangos)
+RED_LOWER_1 = np.array([0, 40, 40])
+RED_UPPER_1 = np.array([10, 255, 255])
+RED_LOWER_2 = np.array([160, 40, 40])
+RED_UPPER_2 = np.array([180, 255, 255])
+
+# Fracción de píxeles rojos a partir de la cual una transacción se considera marcada
+RED_OVERLAY_THRESHOLD = 0.15
+
+# Franjas rojas que se recortan antes del OCR: filas cuyo entorno vertical
+# (ventana de RED_BAND_WINDOW filas) tiene al menos este porcentaje de píxeles
+# rojizos, en tramos de una altura mínima en píxeles. La ventana evita que las
+# líneas de texto dentro de una franja marcada la partan en trozos.
+RED_BAND_ROW_THRESHOLD = 0.5
+RED_BAND_WINDOW = 31
+RED_BAND_MIN_HEIGHT = 20
+
+# Separación en blanco entre los tramos que se conservan, para que el OCR
+# no una líneas de tramos distintos
+RED_BAND_GAP = 40
+
+# Preprocesamiento opcional antes del OCR: altura objetivo (px) de las líneas
+# de texto al reducir la imagen, y escala mínima permitida
+PREPROCESS_TEXT_HEIGHT = 24
+PREPROCESS_MIN_SCALE = 0.25
+
+# Reconocimiento por lotes (ver readtext_batch): recortes de texto por pasada del
+# reconocedor y filas vacías entre las imágenes del mosaico
+RECOGNITION_BATCH_SIZE = 32
+MOSAIC_GAP = 32
+
+# Capturas largas: por encima de esta altura (px) la detección de EasyOCR reduce
+# la imagen (canvas_size), así que el OCR se hace en franjas de TILE_HEIGHT px
+# (ver tiling.py)
+TILE_TRIGGER_HEIGHT = 2560
+TILE_HEIGHT = 2000
+
+# Dirección por defecto del servidor OCR residente (ocr_server.py)
+DEFAULT_OCR_SERVER_URL = "http://127.0.0.1:8765"
 
 
 class LocalImageProcessor:
     """Procesador de imágenes bancarias con OCR local."""
     
-    def __init__(self):
-        """Inicializa el procesador de imágenes local."""
-        print("🔄 Inicializando EasyOCR (puede tardar un momento la primera vez)...")
-        self.reader = easyocr.Reader(['es', 'en'], gpu=False)
-        print("✅ EasyOCR inicializado correctamente")
+    kind = "local-easyocr"
+    version = PROCESSOR_VERSION
+    
+    def __init__(self, ocr_server_url: Optional[str] = None, skip_red_regions: bool = True,
+                 preprocess: bool = False, target_text_height: int = PREPROCESS_TEXT_HEIGHT,
+                 grayscale: bool = True, normalize_contrast: bool = False,
+                 gpu: bool = False, ocr_batch_images: int = 1):
+        """
+        Inicializa el procesador de imágenes local.
+        
+        Args:
+            ocr_server_url: URL del servidor OCR residente. Por defecto se usa
+                OCR_SERVER_URL del entorno o DEFAULT_OCR_SERVER_URL; "" lo desactiva.
+            skip_red_regions: Si es True, recorta las franjas rojizas antes del OCR
+            preprocess: Si es True, reduce y simplifica la imagen antes del OCR
+            target_text_height: Altura de texto (px) a la que se reduce la imagen
+            grayscale: Convertir a escala de grises al preprocesar
+            normalize_contrast: Aplicar ecualización de contraste (CLAHE) al preprocesar
+            gpu: Ejecutar EasyOCR en la GPU (requiere torch con CUDA)
+            ocr_batch_images: Imágenes por lote de OCR en modo secuencial
+                (1 = una a una; ver readtext_batch)
+        """
+        # El Reader se carga al primer uso: en modo paralelo solo lo cargan los workers,
+        # y con el servidor OCR en marcha no llega a cargarse
+        self._reader = None
+        
+        if ocr_server_url is None:
+            ocr_server_url = os.getenv('OCR_SERVER_URL', DEFAULT_OCR_SERVER_URL)
+        self.ocr_server_url = ocr_server_url.rstrip('/')
+        self._server_checked = False
+        self.skip_red_regions = skip_red_regions
+        
+        # Tiempos por etapa y contadores (ver instrumentation.py)
+        self.profiler = NULL_PROFILER
+        
+        # Opciones que se replican en los workers del modo paralelo
+        self.options = {
+            'skip_red_regions': skip_red_regions,
+            'preprocess': preprocess,
+            'target_text_height': target_text_height,
+            'grayscale': grayscale,
+            'normalize_contrast': normalize_contrast,
+            'gpu': gpu,
+            'ocr_batch_images': ocr_batch_images
+        }
+        
+        self.preprocess = preprocess
+        self.target_text_height = target_text_height
+        self.grayscale = grayscale
+        self.normalize_contrast = normalize_contrast
+        self.gpu = gpu
+        self.ocr_batch_images = max(1, ocr_batch_images)
+        if preprocess:
+            # Los resultados preprocesados no comparten caché con los originales
+            self.kind = (f"{self.kind}-pre{target_text_height}"
+                         f"{'-gray' if grayscale else ''}{'-clahe' if normalize_contrast else ''}")
+    
+    @property
+    def reader(self) -> 'easyocr.Reader':
+        """
+        Reader de EasyOCR, cargado una sola vez por proceso.
+        
+        easyocr (y con él torch) se importa aquí y no al cargar el módulo: con
+        el servidor OCR en marcha el proceso nunca llega a necesitarlo.
+        """
+        if self._reader is None:
+            import easyocr
+            print("🔄 Inicializando EasyOCR (puede tardar un momento la primera vez)...")
+            self._reader = easyocr.Reader(['es', 'en'], gpu=self.gpu)
+            print("✅ EasyOCR inicializado correctamente")
+        return self._reader
+    
+    @property
+    def reader_options(self) -> Dict[str, Any]:
+        """
+        Opciones con las que se crea el Reader; el servidor OCR solo se usa si
+        las suyas coinciden. El preprocesamiento no forma parte de ellas: se
+        aplica aquí antes de readtext, así que el servidor recibe la imagen ya
+        preprocesada.
+        """
+        return {'gpu': self.gpu}
+    
+    def server_available(self) -> bool:
+        """
+        Comprueba (una sola vez) si el servidor OCR residente está en marcha
+        con las mismas opciones de Reader que este procesador.
+        
+        Returns:
+            True si el servidor responde en /health y sus opciones coinciden
+        """
+        if not self.ocr_server_url:
+            return False
+        
+        if not self._server_checked:
+            self._server_checked = True
+            try:
+                with urllib.request.urlopen(f"{self.ocr_server_url}/health", timeout=0.5) as response:
+                    server_options = json.loads(response.read().decode('utf-8')).get('reader')
+                if server_options == self.reader_options:
+                    print(f"🔌 Usando servidor OCR en {self.ocr_server_url}")
+                    return True
+                # Un servidor en CPU no debe sustituir en silencio a un Reader en GPU (o al revés)
+                print(f"⚠️  El servidor OCR usa otras opciones ({server_options}; "
+                      f"se necesitan {self.reader_options}), se usa OCR local")
+            except (urllib.error.URLError, OSError, ValueError):
+                pass
+            self.ocr_server_url = ""
+        
+        return bool(self.ocr_server_url)
+    
+    def readtext(self, image: np.ndarray) -> List:
+        """
+        Ejecuta el OCR sobre una imagen, en el servidor residente si está
+        disponible o con el Reader propio en caso contrario.
+        
+        Args:
+            image: Imagen en formato BGR (o escala de grises)
+            
+        Returns:
+            Resultados de EasyOCR: lista de (bbox, texto, confianza)
+        """
+        if self.server_available():
+            try:
+                return self._readtext_remote(image)
+            except (urllib.error.URLError, OSError, ValueError) as e:
+                print(f"  ⚠️  Servidor OCR no disponible ({e}), usando OCR local")
+                self.ocr_server_url = ""
+        
+        return self.reader.readtext(image)
+    
+    def _readtext_remote(self, image: np.ndarray) -> List:
+        """Envía la imagen al servidor OCR y devuelve sus resultados."""
+        ok, buffer = cv2.imencode('.png', image)
+        if not ok:
+            raise ValueError("no se pudo codificar la imagen")
+        
+        request = urllib.request.Request(
+            f"{self.ocr_server_url}/readtext",
+            data=buffer.tobytes(),
+            headers={'Content-Type': 'image/png'},
+            method='POST'
+        )
+        with urllib.request.urlopen(request, timeout=300) as response:
+            payload = json.loads(response.read().decode('utf-8'))
+        
+        return [(bbox, text, confidence) for bbox, text, confidence in payload['results']]
+    
+    def readtext_batch(self, images: List[np.ndarray]) -> List[List]:
+        """
+        Ejecuta el OCR sobre varias imágenes a la vez con el Reader propio.
+        
+        La detección se hace en un solo lote por cada tamaño de imagen (las
+        capturas del mismo teléfono comparten tamaño). Para el reconocimiento,
+        las imágenes en escala de grises se apilan en un mosaico vertical y
+        todos los recortes de texto pasan juntos por reader.recognize en lotes
+        de RECOGNITION_BATCH_SIZE. Después cada resultado vuelve a su imagen.
+        El resultado es el mismo que llamar a readtext con cada imagen.
+        
+        En CPU, EasyOCR reconoce los recortes de uno en uno aunque se pida un
+        lote, así que la ganancia real está en la GPU (gpu=True).
+        
+        Args:
+            images: Imágenes en formato BGR (o escala de grises)
+        
+        Returns:
+            Resultados de EasyOCR por imagen, en el mismo orden que images
+        """
+        if self.server_available():
+            return [self.readtext(image) for image in images]
+        
+        from easyocr.utils import reformat_input
+        
+        reader = self.reader
+        formatted = [reformat_input(image) for image in images]
+        
+        # Detección: un lote por cada tamaño de imagen
+        horizontal_lists: List[List] = [[] for _ in images]
+        free_lists: List[List] = [[] for _ in images]
+        by_shape: Dict[tuple, List[int]] = {}
+        for index, (img, _) in enumerate(formatted):
+            by_shape.setdefault(img.shape, []).append(index)
+        
+        for indices in by_shape.values():
+            batch = formatted[indices[0]][0] if len(indices) == 1 else np.stack([formatted[i][0] for i in indices])
+            horizontal, free = reader.detect(batch, reformat=False)
+            for index, h_list, f_list in zip(indices, horizontal, free):
+                horizontal_lists[index] = h_list
+                free_lists[index] = f_list
+        
+        # Reconocimiento: mosaico vertical con todas las imágenes
+        greys = [grey for _, grey in formatted]
+        offsets = []
+        height = 0
+        for grey in greys:
+            offsets.append(height)
+            height += grey.shape[0] + MOSAIC_GAP
+        mosaic = np.zeros((height, max(grey.shape[1] for grey in greys)), dtype=np.uint8)
+        
+        mosaic_horizontal = []
+        mosaic_free = []
+        for grey, offset, h_list, f_list in zip(greys, offsets, horizontal_lists, free_lists):
+            grey_height, grey_width = grey.shape
+            mosaic[offset:offset + grey_height, :grey_width] = grey
+            # Recortar cada caja a su imagen, como hace EasyOCR con una sola imagen
+            for x_min, x_max, y_min, y_max in h_list:
+                mosaic_horizontal.append([max(0, x_min), min(x_max, grey_width),
+                                          max(0, y_min) + offset, min(y_max, grey_height) + offset])
+            for box in f_list:
+                mosaic_free.append([[x, y + offset] for x, y in box])
+        
+        if not mosaic_horizontal and not mosaic_free:
+            return [[] for _ in images]
+        
+        results = reader.recognize(mosaic, mosaic_horizontal, mosaic_free,
+                                   batch_size=RECOGNITION_BATCH_SIZE, reformat=False)
+        
+        # Devolver cada resultado a su imagen según el centro vertical de su caja
+        per_image: List[List] = [[] for _ in images]
+        for bbox, text, confidence in results:
+            y_center = sum(point[1] for point in bbox) / len(bbox)
+            index = bisect.bisect_right(offsets, y_center) - 1
+            offset = offsets[index]
+            per_image[index].append(([[x, y - offset] for x, y in bbox], text, confidence))
+        
+        return per_image
+    
+    def plan_ocr_tiles(self, image: np.ndarray) -> List[Tile]:
+        """
+        Divide en franjas las imágenes más altas que TILE_TRIGGER_HEIGHT.
+        
+        Args:
+            image: Imagen que pasa por el OCR
+        
+        Returns:
+            Franjas de la imagen (una sola, la imagen entera, si no es alta)
+        """
+        height = image.shape[0]
+        if height <= TILE_TRIGGER_HEIGHT:
+            return [Tile(0, 1, 0, height, 0, height)]
+        
+        gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        return plan_tiles(blank_rows(gray), TILE_HEIGHT)
+    
+    def readtext_tiled(self, image: np.ndarray) -> List:
+        """
+        Ejecuta el OCR sobre una imagen, en franjas si es una captura larga.
+        
+        Las franjas pasan siempre juntas por readtext_batch, aunque
+        ocr_batch_images sea 1: su reconocimiento va en un solo lote (en GPU,
+        todas a la vez). El Reader no se comparte entre hilos, así que en CPU
+        no hay más paralelismo que el de --workers entre imágenes. Las
+        detecciones se unen en coordenadas de la imagen completa (ver
+        tiling.merge_tile_detections).
+        
+        Args:
+            image: Imagen en formato BGR (o escala de grises)
+        
+        Returns:
+            Resultados de EasyOCR sobre la imagen completa
+        """
+        tiles = self.plan_ocr_tiles(image)
+        if len(tiles) == 1:
+            return self.readtext(image)
+        
+        print(f"  🧩 Captura larga: OCR en {len(tiles)} franjas")
+        strips = [image[tile.top:tile.bottom] for tile in tiles]
+        return merge_tile_detections(self.readtext_batch(strips), tiles)
+    
+    def red_mask(self, image: np.ndarray) -> np.ndarray:
+        """
+        Calcula la máscara de píxeles rojizos de una imagen.
+        
+        Args:
+            image: Imagen (o región) en formato BGR
+            
+        Returns:
+            Máscara uint8 con 255 en los píxeles rojizos
+        """
+        # Convertir a HSV para mejor detección de color
+        hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+        
+        # El rojo está en dos rangos de HSV: rojo oscuro/marrón rojizo y rojo brillante
+        mask1 = cv2.inRange(hsv, RED_LOWER_1, RED_UPPER_1)
+        mask2 = cv2.inRange(hsv, RED_LOWER_2, RED_UPPER_2)
+        return cv2.bitwise_or(mask1, mask2)
+    
+    def red_integral(self, image: np.ndarray) -> np.ndarray:
+        """
+        Calcula la tabla de áreas sumadas (imagen integral) de la máscara roja.
+        
+        Con ella, la cantidad de píxeles rojizos de cualquier rectángulo se
+        obtiene con cuatro lecturas, sin volver a convertir la imagen a HSV.
+        
+        Args:
+            image: Imagen completa en formato BGR
+            
+        Returns:
+            Matriz (alto + 1, ancho + 1) con los conteos acumulados
+        """
+        return cv2.integral((self.red_mask(image) > 0).astype(np.uint8))
+    
+    def red_fractions(self, integral: np.ndarray, bboxes: List[Tuple[float, float, float, float]]) -> np.ndarray:
+        """
+        Calcula la fracción de píxeles rojizos de varios rectángulos a la vez.
+        
+        Args:
+            integral: Imagen integral devuelta por red_integral
+            bboxes: Lista de bounding boxes (x1, y1, x2, y2)
+            
+        Returns:
+            Array con la fracción roja de cada bbox (0 para bboxes vacíos)
+        """
+        if not bboxes:
+            return np.zeros(0)
+        
+        height, width = integral.shape[0] - 1, integral.shape[1] - 1
+        boxes = np.asarray(bboxes, dtype=np.float64).astype(np.int64)
+        x1 = np.clip(boxes[:, 0], 0, width)
+        y1 = np.clip(boxes[:, 1], 0, height)
+        x2 = np.clip(boxes[:, 2], x1, width)
+        y2 = np.clip(boxes[:, 3], y1, height)
+        
+        red = (integral[y2, x2] - integral[y1, x2] - integral[y2, x1] + integral[y1, x1]).astype(np.float64)
+        area = (x2 - x1) * (y2 - y1)
+        return np.divide(red, area, out=np.zeros_like(red), where=area > 0)
+    
+    def detect_red_overlays(self, integral: np.ndarray, bboxes: List[Tuple[float, float, float, float]]) -> List[bool]:
+        """
+        Detecta en una sola pasada qué áreas de la imagen tienen overlay rojizo.
+        
+        Args:
+            integral: Imagen integral devuelta por red_integral
+            bboxes: Lista de bounding boxes (x1, y1, x2, y2)
+            
+        Returns:
+            Lista con True para cada bbox marcado en rojo
+        """
+        # Si más del 15% del área es roja, considerarla marcada
+        return (self.red_fractions(integral, bboxes) > RED_OVERLAY_THRESHOLD).tolist()
+    
+    def find_red_bands(self, integral: np.ndarray) -> List[Tuple[int, int]]:
+        """
+        Busca franjas horizontales con tinte rojizo (transacciones marcadas).
+        
+        Args:
+            integral: Imagen integral devuelta por red_integral
+            
+        Returns:
+            Lista de franjas (y1, y2), con y2 exclusivo
+        """
+        width = integral.shape[1] - 1
+        if width == 0:
+            return []
+        
+        # Fracción de píxeles rojos por fila (última columna de la integral),
+        # promediada sobre una ventana vertical
+        row_fraction = np.diff(integral[:, -1]) / width
+        window = np.ones(RED_BAND_WINDOW) / RED_BAND_WINDOW
+        red_rows = np.convolve(row_fraction, window, mode='same') >= RED_BAND_ROW_THRESHOLD
+        
+        # Inicios y finales de cada tramo consecutivo de filas rojas
+        edges = np.diff(np.concatenate(([0], red_rows.astype(np.int8), [0])))
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1)
+        
+        return [(int(y1), int(y2)) for y1, y2 in zip(starts, ends) if y2 - y1 >= RED_BAND_MIN_HEIGHT]
+    
+    def remove_red_bands(self, image: np.ndarray, bands: List[Tuple[int, int]]) -> Tuple[np.ndarray, List[Tuple[int, int, int]]]:
+        """
+        Recorta las franjas rojizas y une los tramos restantes con una
+        separación en blanco.
+        
+        Args:
+            image: Imagen en formato BGR
+            bands: Franjas (y1, y2) a eliminar, ordenadas
+            
+        Returns:
+            Tupla (imagen compacta, tramos) donde cada tramo es
+            (y inicial original, y final original, y inicial en la imagen compacta)
+        """
+        height = image.shape[0]
+        segments = []
+        pieces = []
+        dst_y = 0
+        src_y = 0
+        
+        for band_start, band_end in bands + [(height, height)]:
+            if band_start > src_y:
+                if pieces:
+                    gap = np.full((RED_BAND_GAP,) + image.shape[1:], 255, dtype=image.dtype)
+                    pieces.append(gap)
+                    dst_y += RED_BAND_GAP
+                pieces.append(image[src_y:band_start])
+                segments.append((src_y, band_start, dst_y))
+                dst_y += band_start - src_y
+            src_y = band_end
+        
+        if not pieces:
+            return image[:0], []
+        return np.concatenate(pieces, axis=0), segments
+    
+    def map_to_source(self, results: List, segments: List[Tuple[int, int, int]]) -> List:
+        """
+        Traslada las coordenadas Y de los resultados del OCR de la imagen
+        compacta a la imagen original.
+        
+        Args:
+            results: Resultados de EasyOCR sobre la imagen compacta
+            segments: Tramos devueltos por remove_red_bands
+            
+        Returns:
+            Resultados con bboxes en coordenadas de la imagen original
+        """
+        dst_starts = [dst_y for _, _, dst_y in segments]
+        mapped = []
+        
+        for bbox, text, confidence in results:
+            y_center = (bbox[0][1] + bbox[2][1]) / 2
+            index = max(0, bisect.bisect_right(dst_starts, y_center) - 1)
+            src_y, _, dst_y = segments[index]
+            offset = src_y - dst_y
+            mapped.append(([[x, y + offset] for x, y in bbox], text, confidence))
+        
+        return mapped
+    
+    def estimate_text_height(self, gray: np.ndarray) -> Optional[float]:
+        """
+        Estima la altura típica de las líneas de texto con una proyección horizontal.
+        
+        Args:
+            gray: Imagen en escala de grises
+            
+        Returns:
+            Mediana de la altura de las líneas de texto en píxeles, o None si no se detectan
+        """
+        # Tinta = píxeles más oscuros que el fondo (umbral de Otsu)
+        _, ink = cv2.threshold(gray, 0, 1, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        ink_rows = ink.sum(axis=1) > gray.shape[1] * 0.005
+        
+        edges = np.diff(np.concatenate(([0], ink_rows.astype(np.int8), [0])))
+        heights = np.flatnonzero(edges == -1) - np.flatnonzero(edges == 1)
+        heights = heights[heights >= 4]
+        
+        return float(np.median(heights)) if heights.size else None
+    
+    def preprocess_image(self, image: np.ndarray) -> Tuple[np.ndarray, float]:
+        """
+        Prepara la imagen para el OCR: reducción a la altura de texto objetivo,
+        escala de grises y normalización de contraste opcional.
+        
+        Args:
+            image: Imagen en formato BGR
+            
+        Returns:
+            Tupla (imagen preprocesada, escala aplicada)
+        """
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        
+        # Nunca se amplía: solo se reduce si el texto es más alto que el objetivo
+        scale = 1.0
+        text_height = self.estimate_text_height(gray)
+        if text_height and text_height > self.target_text_height:
+            scale = max(PREPROCESS_MIN_SCALE, self.target_text_height / text_height)
+        
+        processed = gray if self.grayscale else image
+        if scale < 1.0:
+            processed = cv2.resize(processed, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        
+        if self.normalize_contrast:
+            if not self.grayscale:
+                processed = cv2.cvtColor(processed, cv2.COLOR_BGR2GRAY)
+            processed = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8)).apply(processed)
+        
+        return processed, scale
+    
+    def rescale_results(self, results: List, scale: float) -> List:
+        """
+        Lleva las coordenadas de los resultados del OCR sobre una imagen
+        reducida a la escala original.
+        
+        Así los umbrales en píxeles de la agrupación (tolerancia de línea,
+        distancia entre líneas, expansión del bbox) siguen valiendo tal cual.
+        
+        Args:
+            results: Resultados de EasyOCR sobre la imagen reducida
+            scale: Escala aplicada en preprocess_image
+            
+        Returns:
+            Resultados con bboxes en la escala original
+        """
+        return [([[x / scale, y / scale] for x, y in bbox], text, confidence)
+                for bbox, text, confidence in results]
     
     def detect_red_overlay(self, image: np.ndarray, bbox: Tuple[int, int, int, int]) -> bool:
         """
         Detecta si un área de la imagen tiene overlay rojizo.
         
+        Para revisar varias áreas de la misma imagen, usar red_integral y
+        detect_red_overlays, que convierten la imagen una sola vez.
+        
         Args:
             image: Imagen en formato BGR
             bbox: Bounding box (x1, y1, x2, y2)
@@ -43,28 +594,12 @@ class LocalImageProcessor:
         if roi.size == 0:
             return False
         
-        # Convertir a HSV para mejor detección de color
-        hsv = cv2.cvtColor(roi, cv2.COLOR_BGR2HSV)
-        
-        # Definir rangos de rojo en HSV (el rojo está en dos rangos)
-        # Rango 1: rojo oscuro/marron rojizo
-        lower_red1 = np.array([0, 40, 40])
-        upper_red1 = np.array([10, 255, 255])
-        
-        # Rango 2: rojo brillante
-        lower_red2 = np.array([160, 40, 40])
-        upper_red2 = np.array([180, 255, 255])
-        
-        # Crear máscaras
-        mask1 = cv2.inRange(hsv, lower_red1, upper_red1)
-        mask2 = cv2.inRange(hsv, lower_red2, upper_red2)
-        red_mask = mask1 + mask2
-        
         # Calcular porcentaje de píxeles rojos
+        red_mask = self.red_mask(roi)
         red_percentage = np.sum(red_mask > 0) / red_mask.size
         
         # Si más del 15% del área es roja, considerarla marcada
-        return red_percentage > 0.15
+        return red_percentage > RED_OVERLAY_THRESHOLD
     
     def parse_date(self, date_str: str, month_context: str = None) -> str:
         """
@@ -82,32 +617,21 @@ class LocalImageProcessor:
         
         # Corrección de errores comunes de OCR en días
         # "71" -> "11", "72" -> "12", etc.
-        date_str = re.sub(r'\b7([0-9])\b', r'1\1', date_str)
+        date_str = OCR_DAY_FIX_PATTERN.sub(r'1\1', date_str)
         
         # Patrón: "31 Agosto" o solo "31"
-        day_match = re.search(r'\b(\d{1,2})\b', date_str)
+        day_match = DAY_PATTERN.search(date_str)
         
         if day_match:
             day = day_match.group(1).zfill(2)
             
-            # Buscar mes en el string
-            meses = {
-                'enero': '01', 'febrero': '02', 'marzo': '03', 'abril': '04',
-                'mayo': '05', 'junio': '06', 'julio': '07', 'agosto': '08',
-                'septiembre': '09', 'octubre': '10', 'noviembre': '11', 'diciembre': '12'
-            }
-            
-            month = None
-            year = None
-            
             # Buscar mes en date_str
-            for mes_name, mes_num in meses.items():
-                if mes_name.lower() in date_str.lower():
-                    month = mes_num
-                    break
+            month_name = find_month(date_str)
+            month = MONTHS[month_name] if month_name else None
+            year = None
             
             # Buscar año
-            year_match = re.search(r'\b(20\d{2})\b', date_str)
+            year_match = YEAR_PATTERN.search(date_str)
             if year_match:
                 year = year_match.group(1)
             
@@ -115,12 +639,11 @@ class LocalImageProcessor:
             if not month or not year:
                 if month_context:
                     # Extraer mes y año del contexto (ej: "Agosto 2025")
-                    for mes_name, mes_num in meses.items():
-                        if mes_name.lower() in month_context.lower():
-                            month = mes_num
-                            break
+                    month_name = find_month(month_context)
+                    if month_name:
+                        month = MONTHS[month_name]
                     
-                    year_match = re.search(r'\b(20\d{2})\b', month_context)
+                    year_match = YEAR_PATTERN.search(month_context)
                     if year_match:
                         year = year_match.group(1)
             
@@ -156,7 +679,7 @@ class LocalImageProcessor:
         
         # Buscar número con posible signo negativo y separador de miles
         # Capturar formato: -4,900.00 o -4900.00 o 4,900.00
-        amount_match = re.search(r'(-?\s*\d{1,3}(?:[.,]\d{3})*[.,]\d+|-?\s*\d+[.,]\d+|-?\s*\d+)', amount_str)
+        amount_match = AMOUNT_NUMBER_PATTERN.search(amount_str)
         
         if amount_match:
             amount_text = amount_match.group(1).replace(' ', '')
@@ -201,26 +724,18 @@ class LocalImageProcessor:
             text = detection[1].strip()
             
             # Buscar patrón de mes y año en español
-            meses_pattern = r'(Enero|Febrero|Marzo|Abril|Mayo|Junio|Julio|Agosto|Septiembre|Octubre|Noviembre|Diciembre)\s*(20\d{2})'
-            match = re.search(meses_pattern, text, re.IGNORECASE)
+            match = MONTH_YEAR_PATTERN.search(text)
             
             if match:
                 return f"{match.group(1).capitalize()} {match.group(2)}"
         
-        # Si no encontramos en el header, buscar en las fechas del contenido
-        meses_es = {
-            'enero': 'Enero', 'febrero': 'Febrero', 'marzo': 'Marzo', 'abril': 'Abril',
-            'mayo': 'Mayo', 'junio': 'Junio', 'julio': 'Julio', 'agosto': 'Agosto',
-            'septiembre': 'Septiembre', 'octubre': 'Octubre', 'noviembre': 'Noviembre', 'diciembre': 'Diciembre'
-        }
-        
-        # Buscar menciones de meses en el contenido
+        # Si no encontramos en el header, buscar menciones de meses en el contenido
         for detection in ocr_results:
             text = detection[1].strip().lower()
-            for mes_lower, mes_proper in meses_es.items():
+            for mes_lower, mes_proper in MONTH_NAMES.items():
                 if mes_lower in text:
                     # Buscar año cercano
-                    year_match = re.search(r'20\d{2}', detection[1])
+                    year_match = ANY_YEAR_PATTERN.search(detection[1])
                     if year_match:
                         return f"{mes_proper} {year_match.group(0)}"
                     # Si no hay año, usar 2025 por defecto (año de las imágenes)
@@ -228,10 +743,10 @@ class LocalImageProcessor:
         
         # Si no encontramos, intentar extraer de nombre de archivo
         filename = Path(image_path).stem.lower()
-        for mes_lower, mes_proper in meses_es.items():
+        for mes_lower, mes_proper in MONTH_NAMES.items():
             if mes_lower in filename:
                 # Buscar año en filename
-                year_match = re.search(r'20\d{2}', filename)
+                year_match = ANY_YEAR_PATTERN.search(filename)
                 year = year_match.group(0) if year_match else "2025"
                 return f"{mes_proper} {year}"
         
@@ -239,9 +754,9 @@ class LocalImageProcessor:
         # Buscar todas las fechas en formato DD Mes
         for detection in ocr_results:
             text = detection[1].strip()
-            match = re.search(r'\d{1,2}\s+(Enero|Febrero|Marzo|Abril|Mayo|Junio|Julio|Agosto|Septiembre|Octubre|Noviembre|Diciembre)', text, re.IGNORECASE)
+            match = DAY_MONTH_PATTERN.search(text)
             if match:
-                return f"{match.group(1).capitalize()} 2025"
+                return f"{match.group(2).capitalize()} 2025"
         
         # Último recurso: mes actual
         return datetime.now().strftime('%B %Y')
@@ -268,136 +783,151 @@ class LocalImageProcessor:
         for detection in detections:
             bbox = detection[0]
             y_center = (bbox[0][1] + bbox[2][1]) / 2
-            x_center = (bbox[0][0] + bbox[2][0]) / 2
             
             if header_threshold < y_center < footer_threshold:
-                relevant_detections.append({
-                    'bbox': bbox,
-                    'text': detection[1],
-                    'confidence': detection[2],
-                    'y_center': y_center,
-                    'x_center': x_center,
-                    'x_left': bbox[0][0],
-                    'x_right': bbox[2][0],
-                    'y_top': bbox[0][1],
-                    'y_bottom': bbox[2][1],
-                    'width': bbox[2][0] - bbox[0][0],
-                    'height': bbox[2][1] - bbox[0][1]
-                })
+                relevant_detections.append(Detection.from_ocr(detection, classify_token(detection[1])))
+            
+        # Identificar líneas horizontales y agrupar en transacciones las que
+        # empiezan con una descripción o un monto
+        layout = build_layout(relevant_detections)
+        groups = group_lines(layout, lambda line: any(
+            item.token.marks_amount or item.token.marks_description for item in line.items
+        ))
         
-        # Ordenar por posición vertical
-        relevant_detections.sort(key=lambda x: x['y_center'])
-        
-        # Identificar líneas horizontales (elementos en la misma altura Y)
-        lines = []
-        current_line = []
-        last_y = None
-        y_tolerance = 18  # Más estricto para evitar combinar transacciones cercanas
-        
-        for item in relevant_detections:
-            if last_y is None or abs(item['y_center'] - last_y) <= y_tolerance:
-                current_line.append(item)
-                last_y = item['y_center'] if last_y is None else (last_y + item['y_center']) / 2
-            else:
-                if current_line:
-                    lines.append(sorted(current_line, key=lambda x: x['x_left']))
-                current_line = [item]
-                last_y = item['y_center']
-        
-        if current_line:
-            lines.append(sorted(current_line, key=lambda x: x['x_left']))
-        
-        # Agrupar líneas en transacciones
         transactions = []
-        i = 0
+        for transaction_lines in groups:
+            # Extraer información de todas las líneas de la transacción
+            all_items = [item for tline in transaction_lines for item in tline.items]
+                
+            name_parts = []
+            date_text = ""
+            amount_text = ""
+            
+            for item in all_items:
+                # Monto (con variaciones de OCR: S/, Sl, SI, $), fecha ("18",
+                # "18 Septiembre; 01.41") o descripción; el resto es ruido de la interfaz
+                kind, text = item.token.kind, item.token.text
+                
+                if kind == AMOUNT:
+                    if not amount_text or len(text) > len(amount_text):
+                        amount_text = text
+                elif kind == DATE:
+                    if not date_text:
+                        date_text = text
+                elif kind == DESCRIPTION:
+                    name_parts.append(text)
         
-        while i < len(lines):
-            line = lines[i]
+            name = ' '.join(name_parts) if name_parts else ""
             
-            # Buscar elementos que indican una transacción
-            has_amount = any('S/' in item['text'] or 's/' in item['text'] or re.search(r'-?\s*\d+[.,]\d+', item['text']) for item in line)
-            has_description = any(len(item['text']) > 3 and not item['text'].isdigit() and 'S/' not in item['text'] for item in line)
+            # Filtrar nombres que obviamente no son transacciones
+            if name.lower() in INVALID_NAMES or len(name) < 3:
+                continue
             
-            # Si esta línea tiene descripción o monto, es probablemente parte de una transacción
-            if has_description or has_amount:
-                transaction_lines = [line]
-                
-                # Buscar líneas adicionales que pertenezcan a esta transacción (dentro de ~80px)
-                j = i + 1
-                while j < len(lines) and j < i + 5:  # Máximo 5 líneas por transacción
-                    next_line = lines[j]
-                    y_distance = next_line[0]['y_center'] - transaction_lines[-1][0]['y_center']
-                    
-                    if y_distance <= 80:  # Más estricto para evitar combinar transacciones
-                        transaction_lines.append(next_line)
-                        j += 1
-                    else:
-                        break
+            # Validar que sea una transacción real
+            # Ahora aceptamos si tiene nombre + (monto O fecha), no necesariamente ambos
+            if name and len(name) > 3:
+                # Calcular bbox completo
+                min_x = min(item.x_left for item in all_items)
+                min_y = min(item.y_top for item in all_items)
+                max_x = max(item.x_right for item in all_items)
+                max_y = max(item.y_bottom for item in all_items)
                 
-                # Extraer información de todas las líneas de la transacción
-                all_items = [item for tline in transaction_lines for item in tline]
-                
-                name_parts = []
-                date_text = ""
-                amount_text = ""
-                
-                for item in all_items:
-                    text = item['text'].strip()
-                    
-                    # Detectar monto (con variaciones de OCR: S/, Sl, SI, $)
-                    is_amount = (('S/' in text or 's/' in text or 'Sl' in text or 'sl' in text or 'SI' in text or '$' in text) and re.search(r'\d', text))
-                    # También detectar números con signo negativo directo
-                    is_amount = is_amount or re.match(r'^-?\s*\d+[.,]\d+$', text)
-                    
-                    if is_amount:
-                        if not amount_text or len(text) > len(amount_text):
-                            amount_text = text
-                    # Detectar fecha (número pequeño + posible mes)
-                    elif re.match(r'^\d{1,2}(\s+(Enero|Febrero|Marzo|Abril|Mayo|Junio|Julio|Agosto|Septiembre|Octubre|Noviembre|Diciembre))?$', text, re.IGNORECASE):
-                        if not date_text:
-                            date_text = text
-                    # Detectar fecha con formato extendido "18 Septiembre; 01.41"
-                    elif re.match(r'^\d{1,2}\s+\w+;\s*\d', text, re.IGNORECASE):
-                        if not date_text:
-                            date_text = text
-                    # Detectar descripción (texto que no es fecha ni monto)
-                    elif len(text) > 2 and not text.isdigit() and 'S/' not in text and 's/' not in text and 'Sl' not in text and '$' not in text:
-                        # Evitar agregar el header "Movimientos" o "Fecha" o iconos
-                        if text.lower() not in ['movimientos', 'fecha', 'monto', 'in', 'co', 'im', 'de', 'tr', '#', 'pm', 'p.m.', 'a.m.', 'pm.', 'a.m', 'ma', 'po', 'en', 'eb', 'ley', 'ex']:
-                            name_parts.append(text)
-                
-                name = ' '.join(name_parts) if name_parts else ""
-                
-                # Filtrar nombres que obviamente no son transacciones
-                invalid_names = ['septiembre 2025', 'agosto 2025', 'enero 2026', 'movimientos fecha', 'buscador de movimientos']
-                if name.lower() in invalid_names or len(name) < 3:
-                    i = j
-                    continue
-                
-                # Validar que sea una transacción real
-                # Ahora aceptamos si tiene nombre + (monto O fecha), no necesariamente ambos
-                if name and len(name) > 3:
-                    # Calcular bbox completo
-                    min_x = min(item['x_left'] for item in all_items)
-                    min_y = min(item['y_top'] for item in all_items)
-                    max_x = max(item['x_right'] for item in all_items)
-                    max_y = max(item['y_bottom'] for item in all_items)
-                    
-                    transactions.append({
-                        'name': name,
-                        'date_text': date_text,
-                        'amount_text': amount_text,
-                        'bbox': [[min_x, min_y], [max_x, min_y], [max_x, max_y], [min_x, max_y]]
-                    })
-                
-                # Avanzar al siguiente grupo
-                i = j
-            else:
-                i += 1
+                transactions.append({
+                    'name': name,
+                    'date_text': date_text,
+                    'amount_text': amount_text,
+                    'bbox': [[min_x, min_y], [max_x, min_y], [max_x, max_y], [min_x, max_y]]
+                })
         
         return transactions
     
-    def extract_transactions(self, image_path: str, debug: bool = False) -> List[Dict[str, Any]]:
+    def build_transactions(self, transaction_groups: List[Dict[str, Any]], red_flags: List[bool],
+                           month_year: str, debug: bool = False) -> List[Transaction]:
+        """
+        Convierte los grupos de OCR en transacciones (fecha, monto, moneda).
+        
+        Args:
+            transaction_groups: Grupos devueltos por group_transaction_elements
+            red_flags: Indica por grupo si tiene overlay rojo (se omite)
+            month_year: Mes y año del contexto (ej: "Agosto 2025")
+            debug: Si es True, muestra información detallada de depuración
+            
+        Returns:
+            Lista de transacciones válidas
+        """
+        transactions = []
+        
+        for group, has_red_overlay in zip(transaction_groups, red_flags):
+            if has_red_overlay:
+                print(f"  🚫 Omitiendo transacción con overlay rojo: {group['name'][:30]}")
+                continue
+            
+            # Parsear fecha
+            date = self.parse_date(group['date_text'], month_year)
+            if not date:
+                # Intentar extraer fecha del nombre (ej: "DEPOSITO EFECTIVO 29 Septiembre")
+                date_in_name = DAY_MONTH_PATTERN.search(group['name'])
+                if date_in_name:
+                    date = self.parse_date(date_in_name.group(0), month_year)
+                    # No remover la fecha del nombre ya que puede ser parte de la descripción
+                else:
+                    # Si solo tiene el mes en el nombre (sin día), usar el último día del mes del contexto
+                    month_only = MONTH_PATTERN.search(group['name'])
+                    if month_only and month_year:
+                        # Usar el último día del mes del contexto
+                        mes_name = month_only.group(1).lower()
+                        if mes_name in MONTHS:
+                            ultimo_dia, mes_num = MONTH_LAST_DAY[mes_name], MONTHS[mes_name]
+                            # Extraer año del contexto
+                            year_match = YEAR_PATTERN.search(month_year)
+                            year = year_match.group(1) if year_match else datetime.now().strftime('%Y')
+                            date = f"{ultimo_dia}/{mes_num}/{year}"
+            
+            if not date:
+                # Si no hay fecha explícita, usar mes/año del contexto
+                date = f"01/{datetime.now().strftime('%m/%Y')}"
+            
+            # Parsear monto y moneda
+            amount, tipo, moneda = self.parse_amount(group['amount_text'])
+            
+            # Si no hay monto en amount_text, intentar extraerlo del nombre
+            if amount == 0 and group['name']:
+                # Buscar patrones de monto en el nombre (S/ o $)
+                amount_in_name = AMOUNT_IN_TEXT_PATTERN.search(group['name'])
+                if amount_in_name:
+                    amount, tipo, moneda = self.parse_amount(amount_in_name.group(1))
+                    if amount != 0:
+                        # Remover el monto del nombre
+                        group['name'] = AMOUNT_IN_NAME_PATTERN.sub('', group['name']).strip()
+            
+            # Validar que tengamos datos mínimos
+            if group['name'] and amount != 0:
+                transactions.append(Transaction(
+                    id=str(uuid.uuid4()),
+                    date=date,
+                    name=group['name'].strip(),
+                    amount=amount,
+                    type=tipo,
+                    currency=moneda,
+                    month=month_year
+                ))
+            elif group['name'] and len(group['name']) > 5:  # Incluir transacciones sin monto si el nombre es razonable
+                if debug:
+                    print(f"  ⚠️  Transacción sin monto detectado: {group['name'][:40]}")
+                # Agregar con monto 0 para no perderla
+                transactions.append(Transaction(
+                    id=str(uuid.uuid4()),
+                    date=date if date else "01/01/2026",
+                    name=group['name'].strip() + " [SIN MONTO DETECTADO]",
+                    amount=0.0,
+                    type="cargo",
+                    currency="S/",
+                    month=month_year
+                ))
+        
+        return transactions
+    
+    def extract_transactions(self, image_path: str, debug: bool = False) -> List[Transaction]:
         """
         Extrae transacciones de una imagen usando OCR local.
         
@@ -408,50 +938,149 @@ class LocalImageProcessor:
         Returns:
             Lista de transacciones extraídas
         """
-        print(f"📸 Procesando imagen: {Path(image_path).name}")
+        with self.profiler.profile_image(image_path):
+            return self._extract_transactions(image_path, debug)
+    
+    def _extract_transactions(self, image_path: str, debug: bool = False) -> List[Transaction]:
+        image_name = Path(image_path).name
+        print(f"📸 Procesando imagen: {image_name}")
         
         try:
-            # Leer imagen
-            image = cv2.imread(image_path)
-            if image is None:
-                print(f"❌ No se pudo leer la imagen: {image_path}")
+            prepared = self.prepare_image(image_path, debug)
+            if prepared is None:
                 return []
             
-            image_height, image_width = image.shape[:2]
-            
             # Realizar OCR
             print("  🔍 Extrayendo texto con OCR...")
-            results = self.reader.readtext(image)
+            ocr_image = prepared['ocr_image']
+            with self.profiler.stage('readtext', image_name):
+                results = self.readtext_tiled(ocr_image) if ocr_image.size else []
             
-            if not results:
-                print("  ⚠️  No se detectó texto en la imagen")
-                return []
+            return self.finish_extraction(prepared, results, debug)
+        
+        except Exception as e:
+            print(f"  ❌ Error al procesar imagen: {e}")
+            import traceback
+            traceback.print_exc()
+            return []
+    
+    def prepare_image(self, image_path: str, debug: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Carga la imagen y prepara la versión que pasa por el OCR: recorte de
+        franjas rojas y preprocesamiento opcional.
+        
+        Args:
+            image_path: Ruta a la imagen de movimientos bancarios
+            debug: Si es True, muestra información detallada de depuración
+        
+        Returns:
+            Diccionario con la imagen para el OCR y lo necesario para volver a
+            las coordenadas originales, o None si no se pudo leer la imagen
+        """
+        image_name = Path(image_path).name
+        profiler = self.profiler
+        
+        # Leer imagen
+        with profiler.stage('load', image_name):
+            image = cv2.imread(image_path)
+        if image is None:
+            print(f"❌ No se pudo leer la imagen: {image_path}")
+            return None
             
-            if debug:
-                print(f"\n  🐛 DEBUG: Total de elementos OCR detectados: {len(results)}")
-                for i, detection in enumerate(results):
-                    print(f"    {i+1}. {detection[1]}")
+        image_height, image_width = image.shape[:2]
+        
+        # Máscara roja de toda la imagen (se reutiliza para la verificación de overlays)
+        with profiler.stage('red_mask', image_name):
+            integral = self.red_integral(image)
             
-            # Extraer mes y año
+            # Recortar las franjas marcadas en rojo para no gastar OCR en ellas
+            ocr_image = image
+            segments = None
+            if self.skip_red_regions:
+                bands = self.find_red_bands(integral)
+                if bands:
+                    skipped = sum(y2 - y1 for y1, y2 in bands)
+                    print(f"  ✂️  Omitiendo {len(bands)} franjas rojas antes del OCR "
+                          f"({skipped / image_height:.0%} de la imagen)")
+                    ocr_image, segments = self.remove_red_bands(image, bands)
+                    profiler.count('red_bands', len(bands), image_name)
+        
+        # Reducir y simplificar la imagen si está activado el preprocesamiento
+        scale = 1.0
+        if self.preprocess and ocr_image.size:
+            with profiler.stage('preprocess', image_name):
+                ocr_image, scale = self.preprocess_image(ocr_image)
+            if debug:
+                print(f"  🐛 DEBUG: Escala de preprocesamiento: {scale:.2f}")
+        
+        return {
+            'image_path': image_path,
+            'image_name': image_name,
+            'image_height': image_height,
+            'image_width': image_width,
+            'integral': integral,
+            'ocr_image': ocr_image,
+            'segments': segments,
+            'scale': scale
+        }
+    
+    def finish_extraction(self, prepared: Dict[str, Any], results: List, debug: bool = False) -> List[Transaction]:
+        """
+        Convierte los resultados del OCR de una imagen preparada en transacciones.
+        
+        Args:
+            prepared: Imagen preparada con prepare_image
+            results: Resultados de EasyOCR sobre prepared['ocr_image']
+            debug: Si es True, muestra información detallada de depuración
+        
+        Returns:
+            Lista de transacciones extraídas
+        """
+        image_path = prepared['image_path']
+        image_name = prepared['image_name']
+        image_height = prepared['image_height']
+        image_width = prepared['image_width']
+        integral = prepared['integral']
+        profiler = self.profiler
+        
+        # Volver a las coordenadas de la imagen original
+        if prepared['scale'] != 1.0:
+            results = self.rescale_results(results, prepared['scale'])
+        if prepared['segments']:
+            results = self.map_to_source(results, prepared['segments'])
+        profiler.count('detections', len(results), image_name)
+        
+        if not results:
+            print("  ⚠️  No se detectó texto en la imagen")
+            return []
+        
+        if debug:
+            print(f"\n  🐛 DEBUG: Total de elementos OCR detectados: {len(results)}")
+            for i, detection in enumerate(results):
+                print(f"    {i+1}. {detection[1]}")
+        
+        # Extraer mes y año
+        with profiler.stage('month', image_name):
             month_year = self.extract_month_year(image_path, results)
-            print(f"  📅 Mes detectado: {month_year}")
-            
-            # Agrupar elementos en transacciones
+        print(f"  📅 Mes detectado: {month_year}")
+        
+        # Agrupar elementos en transacciones
+        with profiler.stage('group', image_name):
             transaction_groups = self.group_transaction_elements(results, image_height, image_width)
-            print(f"  📊 Transacciones detectadas: {len(transaction_groups)}")
-            
-            if debug:
-                print(f"\n  🐛 DEBUG: Transacciones agrupadas:")
-                for i, group in enumerate(transaction_groups):
-                    print(f"    {i+1}. Nombre: {group['name'][:40]}")
-                    print(f"       Fecha: {group['date_text']}")
-                    print(f"       Monto: {group['amount_text']}")
-            
-            # Procesar cada transacción
-            transactions = []
-            
+        profiler.count('groups', len(transaction_groups), image_name)
+        print(f"  📊 Transacciones detectadas: {len(transaction_groups)}")
+        
+        if debug:
+            print(f"\n  🐛 DEBUG: Transacciones agrupadas:")
+            for i, group in enumerate(transaction_groups):
+                print(f"    {i+1}. Nombre: {group['name'][:40]}")
+                print(f"       Fecha: {group['date_text']}")
+                print(f"       Monto: {group['amount_text']}")
+        
+        # Verificar overlay rojo de todas las transacciones en una sola pasada
+        with profiler.stage('overlay', image_name):
+            overlay_bboxes = []
             for group in transaction_groups:
-                # Verificar overlay rojo
                 bbox = group['bbox']
                 x1 = min([p[0] for p in bbox])
                 y1 = min([p[1] for p in bbox])
@@ -460,114 +1089,242 @@ class LocalImageProcessor:
                 
                 # Expandir bbox para capturar toda la transacción
                 y2 = min(y2 + 100, image_height)
-                
-                if self.detect_red_overlay(image, (x1, y1, x2, y2)):
-                    print(f"  🚫 Omitiendo transacción con overlay rojo: {group['name'][:30]}")
-                    continue
-                
-                # Parsear fecha
-                date = self.parse_date(group['date_text'], month_year)
-                if not date:
-                    # Intentar extraer fecha del nombre (ej: "DEPOSITO EFECTIVO 29 Septiembre")
-                    date_in_name = re.search(r'(\d{1,2})\s+(Enero|Febrero|Marzo|Abril|Mayo|Junio|Julio|Agosto|Septiembre|Octubre|Noviembre|Diciembre)', group['name'], re.IGNORECASE)
-                    if date_in_name:
-                        date = self.parse_date(date_in_name.group(0), month_year)
-                        # No remover la fecha del nombre ya que puede ser parte de la descripción
-                    else:
-                        # Si solo tiene el mes en el nombre (sin día), usar el último día del mes del contexto
-                        month_only = re.search(r'(Enero|Febrero|Marzo|Abril|Mayo|Junio|Julio|Agosto|Septiembre|Octubre|Noviembre|Diciembre)', group['name'], re.IGNORECASE)
-                        if month_only and month_year:
-                            # Usar el último día del mes del contexto
-                            meses = {
-                                'enero': ('31', '01'), 'febrero': ('28', '02'), 'marzo': ('31', '03'), 
-                                'abril': ('30', '04'), 'mayo': ('31', '05'), 'junio': ('30', '06'),
-                                'julio': ('31', '07'), 'agosto': ('31', '08'), 'septiembre': ('30', '09'),
-                                'octubre': ('31', '10'), 'noviembre': ('30', '11'), 'diciembre': ('31', '12')
-                            }
-                            mes_name = month_only.group(1).lower()
-                            if mes_name in meses:
-                                ultimo_dia, mes_num = meses[mes_name]
-                                # Extraer año del contexto
-                                year_match = re.search(r'\b(20\d{2})\b', month_year)
-                                year = year_match.group(1) if year_match else datetime.now().strftime('%Y')
-                                date = f"{ultimo_dia}/{mes_num}/{year}"
-                
-                if not date:
-                    # Si no hay fecha explícita, usar mes/año del contexto
-                    date = f"01/{datetime.now().strftime('%m/%Y')}"
-                
-                # Parsear monto y moneda
-                amount, tipo, moneda = self.parse_amount(group['amount_text'])
-                
-                # Si no hay monto en amount_text, intentar extraerlo del nombre
-                if amount == 0 and group['name']:
-                    # Buscar patrones de monto en el nombre (S/ o $)
-                    amount_in_name = re.search(r'([5S$]/?\s*-?\s*\d+[.,]\d+)', group['name'])
-                    if amount_in_name:
-                        amount, tipo, moneda = self.parse_amount(amount_in_name.group(1))
-                        if amount != 0:
-                            # Remover el monto del nombre
-                            group['name'] = re.sub(r'[5S]/?\s*-?\s*\d+[.,]\d+', '', group['name']).strip()
-                
-                # Validar que tengamos datos mínimos
-                if group['name'] and amount != 0:
-                    transactions.append({
-                        'id': str(uuid.uuid4()),
-                        'date': date,
-                        'name': group['name'].strip(),
-                        'amount': amount,
-                        'type': tipo,
-                        'currency': moneda,
-                        'month': month_year
-                    })
-                elif group['name'] and len(group['name']) > 5:  # Incluir transacciones sin monto si el nombre es razonable
-                    if debug:
-                        print(f"  ⚠️  Transacción sin monto detectado: {group['name'][:40]}")
-                    # Agregar con monto 0 para no perderla
-                    transactions.append({
-                        'id': str(uuid.uuid4()),
-                        'date': date if date else "01/01/2026",
-                        'name': group['name'].strip() + " [SIN MONTO DETECTADO]",
-                        'amount': 0.0,
-                        'type': "cargo",
-                        'currency': "S/",
-                        'month': month_year
-                    })
-            
-            print(f"  ✅ Extraídas {len(transactions)} transacciones válidas")
-            
-            if debug:
-                print(f"\n  🐛 DEBUG: Transacciones finales:")
-                for i, t in enumerate(transactions):
-                    print(f"    {i+1}. {t['date']} - {t['name'][:40]} - S/ {t['amount']}")
-            
-            return transactions
+                overlay_bboxes.append((x1, y1, x2, y2))
             
+            red_flags = self.detect_red_overlays(integral, overlay_bboxes)
+        profiler.count('red_overlay_skipped', sum(red_flags), image_name)
+        
+        # Procesar cada transacción
+        with profiler.stage('parse', image_name):
+            transactions = self.build_transactions(transaction_groups, red_flags, month_year, debug)
+        profiler.count('transactions', len(transactions), image_name)
+        
+        print(f"  ✅ Extraídas {len(transactions)} transacciones válidas")
+        
+        if debug:
+            print(f"\n  🐛 DEBUG: Transacciones finales:")
+            for i, t in enumerate(transactions):
+                print(f"    {i+1}. {t.date} - {t.name[:40]} - S/ {t.amount}")
+        
+        return transactions
+        
+    def extract_batch(self, image_paths: List[str], debug: bool = False) -> List[List[Transaction]]:
+        """
+        Extrae transacciones de varias imágenes haciendo el OCR en un solo lote
+        (ver readtext_batch). La preparación y el parseo son los mismos que en
+        extract_transactions.
+        
+        Args:
+            image_paths: Lista de rutas a imágenes existentes
+            debug: Si es True, muestra información detallada de depuración
+        
+        Returns:
+            Lista de transacciones por imagen, en el mismo orden que image_paths
+        """
+        prepared: List[Optional[Dict[str, Any]]] = []
+        for image_path in image_paths:
+            print(f"📸 Preparando imagen: {Path(image_path).name}")
+            try:
+                prepared.append(self.prepare_image(image_path, debug))
+            except Exception as e:
+                print(f"  ❌ Error al preparar imagen: {e}")
+                prepared.append(None)
+        
+        batch = [index for index, item in enumerate(prepared) if item is not None and item['ocr_image'].size]
+        ocr_images = [prepared[index]['ocr_image'] for index in batch]
+        print(f"  🔍 Extrayendo texto con OCR ({len(batch)} imágenes en lote)...")
+        try:
+            with self.profiler.stage('readtext_batch'):
+                # Las capturas largas entran al lote como varias franjas
+                tiles = [self.plan_ocr_tiles(image) for image in ocr_images]
+                strips = [image[tile.top:tile.bottom] for image, image_tiles in zip(ocr_images, tiles)
+                          for tile in image_tiles]
+                strip_results = self.readtext_batch(strips) if strips else []
+                batch_results = []
+                for image_tiles in tiles:
+                    batch_results.append(merge_tile_detections(strip_results[:len(image_tiles)], image_tiles))
+                    strip_results = strip_results[len(image_tiles):]
         except Exception as e:
-            print(f"  ❌ Error al procesar imagen: {e}")
-            import traceback
-            traceback.print_exc()
-            return []
+            print(f"  ⚠️  OCR por lotes falló ({e}), procesando imagen por imagen")
+            batch_results = [self.readtext_tiled(image) for image in ocr_images]
+        ocr_results = dict(zip(batch, batch_results))
+        
+        all_transactions = []
+        for index, item in enumerate(prepared):
+            if item is None:
+                all_transactions.append([])
+                continue
+            print(f"📸 Procesando imagen: {item['image_name']}")
+            try:
+                all_transactions.append(self.finish_extraction(item, ocr_results.get(index, []), debug))
+            except Exception as e:
+                print(f"  ❌ Error al procesar imagen: {e}")
+                import traceback
+                traceback.print_exc()
+                all_transactions.append([])
+        
+        return all_transactions
     
-    def process_multiple_images(self, image_paths: List[str]) -> List[Dict[str, Any]]:
+    def process_multiple_images(self, image_paths: List[str], workers: int = 1) -> List[Transaction]:
         """
         Procesa múltiples imágenes y combina las transacciones.
         
+        main.py usa iter_extract para guardar cada imagen en cuanto termina;
+        este método reúne todo en memoria y queda para scripts y pruebas.
+        
         Args:
             image_paths: Lista de rutas a imágenes
+            workers: Número de procesos para OCR en paralelo (1 = secuencial)
             
         Returns:
-            Lista combinada de todas las transacciones
+            Lista combinada de todas las transacciones, en el orden de las imágenes
         """
-        all_transactions = []
-        
+        valid_paths = []
         for image_path in image_paths:
             if not Path(image_path).exists():
                 print(f"⚠️  Imagen no encontrada: {image_path}")
                 continue
-            
-            transactions = self.extract_transactions(image_path)
-            all_transactions.extend(transactions)
+            valid_paths.append(image_path)
+        
+        results = self.extract_per_image(valid_paths, workers)
+        all_transactions = [t for transactions in results for t in transactions]
         
         print(f"\n📊 Total de transacciones extraídas: {len(all_transactions)}")
         return all_transactions
+    
+    def extract_per_image(self, image_paths: List[str], workers: int = 1) -> List[List[Transaction]]:
+        """
+        Extrae las transacciones de cada imagen por separado.
+        
+        Args:
+            image_paths: Lista de rutas a imágenes existentes
+            workers: Número de procesos para OCR en paralelo (1 = secuencial)
+            
+        Returns:
+            Lista de transacciones por imagen, en el mismo orden que image_paths
+        """
+        results: List[List[Transaction]] = [[] for _ in image_paths]
+        for result in self.iter_extract(image_paths, workers):
+            results[result.index] = result.transactions
+        return results
+    
+    def iter_extract(self, image_paths: List[str], workers: int = 1) -> Iterator[ImageResult]:
+        """
+        Extrae las transacciones imagen por imagen y las devuelve en cuanto
+        termina cada una (en paralelo, en orden de finalización).
+        
+        Args:
+            image_paths: Lista de rutas a imágenes existentes
+            workers: Número de procesos para OCR en paralelo (1 = secuencial)
+            
+        Yields:
+            ImageResult con el índice de la imagen en image_paths
+        """
+        if workers > 1 and len(image_paths) > 1:
+            yield from self._iter_parallel(image_paths, workers)
+        elif self.ocr_batch_images > 1 and len(image_paths) > 1:
+            for start in range(0, len(image_paths), self.ocr_batch_images):
+                chunk = image_paths[start:start + self.ocr_batch_images]
+                for offset, transactions in enumerate(self.extract_batch(chunk)):
+                    yield ImageResult(start + offset, chunk[offset], transactions)
+        else:
+            for index, image_path in enumerate(image_paths):
+                yield ImageResult(index, image_path, self.extract_transactions(image_path))
+    
+    def _iter_parallel(self, image_paths: List[str], workers: int) -> Iterator[ImageResult]:
+        """
+        Extrae transacciones repartiendo las imágenes en un pool de procesos.
+        
+        Si un worker muere (p. ej. por falta de memoria), las imágenes afectadas
+        se reintentan una vez en un pool nuevo; el resto del lote se conserva.
+        Si se deja de consumir el generador, se cancelan las imágenes pendientes.
+        
+        Args:
+            image_paths: Lista de rutas a imágenes existentes
+            workers: Número máximo de procesos
+            
+        Yields:
+            ImageResult de cada imagen, en orden de finalización
+        """
+        pending = list(range(len(image_paths)))
+        
+        print(f"⚡ Procesando en paralelo con {min(workers, len(image_paths))} procesos\n")
+        
+        for attempt in range(2):
+            if not pending:
+                break
+            
+            broken = []
+            # 'spawn' evita heredar el estado de torch del proceso principal
+            context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=min(workers, len(pending)),
+                                     mp_context=context,
+                                     initializer=_init_worker,
+                                     initargs=(self.options, self.profiler.worker_config())) as executor:
+                futures = {executor.submit(_extract_in_worker, image_paths[index]): index for index in pending}
+                
+                try:
+                    for future in as_completed(futures):
+                        index = futures[future]
+                        try:
+                            transactions, records = future.result()
+                            self.profiler.merge(records)
+                        except BrokenProcessPool:
+                            broken.append(index)
+                            continue
+                        except Exception as e:
+                            print(f"  ❌ Error al procesar {Path(image_paths[index]).name}: {e}")
+                            transactions = []
+                        yield ImageResult(index, image_paths[index], transactions)
+                finally:
+                    for future in futures:
+                        future.cancel()
+            
+            pending = sorted(broken)
+            if pending and attempt == 0:
+                print(f"  🔄 Reintentando {len(pending)} imágenes tras la caída de un worker...")
+        
+        for index in pending:
+            print(f"  ❌ No se pudo procesar {Path(image_paths[index]).name}: el worker terminó inesperadamente")
+            yield ImageResult(index, image_paths[index], [])
+
+
+# Procesador propio de cada worker del pool (un Reader por proceso, reutilizado)
+_worker_processor = None
+
+
+def _init_worker(options: Dict[str, Any], profiler_config: Optional[Dict[str, Any]] = None):
+    """
+    Inicializa un worker del pool cargando su propio Reader de EasyOCR.
+    
+    Args:
+        options: Opciones del procesador principal (LocalImageProcessor.options)
+        profiler_config: Configuración del Profiler del proceso principal
+            (None si la instrumentación está desactivada)
+    """
+    global _worker_processor
+    
+    # Un hilo por proceso: el paralelismo lo dan los procesos, no torch/OpenCV
+    cv2.setNumThreads(1)
+    try:
+        import torch
+        torch.set_num_threads(1)
+    except ImportError:
+        pass
+    
+    # Los workers hacen su propio OCR: el servidor residente atendería una imagen a la vez
+    _worker_processor = LocalImageProcessor(ocr_server_url="", **options)
+    if profiler_config is not None:
+        _worker_processor.profiler = Profiler(**profiler_config)
+    _worker_processor.reader  # Cargar el modelo una sola vez al arrancar el worker
+
+
+def _extract_in_worker(image_path: str) -> Tuple[List[Transaction], Dict[str, Any]]:
+    """
+    Extrae las transacciones de una imagen dentro de un worker del pool.
+    
+    Returns:
+        Tupla (transacciones, registros de instrumentación del worker)
+    """
+    transactions = _worker_processor.extract_transactions(image_path)
+    return transactions, _worker_processor.profiler.drain()
@@ -0,0 +1,238 @@
+"""
+Instrumentación del pipeline: tiempos por etapa, contadores y cProfile.
+Los procesadores y main.py registran cada etapa (carga de imagen, OCR,
+agrupación, deduplicación, Excel...) en un Profiler. Por defecto se usa
+NULL_PROFILER, que no registra nada; con `main.py --profile DIR` se escribe
+una traza JSON en formato Chrome Trace (se abre en chrome://tracing o
+https://ui.perfetto.dev) con un resumen por etapa y los contadores por imagen.
+"""
+
+import cProfile
+import json
+import os
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+
+
+class NullProfiler:
+    """Profiler desactivado: todas las operaciones son no-ops."""
+    
+    enabled = False
+    
+    @contextmanager
+    def stage(self, name: str, image: Optional[str] = None):
+        yield
+    
+    @contextmanager
+    def profile_image(self, image_path: str):
+        yield
+    
+    def count(self, name: str, value: int = 1, image: Optional[str] = None):
+        pass
+    
+    def worker_config(self) -> Optional[Dict[str, Any]]:
+        return None
+    
+    def drain(self) -> Dict[str, Any]:
+        return {'events': [], 'counters': {}}
+    
+    def merge(self, records: Dict[str, Any]):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
+
+
+class Profiler(NullProfiler):
+    """Registra la duración de cada etapa y contadores por imagen."""
+    
+    enabled = True
+    
+    def __init__(self, cprofile_dir: Optional[str] = None):
+        """
+        Inicializa el profiler.
+        
+        Args:
+            cprofile_dir: Directorio para un volcado de cProfile por imagen
+                (None para no usar cProfile)
+        """
+        self.cprofile_dir = cprofile_dir
+        self.events: List[Dict[str, Any]] = []
+        self.counters: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.created = time.time()
+    
+    @contextmanager
+    def stage(self, name: str, image: Optional[str] = None):
+        """
+        Mide la duración de una etapa.
+        
+        Args:
+            name: Nombre de la etapa (ej: "readtext", "excel")
+            image: Nombre de la imagen procesada (None para etapas globales)
+        """
+        timestamp = time.time()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.events.append({
+                'name': name,
+                'image': image,
+                'pid': os.getpid(),
+                'ts': timestamp,
+                'seconds': time.perf_counter() - start
+            })
+    
+    @contextmanager
+    def profile_image(self, image_path: str):
+        """
+        Ejecuta el bloque bajo cProfile y guarda el volcado de la imagen en
+        cprofile_dir/<imagen>.prof (se analiza con `python -m pstats`).
+        
+        No debe anidarse ni usarse desde corrutinas concurrentes: cProfile
+        solo admite un perfil activo por hilo.
+        
+        Args:
+            image_path: Ruta de la imagen procesada
+        """
+        if not self.cprofile_dir:
+            yield
+            return
+        
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            os.makedirs(self.cprofile_dir, exist_ok=True)
+            profile.dump_stats(os.path.join(self.cprofile_dir, f"{Path(image_path).stem}.prof"))
+    
+    def count(self, name: str, value: int = 1, image: Optional[str] = None):
+        """
+        Suma un valor a un contador (ej: detecciones, grupos, omitidas por overlay rojo).
+        
+        Args:
+            name: Nombre del contador
+            value: Cantidad a sumar
+            image: Nombre de la imagen (None para contadores globales)
+        """
+        self.counters[image or ''][name] += value
+    
+    def worker_config(self) -> Optional[Dict[str, Any]]:
+        """Argumentos para crear un Profiler equivalente en un worker del pool."""
+        return {'cprofile_dir': self.cprofile_dir}
+    
+    def drain(self) -> Dict[str, Any]:
+        """
+        Devuelve y vacía los registros acumulados (los workers los envían al
+        proceso principal junto con cada resultado).
+        
+        Returns:
+            Diccionario serializable con events y counters
+        """
+        records = {
+            'events': self.events,
+            'counters': {image: dict(values) for image, values in self.counters.items()}
+        }
+        self.events = []
+        self.counters = defaultdict(lambda: defaultdict(int))
+        return records
+    
+    def merge(self, records: Dict[str, Any]):
+        """
+        Incorpora los registros de otro Profiler (ver drain).
+        
+        Args:
+            records: Registros devueltos por drain
+        """
+        self.events.extend(records['events'])
+        for image, values in records['counters'].items():
+            for name, value in values.items():
+                self.counters[image][name] += value
+    
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        Resume las etapas registradas.
+        
+        Returns:
+            Diccionario etapa -> {calls, total, max} en segundos, en orden de aparición
+        """
+        summary: Dict[str, Dict[str, float]] = {}
+        for event in self.events:
+            entry = summary.setdefault(event['name'], {'calls': 0, 'total': 0.0, 'max': 0.0})
+            entry['calls'] += 1
+            entry['total'] += event['seconds']
+            entry['max'] = max(entry['max'], event['seconds'])
+        return summary
+    
+    def totals(self) -> Dict[str, int]:
+        """Suma de cada contador sobre todas las imágenes."""
+        totals: Dict[str, int] = defaultdict(int)
+        for values in self.counters.values():
+            for name, value in values.items():
+                totals[name] += value
+        return dict(totals)
+    
+    def write_trace(self, path: str):
+        """
+        Escribe la traza en formato Chrome Trace (JSON).
+        
+        Cada imagen ocupa su propia fila (tid) dentro del proceso que la
+        procesó; las etapas globales van en la fila "pipeline".
+        
+        Args:
+            path: Ruta del archivo de salida
+        """
+        lanes: Dict[tuple, int] = {}
+        trace_events = []
+        
+        for event in sorted(self.events, key=lambda e: e['ts']):
+            lane_key = (event['pid'], event['image'] or '')
+            if lane_key not in lanes:
+                lanes[lane_key] = len(lanes)
+                trace_events.append({
+                    'name': 'thread_name', 'ph': 'M', 'pid': event['pid'], 'tid': lanes[lane_key],
+                    'args': {'name': event['image'] or 'pipeline'}
+                })
+            trace_events.append({
+                'name': event['name'],
+                'cat': 'image' if event['image'] else 'pipeline',
+                'ph': 'X',
+                'pid': event['pid'],
+                'tid': lanes[lane_key],
+                'ts': round((event['ts'] - self.created) * 1e6),
+                'dur': round(event['seconds'] * 1e6),
+                'args': {'image': event['image']} if event['image'] else {}
+            })
+        
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'traceEvents': trace_events,
+                'displayTimeUnit': 'ms',
+                'summary': self.summary(),
+                'counters': {image or 'pipeline': dict(values) for image, values in self.counters.items()},
+                'totals': self.totals()
+            }, f, ensure_ascii=False, indent=1)
+    
+    def print_summary(self):
+        """Muestra el tiempo total por etapa y los contadores."""
+        summary = self.summary()
+        if not summary:
+            return
+        
+        print(f"\n{'='*58}")
+        print(f"{'Etapa':<24} {'Llamadas':>9} {'Total':>11} {'Máximo':>11}")
+        print(f"{'='*58}")
+        for name, entry in summary.items():
+            print(f"{name:<24} {entry['calls']:>9} {entry['total']:>10.3f}s {entry['max']:>10.3f}s")
+        
+        totals = self.totals()
+        if totals:
+            print(f"{'-'*58}")
+            for name, value in totals.items():
+                print(f"{name:<24} {value:>9}")
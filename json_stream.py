@@ -0,0 +1,118 @@
+"""
+Parser incremental de las respuestas JSON de la API en streaming.
+Recorre el texto a medida que llega y entrega cada objeto de una lista
+"transactions" en cuanto se cierra, sin esperar al final de la respuesta: si
+la respuesta se corta (max_tokens, error de red), las transacciones ya
+completas se conservan.
+El texto fuera del objeto raíz (p. ej. un bloque ```json) se ignora.
+"""
+
+import json
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+
+# Nombre de las listas cuyos elementos se entregan
+ITEMS_KEY = "transactions"
+
+
+class StreamEvent(NamedTuple):
+    """Transacción completa, o cierre de una lista de transacciones."""
+    path: Tuple[str, ...]               # Claves de los objetos que contienen la lista (() si es la raíz)
+    transaction: Optional[Dict[str, Any]]   # None cuando se cierra la lista
+
+
+class TransactionStream:
+    """
+    Parser incremental de una respuesta JSON con listas "transactions".
+    
+    Solo sigue la estructura (anidamiento, cadenas y claves); cada elemento
+    completo se decodifica con json.loads. Los elementos mal formados se
+    descartan y se cuentan en `invalid`.
+    """
+    
+    def __init__(self):
+        """Inicializa el parser vacío."""
+        self.buffer = ""
+        self.position = 0
+        # Contenedores abiertos: (tipo '{' o '[', clave bajo la que está, inicio)
+        self.stack: List[Tuple[str, Optional[str], int]] = []
+        self.in_string = False
+        self.escaped = False
+        self.string_start = 0
+        self.expect_key = False
+        self.key: Optional[str] = None
+        self.done = False
+        self.invalid = 0
+    
+    @property
+    def text(self) -> str:
+        """Texto recibido hasta ahora."""
+        return self.buffer
+    
+    def _path(self, containers: List[Tuple[str, Optional[str], int]]) -> Tuple[str, ...]:
+        # Claves de los objetos que contienen una lista de transacciones
+        return tuple(key for _, key, _ in containers if key is not None)
+    
+    def feed(self, text: str) -> List[StreamEvent]:
+        """
+        Procesa un fragmento de la respuesta.
+        
+        Args:
+            text: Fragmento recibido
+        
+        Returns:
+            Eventos completados con este fragmento, en orden
+        """
+        self.buffer += text
+        events = []
+        buffer = self.buffer
+        
+        for position in range(self.position, len(buffer)):
+            char = buffer[position]
+            
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == '\\':
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+                    if self.expect_key:
+                        self.key = json.loads(buffer[self.string_start:position + 1])
+                continue
+            
+            if self.done or (not self.stack and char not in '{['):
+                continue
+            
+            if char == '"':
+                self.in_string = True
+                self.string_start = position
+            elif char in '{[':
+                key = self.key if self.stack and self.stack[-1][0] == '{' else None
+                self.stack.append((char, key, position))
+                self.expect_key = char == '{'
+                self.key = None
+            elif char in '}]':
+                if not self.stack:
+                    continue
+                _, key, start = self.stack.pop()
+                parent = self.stack[-1] if self.stack else None
+                if char == '}' and parent and parent[0] == '[' and parent[1] == ITEMS_KEY:
+                    try:
+                        transaction = json.loads(buffer[start:position + 1])
+                    except json.JSONDecodeError:
+                        # Objeto mal formado: se descarta solo esta transacción
+                        self.invalid += 1
+                    else:
+                        events.append(StreamEvent(self._path(self.stack[:-1]), transaction))
+                elif char == ']' and key == ITEMS_KEY:
+                    events.append(StreamEvent(self._path(self.stack), None))
+                self.expect_key = False
+                self.done = not self.stack
+            elif char == ',':
+                self.expect_key = self.stack[-1][0] == '{'
+            elif char == ':':
+                self.expect_key = False
+        
+        self.position = len(buffer)
+        return events
@@ -0,0 +1,143 @@
+"""
+Agrupación de las detecciones de OCR en líneas y bloques de transacción.
+Las detecciones se ordenan una sola vez por la coordenada Y de su centro y se
+cortan en líneas donde el salto entre centros consecutivos supera la
+tolerancia; las líneas se agrupan después en bloques de transacción. Las
+tolerancias se escalan con la altura mediana del texto, así que funcionan
+igual en capturas pequeñas, ampliadas o en capturas largas unidas.
+"""
+
+from operator import attrgetter
+from statistics import median
+from typing import List, Callable, NamedTuple
+
+from records import Detection
+
+
+# Altura de texto de referencia y tolerancias, que se escalan proporcionalmente
+# con la altura mediana de cada imagen. Las tolerancias son las fijas que se
+# usaban antes para las capturas de 1080 px de ancho (no se calibraron de nuevo);
+# 30 px es el orden de la altura del texto en esas capturas: las bandas de
+# texto de images/ miden entre 28 y 39 px (mediana 33) sin contar el margen
+# que EasyOCR añade a cada caja
+REFERENCE_TEXT_HEIGHT = 30
+REFERENCE_LINE_TOLERANCE = 18   # Salto máximo entre centros dentro de una línea
+REFERENCE_GROUP_GAP = 80        # Distancia máxima entre líneas de una transacción
+
+# Máximo de líneas por transacción
+MAX_GROUP_LINES = 5
+
+
+class Line(NamedTuple):
+    """Línea horizontal de texto: elementos ordenados de izquierda a derecha."""
+    items: List[Detection]
+    y_center: float
+    
+    @property
+    def text(self) -> str:
+        return ' | '.join(item.text for item in self.items)
+
+
+class LineLayout(NamedTuple):
+    """Líneas de una imagen y las tolerancias con las que se calcularon."""
+    lines: List[Line]
+    text_height: float
+    line_tolerance: float
+    group_gap: float
+
+
+def estimate_text_height(items: List[Detection]) -> float:
+    """
+    Estima la altura del texto como la mediana de las alturas de los elementos.
+    
+    Args:
+        items: Detecciones de OCR
+    
+    Returns:
+        Altura mediana en píxeles (la de referencia si no hay alturas válidas)
+    """
+    heights = [item.height for item in items if item.height > 0]
+    return median(heights) if heights else REFERENCE_TEXT_HEIGHT
+
+
+def build_layout(items: List[Detection]) -> LineLayout:
+    """
+    Agrupa los elementos en líneas horizontales en O(n log n).
+    
+    Los centros Y se ordenan una vez y se abre una línea nueva cada vez que el
+    salto entre dos centros consecutivos supera la tolerancia.
+    
+    Args:
+        items: Detecciones de OCR
+    
+    Returns:
+        LineLayout con las líneas de arriba a abajo
+    """
+    text_height = estimate_text_height(items)
+    scale = text_height / REFERENCE_TEXT_HEIGHT
+    tolerance = REFERENCE_LINE_TOLERANCE * scale
+    
+    lines = []
+    current = []
+    y_sum = 0.0
+    last_y = None
+    
+    for item in sorted(items, key=attrgetter('y_center')):
+        y = item.y_center
+        if last_y is not None and y - last_y > tolerance:
+            lines.append(_make_line(current, y_sum))
+            current = []
+            y_sum = 0.0
+        current.append(item)
+        y_sum += y
+        last_y = y
+    
+    if current:
+        lines.append(_make_line(current, y_sum))
+    
+    return LineLayout(lines, text_height, tolerance, REFERENCE_GROUP_GAP * scale)
+
+
+def _make_line(items: List[Detection], y_sum: float) -> Line:
+    if len(items) > 1:
+        items.sort(key=attrgetter('x_left'))
+    return Line(items, y_sum / len(items))
+
+
+def group_lines(layout: LineLayout, starts_group: Callable[[Line], bool],
+                max_lines: int = MAX_GROUP_LINES) -> List[List[Line]]:
+    """
+    Agrupa líneas consecutivas en bloques de transacción.
+    
+    Un bloque empieza en una línea que cumple starts_group y suma las líneas
+    siguientes mientras estén a menos de group_gap de la anterior.
+    
+    Args:
+        layout: Resultado de build_layout
+        starts_group: Indica si una línea puede abrir una transacción
+        max_lines: Máximo de líneas por bloque
+    
+    Returns:
+        Lista de bloques, cada uno una lista de líneas
+    """
+    lines = layout.lines
+    groups = []
+    i = 0
+    
+    while i < len(lines):
+        if not starts_group(lines[i]):
+            i += 1
+            continue
+        
+        group = [lines[i]]
+        j = i + 1
+        while j < len(lines) and j < i + max_lines:
+            if lines[j].y_center - group[-1].y_center > layout.group_gap:
+                break
+            group.append(lines[j])
+            j += 1
+        
+        groups.append(group)
+        i = j
+    
+    return groups
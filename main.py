@@ -4,91 +4,213 @@ Aplicación principal para extraer movimientos bancarios de imágenes y exportar
 
 import sys
 import os
+import argparse
 import json
+from importlib.util import find_spec
+from itertools import chain
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import Iterator, List, Optional, Set
+from datetime import datetime
 from dotenv import load_dotenv
 
-try:
-    from image_processor_local import LocalImageProcessor as ImageProcessor
-    USE_LOCAL = True
-except ImportError:
-    from image_processor import ImageProcessor
-    USE_LOCAL = False
+from batch_journal import BatchJournal, JOURNAL_FILE
+from extraction_cache import ExtractionCache
+from fuzzy_dedup import FuzzyDeduplicator, DEFAULT_THRESHOLD
+from transaction_store import TransactionStore, DB_FILE
+from instrumentation import Profiler, NULL_PROFILER
+from records import ImageResult, Transaction
 
-from excel_exporter import ExcelExporter
 
-
-# Ruta del archivo de datos persistentes
+# Histórico heredado en JSON (se importa una sola vez a la base SQLite)
 DATA_FILE = "transactions_data.json"
 
+# Mensaje al interrumpirse un lote
+RESUME_HINT = ("💡 Las imágenes terminadas ya están guardadas. Para continuar sin repetirlas,\n"
+               "   ejecuta el mismo comando con --resume")
 
-def load_existing_data() -> List[Dict[str, Any]]:
-    """
-    Carga transacciones existentes del archivo JSON.
-    
-    Returns:
-        Lista de transacciones previamente guardadas
-    """
-    if os.path.exists(DATA_FILE):
-        try:
-            with open(DATA_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except Exception as e:
-            print(f"⚠️  Error al cargar datos existentes: {e}")
-            return []
-    return []
+# Backends de extracción; 'auto' usa el OCR local si sus dependencias están instaladas
+BACKEND_LOCAL = 'local'
+BACKEND_API = 'api'
+BACKEND_AUTO = 'auto'
+LOCAL_BACKEND_MODULES = ('easyocr', 'cv2')
 
+# Extensiones que se toman al pasar una carpeta como argumento
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.bmp'}
 
-def save_data(transactions: List[Dict[str, Any]]):
-    """
-    Guarda transacciones en archivo JSON.
-    
-    Args:
-        transactions: Lista de transacciones a guardar
-    """
-    try:
-        with open(DATA_FILE, 'w', encoding='utf-8') as f:
-            json.dump(transactions, f, ensure_ascii=False, indent=2)
-        print(f"💾 Datos guardados en {DATA_FILE}")
-    except Exception as e:
-        print(f"❌ Error al guardar datos: {e}")
+# Clave de la tabla meta con los meses guardados que aún no se exportaron a Excel
+# (p. ej. si una ejecución se interrumpió antes de llegar a la exportación)
+PENDING_MONTHS_KEY = "excel_pending_months"
 
 
-def deduplicate_transactions(transactions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+def deduplicate_transactions(transactions: List[Transaction], seen: Optional[Set[str]] = None) -> List[Transaction]:
     """
-    Elimina transacciones duplicadas basándose en (fecha, nombre, monto, moneda).
+    Elimina transacciones duplicadas basándose en (fecha, nombre, monto, moneda),
+    con la misma clave normalizada que usa el índice de TransactionStore.
     Cada transacción mantiene su ID único, pero no se permiten duplicados de datos.
     
     Args:
         transactions: Lista de transacciones
+        seen: Claves ya vistas en lotes anteriores (se actualiza); permite
+            deduplicar imagen por imagen a medida que llegan los resultados
         
     Returns:
         Lista de transacciones sin duplicados
     """
-    seen = set()
+    seen = set() if seen is None else seen
     unique = []
     
     for transaction in transactions:
-        # Crear clave única basada en los datos de la transacción (no el ID)
-        key = (
-            transaction.get('date', ''),
-            transaction.get('name', ''),
-            transaction.get('amount', 0),
-            transaction.get('currency', 'S/')
-        )
+        # Clave normalizada basada en los datos de la transacción (no el ID)
+        key = transaction.dedup_key
         
         if key not in seen:
             seen.add(key)
             unique.append(transaction)
     
-    duplicates_removed = len(transactions) - len(unique)
-    if duplicates_removed > 0:
-        print(f"🔄 Duplicados eliminados: {duplicates_removed}")
-    
     return unique
 
 
+def expand_image_paths(paths: List[str]) -> List[str]:
+    """
+    Expande las carpetas de la lista a las imágenes que contienen.
+    
+    Args:
+        paths: Rutas de imágenes o carpetas, tal como llegan por línea de comandos
+        
+    Returns:
+        Rutas de imágenes (las de cada carpeta, ordenadas por nombre)
+    """
+    expanded = []
+    for path in paths:
+        if os.path.isdir(path):
+            expanded.extend(
+                str(child) for child in sorted(Path(path).iterdir())
+                if child.is_file() and child.suffix.lower() in IMAGE_EXTENSIONS
+            )
+        else:
+            expanded.append(path)
+    return expanded
+
+
+def local_backend_installed() -> bool:
+    """Indica si las dependencias del OCR local están instaladas (sin importarlas)."""
+    return all(find_spec(module) is not None for module in LOCAL_BACKEND_MODULES)
+
+
+def resolve_backend(backend: str) -> str:
+    """
+    Resuelve el backend 'auto' a 'local' o 'api'.
+    
+    Args:
+        backend: Valor de --backend
+    
+    Returns:
+        BACKEND_LOCAL o BACKEND_API
+    """
+    if backend != BACKEND_AUTO:
+        return backend
+    return BACKEND_LOCAL if local_backend_installed() else BACKEND_API
+
+
+def create_processor(args: argparse.Namespace, backend: str):
+    """
+    Crea el procesador del backend elegido, importando solo sus dependencias.
+    
+    Args:
+        args: Opciones de línea de comandos
+        backend: BACKEND_LOCAL o BACKEND_API
+    
+    Returns:
+        Procesador de imágenes, o None si falta configuración o dependencias
+    """
+    if backend == BACKEND_LOCAL:
+        if not local_backend_installed():
+            print("❌ Error: el OCR local requiere easyocr y opencv-python")
+            print("\n💡 Instálalos con:")
+            print("    pip install easyocr opencv-python")
+            print("   o usa la API con --backend api")
+            return None
+    
+        from image_processor_local import LocalImageProcessor
+        print("🆓 Usando OCR Local (EasyOCR) - Sin costos de API\n")
+        return LocalImageProcessor(preprocess=args.preprocess, gpu=args.gpu,
+                                   ocr_batch_images=args.ocr_batch)
+    
+    # Verificar API key para procesador con API
+    api_key = os.getenv('OPENAI_API_KEY')
+    if not api_key or api_key == 'your-api-key-here':
+        print("❌ Error: OPENAI_API_KEY no configurado")
+        print("\nPasos para configurar:")
+        print("1. Copia .env.example a .env")
+        print("2. Edita .env y agrega tu OpenAI API key")
+        print("3. Ejecuta nuevamente el programa")
+        print("\n💡 Tip: Para usar OCR local sin API, instala:")
+        print("    pip install easyocr opencv-python")
+        return None
+    
+    from image_processor import ImageProcessor, PACK_TOKEN_BUDGET
+    print("☁️  Usando GPT-4o Vision API\n")
+    processor = ImageProcessor(
+        api_key,
+        requests_per_minute=int(os.getenv('OPENAI_MAX_RPM', '0')) or None,
+        tokens_per_minute=int(os.getenv('OPENAI_MAX_TPM', '0')) or None,
+        pack_images=args.api_pack,
+        pack_tokens=args.api_pack_tokens or PACK_TOKEN_BUDGET
+    )
+    if args.api_pack > 1:
+        print(f"📦 Hasta {processor.pack_limit()} imágenes por solicitud\n")
+    return processor
+
+
+def iter_extract_with_cache(processor, image_paths: List[str], workers: int,
+                            cache: ExtractionCache = None) -> Iterator[ImageResult]:
+    """
+    Extrae transacciones de las imágenes, reutilizando resultados en caché.
+    
+    Las imágenes en caché se devuelven primero; el resto se devuelve en
+    cuanto el procesador termina cada una. Los resultados incompletos
+    (respuesta cortada o error) no se guardan en la caché.
+    
+    Args:
+        processor: Procesador de imágenes (local o API)
+        image_paths: Rutas de imágenes existentes
+        workers: Imágenes a procesar en paralelo
+        cache: Caché de extracciones (None para desactivarla)
+        
+    Yields:
+        ImageResult de cada imagen, con su índice en image_paths
+    """
+    if cache is None:
+        yield from processor.iter_extract(image_paths, workers)
+        return
+    
+    keys = []
+    pending = []
+    
+    for index, path in enumerate(image_paths):
+        with processor.profiler.stage('cache_lookup', Path(path).name):
+            key = cache.make_key(path, processor.kind, processor.version)
+            keys.append(key)
+            cached = cache.get(key)
+        if cached is not None:
+            print(f"♻️  En caché: {Path(path).name} ({len(cached)} transacciones)")
+            yield ImageResult(index, path, cached)
+        else:
+            pending.append(index)
+    
+    if pending:
+        for result in processor.iter_extract([image_paths[i] for i in pending], workers):
+            index = pending[result.index]
+            if result.complete:
+                cache.put(keys[index], result.transactions, image_paths[index])
+            yield result._replace(index=index, path=image_paths[index])
+    
+    processor.profiler.count('cache_hits', cache.hits)
+    removed = cache.evict()
+    if removed:
+        print(f"🧹 Entradas de caché eliminadas: {removed}")
+
+
 def print_banner():
     """Imprime banner de la aplicación."""
     print("\n" + "="*70)
@@ -99,49 +221,145 @@ def print_banner():
 def print_usage():
     """Imprime instrucciones de uso."""
     print("Uso:")
-    print("  python main.py <imagen1> [imagen2] [imagen3] ...")
+    print("  python main.py [opciones] <imagen1|carpeta> [imagen2] [imagen3] ...")
+    print("\nOpciones:")
+    print("  --backend local|api  OCR local (EasyOCR) o API de OpenAI (por defecto: local si está instalado)")
+    print("  --workers N    Procesa N imágenes en paralelo (procesos OCR o solicitudes API)")
+    print("  --no-cache     Vuelve a procesar imágenes ya extraídas en ejecuciones anteriores")
+    print("  --resume       Continúa un lote interrumpido sin repetir las imágenes ya terminadas")
+    print(f"  --fuzzy-threshold X  Descarta variantes de OCR de un mismo movimiento con similitud >= X (p. ej. {DEFAULT_THRESHOLD}; desactivado por defecto)")
+    print("  --full-export  Regenera todas las hojas del Excel (no solo los meses modificados)")
+    print("  --excel-engine streaming  Escribe el Excel completo en streaming (historiales grandes)")
+    print("  --preprocess   Reduce las imágenes antes del OCR local (más rápido)")
+    print("  --gpu --ocr-batch N  OCR local en GPU reconociendo N imágenes por lote")
+    print("  --api-pack N   API: envía hasta N imágenes por solicitud (--api-pack-tokens T: presupuesto de tokens)")
+    print("  --profile DIR  Guarda una traza JSON con el tiempo de cada etapa (--cprofile: cProfile por imagen)")
     print("\nEjemplos:")
     print("  python main.py screenshot.jpg")
     print("  python main.py img1.jpg img2.jpg img3.jpg")
     print("  python main.py input_images/*.jpg")
+    print("  python main.py --workers 8 input_images/*.jpg")
+    print("  python main.py --resume input_images/")
+    print("  python main.py --backend api input_images/")
     print("\nNota: Asegúrate de configurar OPENAI_API_KEY en el archivo .env")
 
 
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    """
+    Parsea los argumentos de línea de comandos.
+    
+    Args:
+        argv: Argumentos sin el nombre del programa
+        
+    Returns:
+        Namespace con las opciones parseadas
+    """
+    parser = argparse.ArgumentParser(
+        description="Extrae movimientos bancarios de imágenes y los exporta a Excel."
+    )
+    parser.add_argument('images', nargs='*', help="Rutas de las imágenes (o carpetas con imágenes) a procesar")
+    parser.add_argument('--backend', choices=[BACKEND_AUTO, BACKEND_LOCAL, BACKEND_API], default=BACKEND_AUTO,
+                        help="Extracción con OCR local (EasyOCR) o con la API de OpenAI; 'auto' usa el "
+                             "OCR local si está instalado (por defecto: auto)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Imágenes en paralelo: procesos de OCR local o solicitudes "
+                             "simultáneas a la API (por defecto: 1)")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="No reutilizar resultados de imágenes ya procesadas")
+    parser.add_argument('--resume', action='store_true',
+                        help="Continuar el último lote: las imágenes ya registradas en el diario "
+                             f"({JOURNAL_FILE}) no se vuelven a procesar")
+    parser.add_argument('--fuzzy-threshold', type=float, default=1.0, metavar='X',
+                        help="Similitud mínima (0-1) entre descripciones para tratar como duplicados "
+                             "dos movimientos con la misma fecha, monto y moneda (p. ej. "
+                             f"{DEFAULT_THRESHOLD}); por defecto 1, solo duplicados exactos. Puede "
+                             "descartar pagos reales a beneficiarios de nombre parecido")
+    parser.add_argument('--full-export', action='store_true',
+                        help="Regenerar todas las hojas del Excel en lugar de solo los meses modificados")
+    parser.add_argument('--excel-engine', choices=['standard', 'streaming'], default='standard',
+                        help="Motor para generar el Excel completo: 'streaming' mantiene la memoria "
+                             "constante con historiales grandes (por defecto: standard)")
+    parser.add_argument('--preprocess', action='store_true',
+                        help="OCR local: reducir la imagen a una altura de texto objetivo y pasarla "
+                             "a escala de grises antes del OCR (compara con debug_preprocess.py)")
+    parser.add_argument('--ocr-batch', type=int, default=1, metavar='N',
+                        help="OCR local: detectar y reconocer N imágenes por lote (útil con --gpu; "
+                             "en CPU conviene --workers)")
+    parser.add_argument('--gpu', action='store_true',
+                        help="OCR local: usar la GPU (requiere torch con CUDA)")
+    parser.add_argument('--api-pack', type=int, default=1, metavar='N',
+                        help="API: enviar hasta N imágenes en cada solicitud; el prompt se envía una "
+                             "vez por solicitud (por defecto: 1, una imagen por solicitud)")
+    parser.add_argument('--api-pack-tokens', type=int, metavar='T',
+                        help="API con --api-pack: tokens estimados (entrada y respuesta máxima) por "
+                             "solicitud; limita cuántas imágenes caben en cada una (por defecto: 32000)")
+    parser.add_argument('--profile', metavar='DIR',
+                        help="Guardar en DIR una traza JSON con el tiempo de cada etapa y contadores "
+                             "por imagen (se abre en chrome://tracing o ui.perfetto.dev)")
+    parser.add_argument('--cprofile', action='store_true',
+                        help="Con --profile: guardar además un volcado de cProfile por imagen")
+    
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers debe ser mayor o igual a 1")
+    if args.ocr_batch < 1:
+        parser.error("--ocr-batch debe ser mayor o igual a 1")
+    if args.api_pack < 1:
+        parser.error("--api-pack debe ser mayor o igual a 1")
+    if args.api_pack_tokens is not None and args.api_pack_tokens < 1:
+        parser.error("--api-pack-tokens debe ser mayor o igual a 1")
+    if not 0 < args.fuzzy_threshold <= 1:
+        parser.error("--fuzzy-threshold debe estar entre 0 (excluido) y 1")
+    if args.cprofile and not args.profile:
+        parser.error("--cprofile requiere --profile DIR")
+    return args
+
+
 def main():
     """Función principal de la aplicación."""
+    args = parse_args(sys.argv[1:])
+    
+    if not args.profile:
+        return run(args, NULL_PROFILER)
+    
+    run_id = datetime.now().strftime('%Y%m%d-%H%M%S')
+    cprofile_dir = os.path.join(args.profile, f"cprofile-{run_id}") if args.cprofile else None
+    profiler = Profiler(cprofile_dir=cprofile_dir)
+    try:
+        return run(args, profiler)
+    finally:
+        trace_path = os.path.join(args.profile, f"trace-{run_id}.json")
+        profiler.write_trace(trace_path)
+        profiler.print_summary()
+        print(f"\n🧭 Traza de tiempos guardada en {trace_path}")
+        if cprofile_dir:
+            print(f"🧭 Perfiles cProfile por imagen en {cprofile_dir}/")
+
+
+def run(args: argparse.Namespace, profiler) -> int:
+    """
+    Ejecuta el pipeline completo: extracción, almacén y exportación a Excel.
+    
+    Args:
+        args: Opciones de línea de comandos
+        profiler: Profiler que registra el tiempo de cada etapa
+        
+    Returns:
+        Código de salida
+    """
     print_banner()
     
     # Cargar variables de entorno
     load_dotenv()
     
-    # Determinar si usar procesador local o API
-    if USE_LOCAL:
-        print("🆓 Usando OCR Local (EasyOCR) - Sin costos de API\n")
-        processor = ImageProcessor()
-    else:
-        # Verificar API key para procesador con API
-        api_key = os.getenv('OPENAI_API_KEY')
-        if not api_key or api_key == 'your-api-key-here':
-            print("❌ Error: OPENAI_API_KEY no configurado")
-            print("\nPasos para configurar:")
-            print("1. Copia .env.example a .env")
-            print("2. Edita .env y agrega tu OpenAI API key")
-            print("3. Ejecuta nuevamente el programa")
-            print("\n💡 Tip: Para usar OCR local sin API, instala:")
-            print("    pip install easyocr opencv-python")
-            return 1
-        
-        print("☁️  Usando GPT-4o Vision API\n")
-        processor = ImageProcessor(api_key)
-    
     # Verificar argumentos
-    if len(sys.argv) < 2:
+    if not args.images:
         print("❌ Error: No se especificaron imágenes para procesar\n")
         print_usage()
         return 1
     
-    # Obtener rutas de imágenes
-    image_paths = sys.argv[1:]
+    # Obtener rutas de imágenes (las carpetas se expanden a sus imágenes)
+    image_paths = expand_image_paths(args.images)
     
     # Verificar que las imágenes existen
     valid_paths = []
@@ -157,26 +375,113 @@ def main():
     
     print(f"📁 Imágenes a procesar: {len(valid_paths)}\n")
     
-    # Procesar imágenes
+    # Cargar el backend (y sus dependencias) solo cuando hay algo que procesar
+    processor = create_processor(args, resolve_backend(args.backend))
+    if processor is None:
+        return 1
+    processor.profiler = profiler
+    
+    # Abrir almacén de transacciones (importa el JSON heredado la primera vez)
+    store = TransactionStore(DB_FILE)
+    try:
+        return process_images(args, processor, profiler, store, valid_paths)
+    finally:
+        store.close()
+
+
+def process_images(args: argparse.Namespace, processor, profiler, store: TransactionStore,
+                   valid_paths: List[str]) -> int:
+    """
+    Extrae las transacciones imagen por imagen, las guarda en el almacén en
+    cuanto termina cada una y actualiza el Excel al final.
+    
+    Si la ejecución se interrumpe, las transacciones de las imágenes ya
+    terminadas quedan guardadas y sus meses se exportan en la siguiente.
+    
+    Args:
+        args: Opciones de línea de comandos
+        processor: Procesador de imágenes (local o API)
+        profiler: Profiler que registra el tiempo de cada etapa
+        store: Almacén de transacciones abierto
+        valid_paths: Rutas de imágenes existentes
+        
+    Returns:
+        Código de salida
+    """
+    if store.removed_duplicates:
+        print(f"\n🧹 Índice de duplicados actualizado: {store.removed_duplicates} transacciones repetidas eliminadas")
+        print("   Ejecuta con --full-export para regenerar el Excel sin ellas")
+    imported = store.import_json(DATA_FILE)
+    if imported:
+        print(f"\n📥 Importadas {imported} transacciones de {DATA_FILE}")
+    print(f"\n📂 Transacciones existentes: {store.count()}\n")
+    
+    # Meses con transacciones guardadas que aún no llegaron al Excel
+    pending_months = set(json.loads(store.get_meta(PENDING_MONTHS_KEY) or '[]'))
+    
+    # Diario del lote: con --resume, las imágenes ya terminadas se leen de él
+    journal = BatchJournal()
+    if args.resume:
+        done, remaining = journal.resume(valid_paths)
+        print(f"⏩ Reanudando lote: {len(done)} imágenes ya terminadas, {len(remaining)} pendientes\n")
+    else:
+        journal.start()
+        done, remaining = [], valid_paths
+    
+    # Procesar imágenes: deduplicar y guardar cada una en cuanto termina
     print("🔄 Iniciando extracción de transacciones...\n")
-    new_transactions = processor.process_multiple_images(valid_paths)
+    cache = None if args.no_cache else ExtractionCache()
+    seen = set()
+    # Con umbral 1 solo cuenta la clave exacta
+    fuzzy = FuzzyDeduplicator(store, args.fuzzy_threshold) if args.fuzzy_threshold < 1 else None
+    extracted = 0
+    inserted = 0
+    incomplete = 0
     
-    if not new_transactions:
-        print("\n⚠️  No se extrajeron transacciones de las imágenes")
-        return 0
+    with journal, profiler.stage('extract'):
+        results = journal.track(iter_extract_with_cache(processor, remaining, args.workers, cache))
+        for result in chain(done, results):
+            name = Path(result.path).name
+            extracted += len(result.transactions)
+            incomplete += not result.complete
     
-    # Cargar transacciones existentes
-    existing_transactions = load_existing_data()
-    print(f"\n📂 Transacciones existentes: {len(existing_transactions)}")
+            with profiler.stage('dedup', name):
+                unique = deduplicate_transactions(result.transactions, seen)
+                if fuzzy:
+                    unique = fuzzy.filter(unique)
+            with profiler.stage('store', name):
+                new_rows = store.add_transactions(unique)
+            inserted += len(new_rows)
+            
+            new_months = {t.month for t in new_rows} - pending_months
+            if new_months:
+                pending_months |= new_months
+                store.set_meta(PENDING_MONTHS_KEY, json.dumps(sorted(pending_months)))
+    profiler.count('inserted', inserted)
     
-    # Combinar y eliminar duplicados
-    all_transactions = existing_transactions + new_transactions
-    all_transactions = deduplicate_transactions(all_transactions)
+    cached = f" (imágenes en caché: {cache.hits}/{len(valid_paths)})" if cache else ""
+    print(f"\n📊 Total de transacciones extraídas: {extracted}{cached}")
+    if incomplete:
+        print(f"⚠️  Imágenes incompletas (respuesta cortada o error): {incomplete}; "
+              f"se vuelven a procesar en la próxima ejecución")
     
-    print(f"📊 Total de transacciones únicas: {len(all_transactions)}")
+    if not extracted and not pending_months:
+        print("\n⚠️  No se extrajeron transacciones de las imágenes")
+        return 0
+    
+    duplicates = extracted - len(seen)
+    if duplicates > 0:
+        print(f"🔄 Duplicados eliminados: {duplicates}")
+    near_duplicates = fuzzy.removed if fuzzy else 0
+    if near_duplicates > 0:
+        print(f"🔄 Variantes de OCR descartadas (descripción casi idéntica): {near_duplicates}")
+    already_saved = len(seen) - near_duplicates - inserted
+    if already_saved > 0:
+        print(f"🔄 Ya registradas anteriormente: {already_saved}")
+    print(f"💾 Datos guardados en {DB_FILE}")
     
-    # Guardar datos actualizados
-    save_data(all_transactions)
+    total_transactions = store.count()
+    print(f"📊 Total de transacciones únicas: {total_transactions}")
     
     # Obtener información de cuenta
     account_type = os.getenv('ACCOUNT_TYPE', 'Cuenta')
@@ -184,24 +489,43 @@ def main():
     bank_name = os.getenv('BANK_NAME', 'Banco')
     
     # Exportar a Excel
-    print("\n📈 Generando archivo Excel...\n")
+    from excel_exporter import ExcelExporter
     exporter = ExcelExporter(
         account_type=account_type,
         account_number=account_number,
-        bank_name=bank_name
+        bank_name=bank_name,
+        engine=args.excel_engine
     )
     
     output_path = "output/movimientos_bancarios.xlsx"
-    exporter.create_excel(all_transactions, output_path)
+    
+    if args.full_export or imported or not Path(output_path).exists():
+        print("\n📈 Generando archivo Excel...\n")
+        with profiler.stage('excel'):
+            exporter.create_excel(store.all_transactions(), output_path)
+    elif pending_months:
+        # Reescribir solo las hojas de los meses que recibieron transacciones nuevas
+        changed_months = sorted(pending_months)
+        print(f"\n📈 Actualizando Excel ({len(changed_months)} meses modificados)...\n")
+        with profiler.stage('excel'):
+            exporter.update_excel(
+                {month: store.transactions_for_month(month) for month in changed_months},
+                output_path
+            )
+    else:
+        print("\n📈 El archivo Excel ya está al día")
+    
+    if pending_months:
+        store.set_meta(PENDING_MONTHS_KEY, '[]')
     
     # Resumen final
     print("\n" + "="*70)
     print("  ✅ PROCESO COMPLETADO EXITOSAMENTE")
     print("="*70)
     print(f"\n📄 Archivo Excel: {output_path}")
-    print(f"💾 Datos guardados: {DATA_FILE}")
-    print(f"📊 Total transacciones: {len(all_transactions)}")
-    print(f"🆕 Nuevas transacciones: {len(new_transactions)}")
+    print(f"💾 Datos guardados: {DB_FILE}")
+    print(f"📊 Total transacciones: {total_transactions}")
+    print(f"🆕 Nuevas transacciones: {inserted}")
     print("\n💡 Tip: Puedes agregar más imágenes ejecutando el programa nuevamente")
     print("         Las nuevas transacciones se agregarán al archivo existente.\n")
     
@@ -213,9 +537,11 @@ if __name__ == "__main__":
         sys.exit(main())
     except KeyboardInterrupt:
         print("\n\n⚠️  Proceso interrumpido por el usuario")
+        print(RESUME_HINT)
         sys.exit(1)
     except Exception as e:
         print(f"\n❌ Error inesperado: {e}")
         import traceback
         traceback.print_exc()
+        print(RESUME_HINT)
         sys.exit(1)
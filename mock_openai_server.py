@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Servidor local que imita el endpoint chat.completions de OpenAI.
+Sirve para probar el modo concurrente sin costos de API:
+
+    python mock_openai_server.py --port 8000 --latency 1.5 --error-rate 0.2
+    OPENAI_BASE_URL=http://127.0.0.1:8000/v1 python main.py --workers 8 imgs/*.jpg
+
+Las solicitudes con varias imágenes (--api-pack) reciben una respuesta con una
+clave por imagen. El uso de tokens se estima como la API: ~4 caracteres por
+token de texto más un costo fijo por imagen. Con "stream": true la respuesta
+se envía por SSE en fragmentos: --latency es la espera hasta el primero y
+--image-latency se reparte entre ellos.
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+
+# Respuesta fija que devuelve el servidor para cada imagen
+MOCK_TRANSACTIONS = [
+    {
+        "date": "31/08/2025",
+        "name": "INTERESES DEUDORES",
+        "amount": -0.02,
+        "type": "cargo",
+        "month": "Agosto 2025"
+    },
+    {
+        "date": "29/08/2025",
+        "name": "PLIN-JUAN PEREZ",
+        "amount": 150.0,
+        "type": "abono",
+        "month": "Agosto 2025"
+    }
+]
+
+
+# Caracteres de la respuesta por fragmento en streaming
+STREAM_CHUNK = 24
+
+# Tokens de entrada por imagen en modo "high" (como IMAGE_TOKENS_ESTIMATE)
+IMAGE_TOKENS = 1105
+
+
+class MockState:
+    """Configuración y contadores compartidos por todas las solicitudes."""
+    
+    def __init__(self, latency: float, error_rate: float, image_latency: float = 0.0,
+                 invalid_rate: float = 0.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.image_latency = image_latency
+        self.invalid_rate = invalid_rate
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.tokens = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+
+def count_request(request: dict):
+    """Cuenta las imágenes y los caracteres de texto de una solicitud."""
+    images = 0
+    text = 0
+    for message in request.get('messages', []):
+        content = message.get('content')
+        if isinstance(content, str):
+            text += len(content)
+            continue
+        for part in content or []:
+            if part.get('type') == 'image_url':
+                images += 1
+            else:
+                text += len(part.get('text', ''))
+    return images, text
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    """Handler HTTP del endpoint /v1/chat/completions."""
+    
+    state: MockState = None
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def _send_json(self, status: int, payload: dict, headers: dict = None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _send_stream(self, chunk: dict, content: str, finish_reason: str, usage: Optional[dict],
+                     duration: float):
+        """Envía la respuesta por SSE en fragmentos de STREAM_CHUNK caracteres."""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.end_headers()
+        
+        def send(choices: list, **extra):
+            event = {**chunk, "object": "chat.completion.chunk", "choices": choices, **extra}
+            self.wfile.write(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+        
+        pieces = [content[i:i + STREAM_CHUNK] for i in range(0, len(content), STREAM_CHUNK)]
+        send([{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}])
+        for piece in pieces:
+            time.sleep(duration / len(pieces))
+            send([{"index": 0, "delta": {"content": piece}, "finish_reason": None}])
+        send([{"index": 0, "delta": {}, "finish_reason": finish_reason}])
+        if usage:
+            send([], usage=usage)
+        self.wfile.write(b"data: [DONE]\n\n")
+    
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {"error": {"message": "Not found"}})
+            return
+        
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+        
+        state = self.state
+        with state.lock:
+            state.requests += 1
+            state.in_flight += 1
+            state.max_in_flight = max(state.max_in_flight, state.in_flight)
+        
+        images, text = count_request(request)
+        stream = request.get('stream', False)
+        
+        try:
+            # En streaming, la latencia por imagen se reparte entre los fragmentos
+            time.sleep(state.latency + (0 if stream else state.image_latency * images))
+            
+            # Inyectar errores 429/500 para probar los reintentos
+            if random.random() < state.error_rate:
+                with state.lock:
+                    state.errors += 1
+                if random.random() < 0.5:
+                    self._send_json(429, {"error": {"message": "Rate limit reached", "type": "requests"}},
+                                    headers={'Retry-After': '0.1'})
+                else:
+                    self._send_json(500, {"error": {"message": "Internal error", "type": "server_error"}})
+                return
+            
+            if images > 1:
+                result = {str(number): {"transactions": MOCK_TRANSACTIONS} for number in range(1, images + 1)}
+            else:
+                result = {"transactions": MOCK_TRANSACTIONS}
+            content = json.dumps(result, ensure_ascii=False)
+            finish_reason = "stop"
+            if random.random() < state.invalid_rate:
+                # Respuesta cortada a la mitad, como al agotar max_tokens
+                content = content[:len(content) // 2]
+                finish_reason = "length"
+            
+            prompt_tokens = text // 4 + IMAGE_TOKENS * images
+            completion_tokens = len(content) // 4
+            with state.lock:
+                state.tokens += prompt_tokens + completion_tokens
+            
+            usage = {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+            chunk = {
+                "id": f"chatcmpl-{uuid.uuid4().hex}",
+                "created": int(time.time()),
+                "model": request.get('model', 'gpt-4o')
+            }
+            if stream:
+                include_usage = (request.get('stream_options') or {}).get('include_usage')
+                self._send_stream(chunk, content, finish_reason, usage if include_usage else None,
+                                  state.image_latency * images)
+                return
+            
+            self._send_json(200, {
+                **chunk,
+                "object": "chat.completion",
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": finish_reason
+                }],
+                "usage": usage
+            })
+        finally:
+            with state.lock:
+                state.in_flight -= 1
+
+
+def create_server(host: str = '127.0.0.1', port: int = 8000, latency: float = 1.0,
+                  error_rate: float = 0.0, image_latency: float = 0.0,
+                  invalid_rate: float = 0.0) -> ThreadingHTTPServer:
+    """
+    Crea el servidor simulado (sin arrancarlo).
+    
+    Args:
+        host: Dirección de escucha
+        port: Puerto (0 para uno libre)
+        latency: Segundos de espera simulada por solicitud
+        error_rate: Fracción de solicitudes que fallan con 429 o 500
+        image_latency: Segundos adicionales por cada imagen de la solicitud
+        invalid_rate: Fracción de respuestas con JSON inválido (cortado)
+    
+    Returns:
+        Servidor listo para serve_forever(); su estado está en server.state
+    """
+    state = MockState(latency, error_rate, image_latency, invalid_rate)
+    handler = type('BoundMockHandler', (MockHandler,), {'state': state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.state = state
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local que imita la API de OpenAI")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=1.0, help="Segundos por solicitud")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fracción de respuestas 429/500")
+    parser.add_argument('--image-latency', type=float, default=0.0,
+                        help="Segundos adicionales por imagen de la solicitud")
+    parser.add_argument('--invalid-rate', type=float, default=0.0,
+                        help="Fracción de respuestas con JSON inválido")
+    args = parser.parse_args()
+    
+    server = create_server(args.host, args.port, args.latency, args.error_rate,
+                           args.image_latency, args.invalid_rate)
+    print(f"🧪 Servidor simulado en http://{args.host}:{server.server_port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        state = server.state
+        print(f"\n📊 Solicitudes: {state.requests} | Errores inyectados: {state.errors} "
+              f"| Concurrencia máxima: {state.max_in_flight} | Tokens: {state.tokens}")
+
+
+if __name__ == "__main__":
+    main()
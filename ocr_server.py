@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Servidor OCR residente para reutilizar un único Reader de EasyOCR.
+Cargar el modelo suele tardar más que el propio OCR; con el servidor en marcha,
+main.py, debug_extract.py y debug_lines.py le envían las imágenes en lugar de
+cargar el modelo en cada ejecución:
+
+    python ocr_server.py                # escucha en http://127.0.0.1:8765
+    python main.py imagen.jpg           # usa el servidor si está disponible
+
+El servidor informa en /health de sus opciones de Reader (CPU o GPU) y los
+clientes con otras opciones hacen el OCR en su propio proceso: para
+`main.py --gpu`, inicia el servidor con `python ocr_server.py --gpu`.
+
+Si el servidor no está en marcha, LocalImageProcessor hace el OCR en el proceso.
+"""
+
+import argparse
+import json
+import os
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Any
+
+import cv2
+import numpy as np
+
+from image_processor_local import LocalImageProcessor, DEFAULT_OCR_SERVER_URL
+
+
+def to_builtin(value: Any) -> Any:
+    """
+    Convierte recursivamente los tipos de numpy de un resultado de EasyOCR a
+    tipos nativos serializables en JSON.
+    
+    Args:
+        value: Resultado (o parte) de reader.readtext
+    
+    Returns:
+        Estructura equivalente con listas, int, float y str
+    """
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [to_builtin(item) for item in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+class OCRRequestHandler(BaseHTTPRequestHandler):
+    """Handler HTTP: GET /health y POST /readtext con los bytes de la imagen."""
+    
+    processor: LocalImageProcessor = None
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def do_GET(self):
+        if self.path == '/health':
+            self._send_json(200, {"status": "ok", "pid": os.getpid(),
+                                  "reader": self.processor.reader_options})
+        else:
+            self._send_json(404, {"error": "Not found"})
+    
+    def do_POST(self):
+        if self.path != '/readtext':
+            self._send_json(404, {"error": "Not found"})
+            return
+        
+        length = int(self.headers.get('Content-Length', 0))
+        data = np.frombuffer(self.rfile.read(length), dtype=np.uint8)
+        image = cv2.imdecode(data, cv2.IMREAD_UNCHANGED)
+        if image is None:
+            self._send_json(400, {"error": "No se pudo decodificar la imagen"})
+            return
+        
+        try:
+            results = self.processor.reader.readtext(image)
+        except Exception as e:
+            self._send_json(500, {"error": str(e)})
+            return
+        
+        self._send_json(200, {"results": to_builtin(results)})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor OCR residente (EasyOCR)")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=int(DEFAULT_OCR_SERVER_URL.rsplit(':', 1)[1]))
+    parser.add_argument('--gpu', action='store_true',
+                        help="Ejecutar EasyOCR en la GPU; solo lo usarán los clientes iniciados con --gpu")
+    args = parser.parse_args()
+    
+    # El servidor hace el OCR en su propio proceso, nunca contra sí mismo
+    processor = LocalImageProcessor(ocr_server_url="", gpu=args.gpu)
+    processor.reader  # Cargar el modelo antes de aceptar solicitudes
+    
+    handler = type('BoundOCRRequestHandler', (OCRRequestHandler,), {'processor': processor})
+    # HTTPServer atiende una solicitud a la vez: el Reader no se comparte entre hilos
+    server = HTTPServer((args.host, args.port), handler)
+    print(f"🟢 Servidor OCR escuchando en http://{args.host}:{args.port} ({'GPU' if args.gpu else 'CPU'})")
+    print("   Detén el servidor con Ctrl-C")
+    
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Servidor OCR detenido")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Registros compactos del pipeline: detecciones de OCR, transacciones y
+resultados por imagen.
+Son NamedTuple (sin __dict__ por instancia), así que ocupan bastante menos
+memoria que un diccionario con las mismas claves y sus campos se leen por
+atributo. La conversión a diccionario solo se hace en los límites JSON
+(caché de extracciones, histórico heredado y respuestas de la API).
+"""
+
+import hashlib
+import uuid
+from typing import List, Dict, Any, NamedTuple, Optional
+
+from token_classifier import Token
+
+
+def normalize_name(name: str) -> str:
+    """Descripción en minúsculas y con los espacios repetidos colapsados."""
+    return ' '.join((name or '').split()).casefold()
+
+
+def normalize_amount(amount: Any) -> Optional[float]:
+    """Monto redondeado a céntimos (None si no es un número)."""
+    try:
+        return round(float(amount), 2) + 0.0
+    except (TypeError, ValueError):
+        return None
+
+
+def normalize_currency(currency: str) -> str:
+    """Moneda sin espacios alrededor y en mayúsculas ("s/ " -> "S/")."""
+    return (currency or '').strip().upper()
+
+
+def dedup_key(date: str, name: str, amount: float, currency: str) -> str:
+    """
+    Clave de deduplicación normalizada de una transacción.
+    
+    El nombre se compara sin distinguir mayúsculas ni espacios repetidos y el
+    monto redondeado a céntimos, para que el ruido del OCR entre dos capturas
+    del mismo movimiento no produzca claves distintas.
+    
+    Args:
+        date: Fecha DD/MM/YYYY
+        name: Descripción del movimiento
+        amount: Monto
+        currency: Moneda
+    
+    Returns:
+        Hash hexadecimal de 32 caracteres
+    """
+    rounded = normalize_amount(amount)
+    normalized = '\x1f'.join((
+        (date or '').strip(),
+        normalize_name(name),
+        f"{rounded:.2f}" if rounded is not None else str(amount),
+        normalize_currency(currency)
+    ))
+    return hashlib.blake2b(normalized.encode('utf-8'), digest_size=16).hexdigest()
+
+
+class Detection(NamedTuple):
+    """Detección de EasyOCR con la geometría de su bbox ya calculada."""
+    bbox: List
+    text: str
+    confidence: float
+    y_center: float
+    x_center: float
+    x_left: float
+    x_right: float
+    y_top: float
+    y_bottom: float
+    width: float
+    height: float
+    token: Optional[Token] = None
+    
+    @classmethod
+    def from_ocr(cls, detection: List, token: Optional[Token] = None) -> 'Detection':
+        """
+        Crea una detección a partir de un resultado de EasyOCR.
+        
+        Args:
+            detection: Detección [bbox, texto, confianza]
+            token: Clasificación del texto (opcional)
+        
+        Returns:
+            Detection con las coordenadas del bbox
+        """
+        bbox = detection[0]
+        x_left, y_top = bbox[0][0], bbox[0][1]
+        x_right, y_bottom = bbox[2][0], bbox[2][1]
+        return cls(
+            bbox, detection[1], detection[2],
+            (y_top + y_bottom) / 2, (x_left + x_right) / 2,
+            x_left, x_right, y_top, y_bottom,
+            x_right - x_left, y_bottom - y_top,
+            token
+        )
+
+
+class Transaction(NamedTuple):
+    """Movimiento bancario extraído de una captura."""
+    id: str
+    date: str
+    name: str
+    amount: float
+    type: str
+    currency: str = 'S/'
+    month: str = 'Sin mes'
+    
+    @property
+    def dedup_key(self) -> str:
+        """Clave de deduplicación normalizada (ver dedup_key)."""
+        return dedup_key(self.date, self.name, self.amount, self.currency)
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Transaction':
+        """
+        Crea una transacción desde un diccionario JSON (caché, histórico o API).
+        
+        Args:
+            data: Diccionario con las claves de la transacción
+        
+        Returns:
+            Transaction, con un ID nuevo si el diccionario no trae uno
+        """
+        return cls(
+            data.get('id') or str(uuid.uuid4()),
+            data.get('date', ''),
+            data.get('name', ''),
+            data.get('amount', 0),
+            data.get('type', ''),
+            data.get('currency', 'S/'),
+            data.get('month', 'Sin mes')
+        )
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Diccionario para serializar en JSON."""
+        return self._asdict()
+
+
+class ImageResult(NamedTuple):
+    """Transacciones de una imagen del lote, en cuanto termina su extracción."""
+    index: int
+    path: str
+    transactions: List[Transaction]
+    complete: bool = True   # False si la respuesta llegó cortada o falló: no se guarda en caché ni en el diario
@@ -0,0 +1,259 @@
+"""
+División de capturas largas (scroll o capturas unidas) en franjas horizontales.
+Las franjas se cortan en las bandas en blanco entre filas y se solapan con las
+vecinas, así que cada fila aparece completa en al menos una franja. Cada
+franja es dueña de una zona central (core); al unir los resultados, cada
+elemento se queda solo en la franja dueña de su posición:
+
+- OCR local: cada detección se conserva en la franja cuyo core contiene su
+  centro, y el resultado es la lista de detecciones de la imagen completa.
+- API: las transacciones de la zona solapada aparecen al final de una franja
+  y al principio de la siguiente, y se unen alineando ambas secuencias.
+
+El módulo no depende de numpy (el backend de la API solo necesita Pillow):
+la planificación trabaja sobre una lista de filas en blanco.
+"""
+
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from records import Transaction
+
+
+# Solape (px) de cada franja por encima y por debajo de sus cortes
+TILE_OVERLAP = 200
+
+# Margen (px) alrededor de cada corte en el que se busca una banda en blanco
+TILE_SEARCH = 300
+
+# Diferencia máxima entre el píxel más claro y el más oscuro de una fila en blanco
+BLANK_ROW_TOLERANCE = 8
+
+
+class Tile(NamedTuple):
+    """Franja horizontal de una imagen."""
+    index: int
+    count: int
+    top: int            # Filas que se procesan (con solape)
+    bottom: int
+    core_top: int       # Zona de la que esta franja es dueña
+    core_bottom: int
+
+
+def blank_rows(gray: Any, tolerance: int = BLANK_ROW_TOLERANCE) -> List[bool]:
+    """
+    Marca las filas sin texto ni bordes (todas del mismo tono).
+    
+    Args:
+        gray: Imagen de numpy en escala de grises
+        tolerance: Diferencia máxima de intensidad dentro de la fila
+    
+    Returns:
+        Lista con una entrada por fila
+    """
+    return ((gray.max(axis=1).astype('int16') - gray.min(axis=1)) <= tolerance).tolist()
+
+
+def blank_rows_pil(image: Any, tolerance: int = BLANK_ROW_TOLERANCE) -> List[bool]:
+    """
+    Igual que blank_rows, para una imagen de Pillow.
+    
+    Args:
+        image: Imagen de Pillow
+        tolerance: Diferencia máxima de intensidad dentro de la fila
+    
+    Returns:
+        Lista con una entrada por fila
+    """
+    gray = image.convert('L')
+    width, height = gray.size
+    extrema = (gray.crop((0, y, width, y + 1)).getextrema() for y in range(height))
+    return [high - low <= tolerance for low, high in extrema]
+
+
+def snap_to_gap(blank: Sequence[bool], target: int, low: int, high: int) -> int:
+    """
+    Busca el centro de la banda en blanco más alta entre low y high.
+    
+    Las bandas entre transacciones suelen ser más altas que las que separan
+    las líneas de una misma transacción, así que el corte cae entre filas.
+    
+    Args:
+        blank: Resultado de blank_rows
+        target: Fila preferida si no hay ninguna fila en blanco
+        low: Primera fila candidata
+        high: Última fila candidata (exclusiva)
+    
+    Returns:
+        Fila del corte
+    """
+    best_start, best_length = None, 0
+    run_start = None
+    
+    for row in range(max(0, low), min(len(blank), high) + 1):
+        if row < high and row < len(blank) and blank[row]:
+            if run_start is None:
+                run_start = row
+        elif run_start is not None:
+            if row - run_start > best_length:
+                best_start, best_length = run_start, row - run_start
+            run_start = None
+    
+    if best_start is None:
+        return target
+    return best_start + best_length // 2
+
+
+def plan_tiles(blank: Sequence[bool], tile_height: int, overlap: int = TILE_OVERLAP,
+               search: int = TILE_SEARCH) -> List[Tile]:
+    """
+    Planifica las franjas de una imagen alta.
+    
+    Los cortes entre cores se colocan cada (tile_height - 2 * overlap) filas
+    como mucho, en la banda en blanco más alta cercana; los bordes de cada
+    franja se extienden entre overlap / 2 y overlap filas más allá de sus
+    cortes, también ajustados a una banda en blanco, así que ninguna franja
+    supera tile_height.
+    
+    Args:
+        blank: Resultado de blank_rows sobre la imagen
+        tile_height: Altura máxima aproximada de cada franja
+        overlap: Solape con cada franja vecina
+        search: Margen de búsqueda de bandas en blanco alrededor de cada corte
+    
+    Returns:
+        Franjas de arriba a abajo (una sola si la imagen cabe entera)
+    """
+    height = len(blank)
+    if height <= tile_height:
+        return [Tile(0, 1, 0, height, 0, height)]
+    
+    step = max(tile_height - 2 * overlap, overlap)
+    cuts = [0]
+    while height - cuts[-1] > step + overlap:
+        target = cuts[-1] + step
+        cuts.append(snap_to_gap(blank, target, max(cuts[-1] + step // 2, target - search), target))
+    cuts.append(height)
+    
+    count = len(cuts) - 1
+    tiles = []
+    for index in range(count):
+        core_top, core_bottom = cuts[index], cuts[index + 1]
+        top = 0 if index == 0 else snap_to_gap(
+            blank, core_top - overlap, core_top - overlap, core_top - overlap // 2
+        )
+        bottom = height if index == count - 1 else snap_to_gap(
+            blank, core_bottom + overlap, core_bottom + overlap // 2, core_bottom + overlap
+        )
+        tiles.append(Tile(index, count, top, bottom, core_top, core_bottom))
+    
+    return tiles
+
+
+def tile_label(name: str, tile: Optional[Tile]) -> str:
+    """Nombre de una imagen o de una de sus franjas para los mensajes."""
+    if tile is None or tile.count == 1:
+        return name
+    return f"{name} [{tile.index + 1}/{tile.count}]"
+
+
+def merge_tile_detections(results: List[List], tiles: List[Tile]) -> List:
+    """
+    Une las detecciones de EasyOCR de cada franja en coordenadas de la imagen.
+    
+    Args:
+        results: Detecciones (bbox, texto, confianza) de cada franja
+        tiles: Franjas en el mismo orden
+    
+    Returns:
+        Detecciones de la imagen completa, cada una de la franja dueña de su centro
+    """
+    merged = []
+    for tile_results, tile in zip(results, tiles):
+        for bbox, text, confidence in tile_results:
+            bbox = [[x, y + tile.top] for x, y in bbox]
+            y_center = (bbox[0][1] + bbox[2][1]) / 2
+            if tile.core_top <= y_center < tile.core_bottom:
+                merged.append((bbox, text, confidence))
+    return merged
+
+
+def merge_tile_transactions(results: List[List[Transaction]]) -> List[Transaction]:
+    """
+    Une las transacciones extraídas de franjas consecutivas.
+    
+    Las transacciones de la zona solapada aparecen al final de una franja y
+    al principio de la siguiente: se busca el sufijo más largo de lo ya unido
+    que coincide (por clave de deduplicación) con un prefijo de la franja
+    siguiente, y solo se añade el resto. Las transacciones repetidas fuera del
+    solape (dos movimientos iguales el mismo día) se conservan.
+    
+    Las franjas sin encabezado de mes devuelven month vacío; se completa con
+    el mes de la transacción anterior (o 'Sin mes' si no hay ninguna).
+    
+    Args:
+        results: Transacciones de cada franja, de arriba a abajo
+    
+    Returns:
+        Transacciones de la imagen completa
+    """
+    merged: List[Transaction] = []
+    
+    for transactions in results:
+        keys = [transaction.dedup_key for transaction in transactions]
+        merged_keys = [transaction.dedup_key for transaction in merged[-len(keys):]] if keys else []
+        shared = 0
+        for size in range(min(len(keys), len(merged_keys)), 0, -1):
+            if merged_keys[-size:] == keys[:size]:
+                shared = size
+                break
+        merged.extend(transactions[shared:])
+    
+    month = None
+    for position, transaction in enumerate(merged):
+        if transaction.month and transaction.month != 'Sin mes':
+            month = transaction.month
+        else:
+            merged[position] = transaction._replace(month=month or 'Sin mes')
+    
+    return merged
+
+
+class TileCollector:
+    """
+    Reúne los resultados de las franjas de cada imagen, que pueden llegar en
+    cualquier orden, y los une cuando llega la última.
+    """
+    
+    def __init__(self):
+        """Inicializa el colector sin franjas pendientes."""
+        self.pending: Dict[int, Dict[int, List[Transaction]]] = {}
+        self.incomplete: Set[int] = set()
+    
+    def add(self, index: int, tile: Optional[Tile], transactions: List[Transaction],
+            complete: bool = True) -> Optional[Tuple[List[Transaction], bool]]:
+        """
+        Registra el resultado de una franja.
+        
+        Args:
+            index: Índice de la imagen en el lote
+            tile: Franja (None para la imagen completa)
+            transactions: Transacciones extraídas de la franja
+            complete: Si la extracción de la franja terminó sin cortes ni errores
+        
+        Returns:
+            Tupla (transacciones de la imagen completa, si todas sus franjas
+            llegaron completas) si ya llegaron todas sus franjas, o None si faltan
+        """
+        if tile is None or tile.count == 1:
+            return transactions, complete
+        
+        parts = self.pending.setdefault(index, {})
+        parts[tile.index] = transactions
+        if not complete:
+            self.incomplete.add(index)
+        if len(parts) < tile.count:
+            return None
+        del self.pending[index]
+        complete = index not in self.incomplete
+        self.incomplete.discard(index)
+        return merge_tile_transactions([parts[position] for position in range(tile.count)]), complete
@@ -0,0 +1,129 @@
+"""
+Clasificador de textos del OCR para el procesador local.
+Los patrones se compilan una sola vez al importar el módulo y cada texto se
+clasifica en una sola pasada como monto, fecha, descripción o ruido.
+"""
+
+import re
+from typing import NamedTuple, Optional
+
+
+# Tipos de token
+AMOUNT = "amount"
+DATE = "date"
+DESCRIPTION = "description"
+NOISE = "noise"
+
+# Meses en español: nombre en minúsculas -> número
+MONTHS = {
+    'enero': '01', 'febrero': '02', 'marzo': '03', 'abril': '04',
+    'mayo': '05', 'junio': '06', 'julio': '07', 'agosto': '08',
+    'septiembre': '09', 'octubre': '10', 'noviembre': '11', 'diciembre': '12'
+}
+
+# Nombre con mayúscula inicial de cada mes
+MONTH_NAMES = {name: name.capitalize() for name in MONTHS}
+
+# Último día de cada mes (para fechas con solo el mes)
+MONTH_LAST_DAY = {
+    'enero': '31', 'febrero': '28', 'marzo': '31', 'abril': '30', 'mayo': '31', 'junio': '30',
+    'julio': '31', 'agosto': '31', 'septiembre': '30', 'octubre': '31', 'noviembre': '30', 'diciembre': '31'
+}
+
+_MONTH_ALTERNATION = '|'.join(MONTH_NAMES.values())
+
+MONTH_PATTERN = re.compile(rf'({_MONTH_ALTERNATION})', re.IGNORECASE)
+MONTH_YEAR_PATTERN = re.compile(rf'({_MONTH_ALTERNATION})\s*(20\d{{2}})', re.IGNORECASE)
+DAY_MONTH_PATTERN = re.compile(rf'(\d{{1,2}})\s+({_MONTH_ALTERNATION})', re.IGNORECASE)
+YEAR_PATTERN = re.compile(r'\b(20\d{2})\b')
+ANY_YEAR_PATTERN = re.compile(r'20\d{2}')
+
+# Fechas: "18", "18 Septiembre" o "18 Septiembre; 01.41"
+DATE_TOKEN_PATTERN = re.compile(rf'^\d{{1,2}}(\s+({_MONTH_ALTERNATION}))?$', re.IGNORECASE)
+DATE_TIME_TOKEN_PATTERN = re.compile(r'^\d{1,2}\s+\w+;\s*\d', re.IGNORECASE)
+
+# Corrección de días mal leídos por el OCR ("71" -> "11") y búsqueda del día
+OCR_DAY_FIX_PATTERN = re.compile(r'\b7([0-9])\b')
+DAY_PATTERN = re.compile(r'\b(\d{1,2})\b')
+
+# Montos: número suelto con decimales, o cualquier dígito junto a una marca de moneda
+DIGIT_PATTERN = re.compile(r'\d')
+DECIMAL_PATTERN = re.compile(r'-?\s*\d+[.,]\d+')
+BARE_AMOUNT_PATTERN = re.compile(r'^-?\s*\d+[.,]\d+$')
+AMOUNT_IN_TEXT_PATTERN = re.compile(r'([5S$]/?\s*-?\s*\d+[.,]\d+)')
+AMOUNT_IN_NAME_PATTERN = re.compile(r'[5S]/?\s*-?\s*\d+[.,]\d+')
+AMOUNT_NUMBER_PATTERN = re.compile(r'(-?\s*\d{1,3}(?:[.,]\d{3})*[.,]\d+|-?\s*\d+[.,]\d+|-?\s*\d+)')
+
+# Textos cortos de la interfaz o iconos que no forman parte de la descripción
+NOISE_WORDS = frozenset([
+    'movimientos', 'fecha', 'monto', 'in', 'co', 'im', 'de', 'tr', '#', 'pm', 'p.m.', 'a.m.',
+    'pm.', 'a.m', 'ma', 'po', 'en', 'eb', 'ley', 'ex'
+])
+
+# Nombres que no son transacciones (encabezados de la app)
+INVALID_NAMES = frozenset([
+    'septiembre 2025', 'agosto 2025', 'enero 2026', 'movimientos fecha', 'buscador de movimientos'
+])
+
+
+class Token(NamedTuple):
+    """Texto del OCR clasificado."""
+    kind: str               # AMOUNT, DATE, DESCRIPTION o NOISE
+    text: str               # Texto sin espacios en los extremos
+    marks_amount: bool      # La línea que lo contiene parece tener un monto
+    marks_description: bool # La línea que lo contiene parece tener una descripción
+
+
+def classify_token(raw_text: str) -> Token:
+    """
+    Clasifica un texto del OCR en una sola pasada.
+    
+    Además del tipo, calcula las dos pistas que group_transaction_elements
+    usa para decidir si una línea inicia una transacción.
+    
+    Args:
+        raw_text: Texto tal como lo devuelve el OCR
+    
+    Returns:
+        Token con el tipo, el texto limpio y las pistas de línea
+    """
+    text = raw_text.strip()
+    
+    has_soles = 'S/' in text
+    has_soles_lower = 's/' in text
+    has_mark = (has_soles or has_soles_lower or 'Sl' in text or 'sl' in text
+                or 'SI' in text or '$' in text)
+    
+    # Pistas de línea (sobre el texto original, como en la agrupación)
+    raw_soles = 'S/' in raw_text
+    marks_amount = raw_soles or 's/' in raw_text or DECIMAL_PATTERN.search(raw_text) is not None
+    marks_description = len(raw_text) > 3 and not raw_text.isdigit() and not raw_soles
+    
+    if (has_mark and DIGIT_PATTERN.search(text)) or BARE_AMOUNT_PATTERN.match(text):
+        kind = AMOUNT
+    elif DATE_TOKEN_PATTERN.match(text) or DATE_TIME_TOKEN_PATTERN.match(text):
+        kind = DATE
+    elif (len(text) > 2 and not text.isdigit() and not has_soles and not has_soles_lower
+          and 'Sl' not in text and '$' not in text and text.lower() not in NOISE_WORDS):
+        kind = DESCRIPTION
+    else:
+        kind = NOISE
+    
+    return Token(kind, text, marks_amount, marks_description)
+
+
+def find_month(text: str) -> Optional[str]:
+    """
+    Busca el primer mes (en orden de calendario) mencionado en un texto.
+    
+    Args:
+        text: Texto donde buscar
+    
+    Returns:
+        Nombre del mes en minúsculas o None
+    """
+    lowered = text.lower()
+    for month in MONTHS:
+        if month in lowered:
+            return month
+    return None
@@ -0,0 +1,285 @@
+"""
+Almacén persistente de transacciones en SQLite.
+Evita leer y reescribir todo el histórico en cada ejecución: las nuevas
+transacciones se insertan con upsert sobre un índice único de deduplicación y
+las consultas por mes o fecha usan sus propios índices.
+La clave de deduplicación se guarda normalizada (records.dedup_key) en su
+propia columna, así que cada transacción nueva se comprueba con una sola
+búsqueda en el índice sin cargar el histórico.
+"""
+
+import json
+import os
+import sqlite3
+import uuid
+from typing import List, Optional
+
+from records import Transaction, dedup_key
+
+
+# Ruta de la base de datos
+DB_FILE = "transactions.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    id TEXT PRIMARY KEY,
+    date TEXT NOT NULL,
+    iso_date TEXT NOT NULL,
+    name TEXT NOT NULL,
+    amount REAL NOT NULL,
+    type TEXT NOT NULL,
+    currency TEXT NOT NULL,
+    month TEXT NOT NULL,
+    dedup_key TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_transactions_month ON transactions (month);
+CREATE INDEX IF NOT EXISTS idx_transactions_iso_date ON transactions (iso_date);
+-- Bloques de fuzzy_dedup, con la moneda normalizada como en records.dedup_key
+DROP INDEX IF EXISTS idx_transactions_block;
+CREATE INDEX IF NOT EXISTS idx_transactions_norm_block ON transactions (date, UPPER(TRIM(currency)), amount);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+COLUMNS = ('id', 'date', 'name', 'amount', 'type', 'currency', 'month')
+
+# Versión del esquema (PRAGMA user_version); ver TransactionStore._migrate
+SCHEMA_VERSION = 1
+
+# Columnas en el orden de los campos de Transaction
+SELECT_COLUMNS = f"SELECT {', '.join(COLUMNS)} FROM transactions"
+
+
+def to_iso_date(date_str: str) -> str:
+    """
+    Convierte una fecha DD/MM/YYYY a YYYY-MM-DD para ordenar e indexar.
+    
+    Args:
+        date_str: Fecha en formato DD/MM/YYYY
+    
+    Returns:
+        Fecha ISO, o cadena vacía si el formato no es válido
+    """
+    parts = (date_str or '').split('/')
+    if len(parts) != 3:
+        return ''
+    day, month, year = parts
+    return f"{year}-{month.zfill(2)}-{day.zfill(2)}"
+
+
+class TransactionStore:
+    """Almacén de transacciones sobre SQLite."""
+    
+    def __init__(self, db_path: str = DB_FILE):
+        """
+        Abre (o crea) la base de datos.
+        
+        Args:
+            db_path: Ruta del archivo SQLite
+        """
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.executescript(SCHEMA)
+        self.removed_duplicates = self._migrate()
+        self.conn.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_transactions_dedup_key ON transactions (dedup_key)"
+        )
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+    
+    def close(self):
+        """Cierra la conexión."""
+        self.conn.close()
+    
+    def _migrate(self) -> int:
+        """
+        Actualiza una base de datos de una versión anterior del esquema.
+        
+        Versión 1: la deduplicación pasa del índice exacto sobre (fecha,
+        nombre, monto, moneda) a la columna dedup_key normalizada. Las filas
+        que con la clave normalizada resultan repetidas se eliminan,
+        conservando la primera que se guardó.
+        
+        Returns:
+            Número de filas duplicadas eliminadas
+        """
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return 0
+        
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(transactions)")}
+        seen = set()
+        keys = []
+        duplicates = []
+        
+        with self.conn:
+            if 'dedup_key' not in columns:
+                self.conn.execute("ALTER TABLE transactions ADD COLUMN dedup_key TEXT NOT NULL DEFAULT ''")
+            self.conn.execute("DROP INDEX IF EXISTS idx_transactions_dedup")
+            
+            rows = self.conn.execute(
+                "SELECT rowid, date, name, amount, currency FROM transactions ORDER BY rowid"
+            ).fetchall()
+            for rowid, date, name, amount, currency in rows:
+                key = dedup_key(date, name, amount, currency)
+                if key in seen:
+                    duplicates.append((rowid,))
+                else:
+                    seen.add(key)
+                    keys.append((key, rowid))
+            
+            self.conn.executemany("DELETE FROM transactions WHERE rowid = ?", duplicates)
+            self.conn.executemany("UPDATE transactions SET dedup_key = ? WHERE rowid = ?", keys)
+            self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        
+        return len(duplicates)
+    
+    def _to_row(self, transaction: Transaction) -> tuple:
+        return (
+            transaction.id or str(uuid.uuid4()),
+            transaction.date,
+            to_iso_date(transaction.date),
+            transaction.name,
+            transaction.amount,
+            transaction.type,
+            transaction.currency,
+            transaction.month,
+            transaction.dedup_key
+        )
+    
+    def _select(self, where: str = "", params: tuple = ()) -> List[Transaction]:
+        rows = self.conn.execute(f"{SELECT_COLUMNS} {where} ORDER BY iso_date DESC", params)
+        return list(map(Transaction._make, rows))
+    
+    def add_transactions(self, transactions: List[Transaction]) -> List[Transaction]:
+        """
+        Inserta transacciones omitiendo las que ya existen (misma clave de
+        deduplicación normalizada: fecha, nombre, monto y moneda).
+        
+        Args:
+            transactions: Lista de transacciones
+        
+        Returns:
+            Transacciones realmente insertadas
+        """
+        inserted = []
+        with self.conn:
+            for transaction in transactions:
+                row = self._to_row(transaction)
+                cursor = self.conn.execute(
+                    "INSERT INTO transactions "
+                    "(id, date, iso_date, name, amount, type, currency, month, dedup_key) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT DO NOTHING",
+                    row
+                )
+                if cursor.rowcount:
+                    inserted.append(Transaction._make(row[:2] + row[3:8]))
+        return inserted
+    
+    def count(self) -> int:
+        """Número total de transacciones guardadas."""
+        return self.conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+    
+    def all_transactions(self) -> List[Transaction]:
+        """
+        Devuelve todas las transacciones, de la más reciente a la más antigua.
+        
+        Returns:
+            Lista de transacciones
+        """
+        return self._select()
+    
+    def transactions_for_month(self, month: str) -> List[Transaction]:
+        """
+        Devuelve las transacciones de un mes (ej: "Agosto 2025").
+        
+        Args:
+            month: Mes tal como se guarda en el campo month
+        
+        Returns:
+            Lista de transacciones del mes, de la más reciente a la más antigua
+        """
+        return self._select("WHERE month = ?", (month,))
+    
+    def transactions_between(self, start_date: str, end_date: str) -> List[Transaction]:
+        """
+        Devuelve las transacciones entre dos fechas DD/MM/YYYY (inclusive).
+        
+        Args:
+            start_date: Fecha inicial
+            end_date: Fecha final
+        
+        Returns:
+            Lista de transacciones, de la más reciente a la más antigua
+        """
+        return self._select("WHERE iso_date BETWEEN ? AND ?", (to_iso_date(start_date), to_iso_date(end_date)))
+    
+    def names_in_block(self, date: str, currency: str, amount: float) -> List[str]:
+        """
+        Descripciones guardadas con la misma fecha, moneda y monto (a céntimos),
+        para la deduplicación aproximada (fuzzy_dedup).
+        
+        La moneda y el monto se comparan normalizados como en records.dedup_key
+        ("s/" y "S/" son la misma moneda).
+        
+        Args:
+            date: Fecha DD/MM/YYYY
+            currency: Moneda (ya normalizada con records.normalize_currency)
+            amount: Monto (ya redondeado con records.normalize_amount)
+        
+        Returns:
+            Lista de descripciones
+        """
+        rows = self.conn.execute(
+            "SELECT name FROM transactions "
+            "WHERE date = ? AND UPPER(TRIM(currency)) = ? AND amount BETWEEN ? AND ?",
+            (date, currency, amount - 0.005, amount + 0.005)
+        )
+        return [row[0] for row in rows]
+    
+    def months(self) -> List[str]:
+        """Meses con transacciones guardadas."""
+        return [row[0] for row in self.conn.execute("SELECT DISTINCT month FROM transactions")]
+    
+    def get_meta(self, key: str) -> Optional[str]:
+        """Lee un valor de la tabla meta (None si no existe)."""
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+    
+    def set_meta(self, key: str, value: str):
+        """Guarda un valor en la tabla meta."""
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO meta (key, value) VALUES (?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+                (key, value)
+            )
+    
+    def import_json(self, json_path: str) -> int:
+        """
+        Importa una sola vez el histórico de transactions_data.json.
+        
+        El archivo JSON no se modifica; la importación queda registrada en la
+        tabla meta para no repetirla en ejecuciones siguientes.
+        
+        Args:
+            json_path: Ruta del archivo JSON heredado
+        
+        Returns:
+            Número de transacciones importadas (0 si ya se importó o no existe)
+        """
+        if self.get_meta('json_imported') or not os.path.exists(json_path):
+            return 0
+        
+        with open(json_path, 'r', encoding='utf-8') as f:
+            transactions = [Transaction.from_dict(transaction) for transaction in json.load(f)]
+        
+        inserted = self.add_transactions(transactions)
+        self.set_meta('json_imported', os.path.abspath(json_path))
+        return len(inserted)
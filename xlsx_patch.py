@@ -0,0 +1,314 @@
+"""
+Reemplazo de hojas de un .xlsx a nivel de archivo zip.
+Un .xlsx es un zip de partes XML: cada hoja es una parte propia
+(xl/worksheets/sheetN.xml) y todas comparten xl/styles.xml. Para actualizar
+unas pocas hojas no hace falta cargar y volver a serializar el libro entero
+con openpyxl: las hojas nuevas se generan en un libro aparte y se copian al
+zip junto con las partes que las referencian (workbook.xml, sus relaciones,
+[Content_Types].xml y los estilos que usan). El resto de partes, incluidas
+las hojas no modificadas, se copian sin tocar su contenido.
+"""
+
+import copy
+import os
+import re
+import time
+import zipfile
+from typing import BinaryIO, Dict, Iterable, List, Tuple, Union
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape, quoteattr, unescape
+
+
+MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+WORKSHEET_REL = REL_NS + "/worksheet"
+WORKSHEET_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"
+
+WORKBOOK_PART = "xl/workbook.xml"
+WORKBOOK_RELS_PART = "xl/_rels/workbook.xml.rels"
+CONTENT_TYPES_PART = "[Content_Types].xml"
+STYLES_PART = "xl/styles.xml"
+SHARED_STRINGS_PART = "xl/sharedStrings.xml"
+
+# Primer identificador de formato numérico personalizado (los anteriores son predefinidos)
+FIRST_CUSTOM_NUMFMT = 164
+
+# Bloques de styles.xml que se completan, en el orden en que aparecen
+STYLE_BLOCKS = ('numFmts', 'fonts', 'fills', 'borders', 'cellXfs')
+
+SHEET_PART_PATTERN = re.compile(r'xl/worksheets/sheet(\d+)\.xml')
+ATTRIBUTE_PATTERN = re.compile(r'([\w:]+)="([^"]*)"')
+CELL_STYLE_PATTERN = re.compile(r'(<(?:\w+:)?(?:c|row)\b[^>]*?\ss=")(\d+)(")')
+COLUMN_STYLE_PATTERN = re.compile(r'(<(?:\w+:)?col\b[^>]*?\sstyle=")(\d+)(")')
+SHARED_CELL_PATTERN = re.compile(r'<((?:\w+:)?)c\b([^>]*?)\st="s"([^>]*)>\s*<(?:\w+:)?v>(\d+)</(?:\w+:)?v>\s*</(?:\w+:)?c>')
+
+
+def _tag(name: str) -> str:
+    return f"{{{MAIN_NS}}}{name}"
+
+
+def _part_path(target: str) -> str:
+    # Destino de una relación de workbook.xml como nombre de parte del zip
+    return target.lstrip('/') if target.startswith('/') else "xl/" + target
+
+
+def _canonical(element: ElementTree.Element) -> tuple:
+    # Forma comparable de un elemento de estilos, sin depender del orden de atributos
+    return (element.tag, tuple(sorted(element.attrib.items())), (element.text or "").strip(),
+            tuple(_canonical(child) for child in element))
+
+
+def _serialize(element: ElementTree.Element, prefix: str) -> str:
+    # Elemento de estilos como XML, con el prefijo del espacio de nombres principal del documento
+    name = prefix + element.tag.rpartition('}')[2]
+    attributes = "".join(f" {key}={quoteattr(value)}" for key, value in element.attrib.items())
+    content = escape(element.text or "") + "".join(_serialize(child, prefix) for child in element)
+    return f"<{name}{attributes}>{content}</{name}>" if content else f"<{name}{attributes}/>"
+
+
+def _sheet_entries(workbook_xml: str) -> Tuple[str, List[Tuple[str, str, str]]]:
+    # Elementos <sheet> de workbook.xml: (nombre, r:id, texto original)
+    prefix = re.search(r'<((?:\w+:)?)workbook\b', workbook_xml).group(1)
+    entries = []
+    for match in re.finditer(rf'<{prefix}sheet\b[^>]*/>', workbook_xml):
+        attributes = dict(ATTRIBUTE_PATTERN.findall(match.group(0)))
+        relationship = next(value for key, value in attributes.items() if key.endswith(':id'))
+        entries.append((unescape(attributes['name'], {'&quot;': '"'}), relationship, match.group(0)))
+    return prefix, entries
+
+
+def read_sheet_names(path: str) -> List[str]:
+    """
+    Nombres de las hojas de un .xlsx, en orden, sin cargar las hojas.
+    
+    Args:
+        path: Ruta del archivo
+    
+    Returns:
+        Nombres de las hojas
+    """
+    with zipfile.ZipFile(path) as archive:
+        _, entries = _sheet_entries(archive.read(WORKBOOK_PART).decode('utf-8'))
+    return [name for name, _, _ in entries]
+
+
+def _append_children(xml: str, block: str, elements: List[ElementTree.Element]) -> str:
+    """
+    Añade elementos al final de un bloque de styles.xml y actualiza su count.
+    
+    Args:
+        xml: Contenido de styles.xml
+        block: Nombre del bloque (p. ej. 'fonts')
+        elements: Elementos a añadir (del espacio de nombres principal, sin atributos con espacio de nombres)
+    
+    Returns:
+        styles.xml modificado
+    """
+    if not elements:
+        return xml
+    
+    prefix = re.search(r'<((?:\w+:)?)styleSheet\b', xml).group(1)
+    text = "".join(_serialize(element, prefix) for element in elements)
+    match = re.search(rf'<{prefix}{block}\b([^>]*?)(/?)>', xml)
+    
+    if match is None:
+        # Solo numFmts puede faltar; va al principio de styleSheet
+        start = re.search(rf'<{prefix}styleSheet\b[^>]*>', xml).end()
+        return f'{xml[:start]}<{prefix}{block} count="{len(elements)}">{text}</{prefix}{block}>{xml[start:]}'
+    
+    attributes = match.group(1)
+    count = int(re.search(r'count="(\d+)"', attributes).group(1)) if 'count="' in attributes else 0
+    attributes = re.sub(r'\s*count="\d+"', '', attributes) + f' count="{count + len(elements)}"'
+    if match.group(2):
+        # Bloque vacío autocerrado: <numFmts count="0" />
+        return f'{xml[:match.start()]}<{prefix}{block}{attributes}>{text}</{prefix}{block}>{xml[match.end():]}'
+    
+    end = xml.index(f'</{prefix}{block}>', match.end())
+    return f'{xml[:match.start()]}<{prefix}{block}{attributes}>{xml[match.end():end]}{text}{xml[end:]}'
+
+
+def merge_styles(styles_xml: str, patch_styles: bytes, used: Iterable[int]) -> Tuple[str, Dict[int, int]]:
+    """
+    Incorpora a styles.xml los formatos de celda que usan las hojas nuevas.
+    
+    Cada formato (y su fuente, relleno, borde y formato numérico) se busca
+    entre los existentes y solo se añade si no hay uno igual; como los
+    índices existentes no cambian, las hojas no modificadas siguen siendo
+    válidas. Si no hace falta añadir nada, styles.xml no cambia.
+    
+    Args:
+        styles_xml: styles.xml del archivo que se actualiza
+        patch_styles: styles.xml del libro con las hojas nuevas
+        used: Índices de formato de celda que usan las hojas nuevas
+    
+    Returns:
+        Tupla (styles.xml resultante, índice en el libro nuevo -> índice en el archivo)
+    """
+    target = ElementTree.fromstring(styles_xml)
+    patch = ElementTree.fromstring(patch_styles)
+    
+    existing = {}
+    added = {}
+    for block in STYLE_BLOCKS:
+        node = target.find(_tag(block))
+        children = list(node) if node is not None else []
+        existing[block] = [_canonical(child) for child in children]
+        added[block] = []
+    
+    target_formats = {element.get('formatCode'): int(element.get('numFmtId'))
+                      for element in target.iterfind(f"{_tag('numFmts')}/{_tag('numFmt')}")}
+    patch_formats = {int(element.get('numFmtId')): element.get('formatCode')
+                     for element in patch.iterfind(f"{_tag('numFmts')}/{_tag('numFmt')}")}
+    
+    def merge(block: str, element: ElementTree.Element) -> int:
+        key = _canonical(element)
+        if key in existing[block]:
+            return existing[block].index(key)
+        existing[block].append(key)
+        added[block].append(element)
+        return len(existing[block]) - 1
+    
+    def merge_format(format_id: int) -> int:
+        if format_id < FIRST_CUSTOM_NUMFMT:
+            return format_id
+        code = patch_formats[format_id]
+        if code not in target_formats:
+            new_id = max([FIRST_CUSTOM_NUMFMT - 1, *target_formats.values()]) + 1
+            target_formats[code] = new_id
+            element = ElementTree.Element(_tag('numFmt'), numFmtId=str(new_id), formatCode=code)
+            added['numFmts'].append(element)
+        return target_formats[code]
+    
+    patch_blocks = {block: list(patch.find(_tag(block)))
+                    for block in ('fonts', 'fills', 'borders', 'cellXfs')}
+    mapping = {}
+    for index in sorted(set(used)):
+        xf = copy.deepcopy(patch_blocks['cellXfs'][index])
+        for attribute, block in (('fontId', 'fonts'), ('fillId', 'fills'), ('borderId', 'borders')):
+            if attribute in xf.attrib:
+                xf.set(attribute, str(merge(block, patch_blocks[block][int(xf.get(attribute))])))
+        if 'numFmtId' in xf.attrib:
+            xf.set('numFmtId', str(merge_format(int(xf.get('numFmtId')))))
+        mapping[index] = merge('cellXfs', xf)
+    
+    for block in STYLE_BLOCKS:
+        styles_xml = _append_children(styles_xml, block, added[block])
+    return styles_xml, mapping
+
+
+def _sheet_xml(sheet: str, styles: Dict[int, int], shared_strings: List[str]) -> str:
+    # Hoja del libro nuevo con los índices de estilo del archivo y sin cadenas compartidas
+    def restyle(match):
+        return f"{match.group(1)}{styles.get(int(match.group(2)), 0)}{match.group(3)}"
+    
+    def inline(match):
+        prefix = match.group(1)
+        return (f'<{prefix}c{match.group(2)} t="inlineStr"{match.group(3)}>'
+                f'<{prefix}is>{shared_strings[int(match.group(4))]}</{prefix}is></{prefix}c>')
+    
+    sheet = SHARED_CELL_PATTERN.sub(inline, sheet)
+    sheet = CELL_STYLE_PATTERN.sub(restyle, sheet)
+    return COLUMN_STYLE_PATTERN.sub(restyle, sheet)
+
+
+def replace_sheets(path: str, patch: Union[str, BinaryIO], order: List[str]):
+    """
+    Copia las hojas de un libro a un .xlsx existente sin reescribir el resto.
+    
+    Las hojas del libro nuevo reemplazan a las del mismo nombre o se añaden
+    como partes nuevas. Solo se reescriben esas hojas, workbook.xml, sus
+    relaciones, [Content_Types].xml y, si hace falta algún formato nuevo,
+    styles.xml; las demás partes conservan exactamente su contenido. El
+    archivo se reemplaza de forma atómica.
+    
+    Args:
+        path: Ruta del .xlsx que se actualiza
+        patch: Libro (ruta o archivo) con las hojas nuevas, generado con openpyxl
+        order: Nombres de todas las hojas del resultado, en orden
+    """
+    with zipfile.ZipFile(patch) as patch_archive:
+        patch_workbook = patch_archive.read(WORKBOOK_PART).decode('utf-8')
+        patch_rels = ElementTree.fromstring(patch_archive.read(WORKBOOK_RELS_PART))
+        patch_targets = {rel.get('Id'): _part_path(rel.get('Target')) for rel in patch_rels}
+        patch_styles = patch_archive.read(STYLES_PART)
+        shared_strings = []
+        if SHARED_STRINGS_PART in patch_archive.namelist():
+            shared_strings = re.findall(r'<(?:\w+:)?si>(.*?)</(?:\w+:)?si>',
+                                        patch_archive.read(SHARED_STRINGS_PART).decode('utf-8'), re.S)
+        _, patch_entries = _sheet_entries(patch_workbook)
+        sheets = {name: patch_archive.read(patch_targets[relationship]).decode('utf-8')
+                  for name, relationship, _ in patch_entries}
+    
+    with zipfile.ZipFile(path) as archive:
+        names = archive.namelist()
+        workbook_xml = archive.read(WORKBOOK_PART).decode('utf-8')
+        rels_xml = archive.read(WORKBOOK_RELS_PART).decode('utf-8')
+        types_xml = archive.read(CONTENT_TYPES_PART).decode('utf-8')
+        styles_xml = archive.read(STYLES_PART).decode('utf-8')
+        
+        prefix, entries = _sheet_entries(workbook_xml)
+        rels = ElementTree.fromstring(rels_xml)
+        targets = {rel.get('Id'): _part_path(rel.get('Target')) for rel in rels}
+        
+        used = {int(value) for sheet in sheets.values()
+                for pattern in (CELL_STYLE_PATTERN, COLUMN_STYLE_PATTERN)
+                for _, value, _ in pattern.findall(sheet)}
+        new_styles, style_map = merge_styles(styles_xml, patch_styles, used)
+        
+        # Partes nuevas para las hojas que no existían
+        elements = {name: text for name, _, text in entries}
+        parts = {name: targets[relationship] for name, relationship, _ in entries if name in sheets}
+        relationship_prefix = re.search(rf'xmlns:(\w+)="{REL_NS}"', workbook_xml).group(1)
+        sheet_ids = [int(value) for value in re.findall(r'\ssheetId="(\d+)"', workbook_xml)]
+        sheet_numbers = [int(match.group(1)) for match in map(SHEET_PART_PATTERN.fullmatch, names) if match]
+        rel_numbers = [int(rel.get('Id')[3:]) for rel in rels if re.fullmatch(r'rId\d+', rel.get('Id'))]
+        new_rels = []
+        new_types = []
+        
+        for name in sheets:
+            if name in elements:
+                continue
+            number = max(sheet_numbers, default=0) + 1
+            sheet_numbers.append(number)
+            relationship = f"rId{max(rel_numbers, default=0) + 1}"
+            rel_numbers.append(int(relationship[3:]))
+            sheet_id = max(sheet_ids, default=0) + 1
+            sheet_ids.append(sheet_id)
+            
+            parts[name] = f"xl/worksheets/sheet{number}.xml"
+            elements[name] = (f'<{prefix}sheet name={quoteattr(name)} sheetId="{sheet_id}" '
+                              f'{relationship_prefix}:id="{relationship}"/>')
+            new_rels.append(f'<Relationship Id="{relationship}" Type="{WORKSHEET_REL}" '
+                            f'Target="/{parts[name]}"/>')
+            new_types.append(f'<Override PartName="/{parts[name]}" ContentType="{WORKSHEET_CONTENT_TYPE}"/>')
+        
+        # Lista de hojas en el orden pedido
+        start = re.search(rf'<{prefix}sheets\b[^>]*>', workbook_xml).end()
+        end = workbook_xml.index(f'</{prefix}sheets>', start)
+        workbook_xml = workbook_xml[:start] + "".join(elements[name] for name in order) + workbook_xml[end:]
+        if new_rels:
+            rels_xml = rels_xml.replace('</Relationships>', "".join(new_rels) + '</Relationships>')
+            types_xml = types_xml.replace('</Types>', "".join(new_types) + '</Types>')
+        
+        replaced = {
+            WORKBOOK_PART: workbook_xml,
+            WORKBOOK_RELS_PART: rels_xml,
+            CONTENT_TYPES_PART: types_xml,
+            STYLES_PART: new_styles,
+        }
+        for name, sheet in sheets.items():
+            replaced[parts[name]] = _sheet_xml(sheet, style_map, shared_strings)
+        
+        tmp_path = f"{path}.tmp"
+        with zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_DEFLATED) as output:
+            for info in archive.infolist():
+                if info.filename in replaced:
+                    output.writestr(info, replaced.pop(info.filename).encode('utf-8'))
+                else:
+                    output.writestr(info, archive.read(info))
+            for name, content in replaced.items():
+                info = zipfile.ZipInfo(name, time.localtime()[:6])
+                info.compress_type = zipfile.ZIP_DEFLATED
+                output.writestr(info, content.encode('utf-8'))
+    
+    os.replace(tmp_path, path)